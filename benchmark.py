@@ -0,0 +1,416 @@
+"""
+Reproducible performance benchmarks for Speak Anywhere.
+
+Everything runs headless through speak_engine: recorded WAV fixtures stand
+in for the microphone (played back at real-time pace, like a person
+talking) and a null output stream stands in for the speakers. Measured:
+
+    dictation   time from speech onset to the first partial result and from
+                the end of speech to the final result, per utterance, plus
+                the recognizer's processing real-time factor
+    synthesis   Piper time to first audio and real-time factor, with a cold
+                and a warm sentence cache, and time to first sample at the
+                (null) speaker through the full playback path
+    (Models are loaded, and every synthesis worker warmed up, before any of
+    these are timed; load times are reported under startup.)
+    startup     engine import and model load times; with --startup, the app
+                itself is launched once and its startup trace is included
+    memory      peak resident set size of the benchmark process
+
+Results are written as JSON (--output) with machine details, so runs can be
+compared across releases and hardware.
+
+    python benchmark.py --wav fixtures/dictation.wav --output results.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_VOSK_MODEL = os.path.join(_HERE, "_resources", "vosk-model-small-en-us-0.15")
+DEFAULT_PIPER_MODEL = os.path.join(_HERE, "_resources", "piper", "en_US-hfc_male-medium.onnx")
+DEFAULT_TEXT = (
+    "Speak Anywhere reads your clipboard aloud with a natural voice. "
+    "Long documents are split into sentences, and each sentence starts playing as soon as it is ready. "
+    "This paragraph is used to measure how quickly the first words are heard. "
+    "It also measures how much faster than real time the voice can be synthesized on this machine."
+)
+SCHEMA_VERSION = 1
+
+
+# ============================================================================
+# STAND-INS - WAV playback instead of a microphone, null sink instead of speakers
+# ============================================================================
+class WavSource:
+    """Feeds recorded audio to DictationEngine.run() the way MicCapture does.
+
+    With realtime on, samples only become available as fast as they would
+    from a microphone, so latencies match what a user experiences.
+    """
+
+    def __init__(self, samples, sample_rate, realtime=True):
+        self.samples = samples
+        self.sample_rate = sample_rate
+        self.realtime = realtime
+        self.position = 0
+        self.started = None
+
+    def audio_time(self, wall_time):
+        """Position in the recording that was being captured at wall_time"""
+        return wall_time - self.started
+
+    def read(self, out, timeout):
+        if self.started is None:
+            self.started = time.perf_counter()
+        limit = len(self.samples)
+        if self.realtime:
+            due = int((time.perf_counter() - self.started) * self.sample_rate)
+            if due <= self.position:
+                time.sleep(min(timeout, len(out) / self.sample_rate))
+                due = int((time.perf_counter() - self.started) * self.sample_rate)
+            limit = min(limit, due)
+        n = max(0, min(len(out), limit - self.position))
+        out[:n] = self.samples[self.position:self.position + n]
+        self.position += n
+        return n
+
+    def is_active(self):
+        return self.position < len(self.samples)
+
+
+class NullOutputStream:
+    """sounddevice.OutputStream look-alike that pulls audio at real-time pace and discards it"""
+
+    class CallbackStop(Exception):
+        pass
+
+    first_audio = None  # perf_counter() of the first non-silent block, set per benchmark
+
+    def __init__(self, samplerate, channels, dtype, blocksize, device, callback, finished_callback):
+        self.samplerate = samplerate
+        self.blocksize = blocksize
+        self.callback = callback
+        self.finished_callback = finished_callback
+        self._stopped = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        block = np.zeros((self.blocksize, 1), dtype=np.int16)
+        period = self.blocksize / self.samplerate
+        next_time = time.perf_counter()
+        try:
+            while not self._stopped.is_set():
+                block[:] = 0
+                try:
+                    self.callback(block, self.blocksize, None, None)
+                except self.CallbackStop:
+                    break
+                if NullOutputStream.first_audio is None and block.any():
+                    NullOutputStream.first_audio = time.perf_counter()
+                next_time += period
+                time.sleep(max(0.0, next_time - time.perf_counter()))
+        finally:
+            self.finished_callback()
+
+    def abort(self):
+        self._stopped.set()
+
+    def close(self):
+        self._stopped.set()
+
+
+class NullOutput:
+    """Typing sink that only counts what would have been typed"""
+
+    def __init__(self):
+        self.characters = 0
+
+    def type_text(self, text, captured_at=None):
+        self.characters += len(text)
+
+    def press(self, key, captured_at=None):
+        self.characters += 1
+
+    def hotkey(self, keys, captured_at=None):
+        pass
+
+    def erase(self, count, captured_at=None):
+        self.characters -= count
+
+
+# ============================================================================
+# MEASUREMENTS
+# ============================================================================
+def peak_rss_bytes():
+    """Peak resident memory of this process, or None if unavailable"""
+    if sys.platform == 'win32':
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                        ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                        ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                        ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return counters.PeakWorkingSetSize
+        return None
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024  # Linux reports KB
+
+
+def summarize(values):
+    """Distribution summary in milliseconds"""
+    if not values:
+        return None
+    ms = sorted(1000 * v for v in values)
+    return {
+        'count': len(ms),
+        'min': round(ms[0], 1),
+        'median': round(statistics.median(ms), 1),
+        'p90': round(ms[min(len(ms) - 1, int(0.9 * len(ms)))], 1),
+        'max': round(ms[-1], 1),
+    }
+
+
+def speech_regions(samples, sample_rate, **vad_settings):
+    """(onset, end) in seconds of each speech region, by the dictation VAD"""
+    from vad import VoiceActivityDetector
+    vad = VoiceActivityDetector(sample_rate, **vad_settings)
+    frame_seconds = vad.frame / sample_rate
+    regions = []
+    onset = None
+    for i in range(0, len(samples) - vad.frame + 1, vad.frame):
+        was_speech = vad.in_speech
+        vad.process(samples[i:i + vad.frame])
+        if vad.in_speech and not was_speech:
+            onset = vad.frames_seen - vad.min_speech
+        elif was_speech and not vad.in_speech:
+            regions.append((onset * frame_seconds, (vad.frames_seen - vad.hangover) * frame_seconds))
+            onset = None
+    if onset is not None:
+        regions.append((onset * frame_seconds, len(samples) / sample_rate))
+    return regions
+
+
+def bench_dictation(models, wav_path, realtime=True, sample_rate=16000):
+    """Per-utterance partial/final latency for one recording"""
+    from speak_engine import DictationEngine
+    from transcribe import read_blocks
+
+    samples = np.concatenate(list(read_blocks(wav_path, sample_rate)))
+    regions = speech_regions(samples, sample_rate)
+    events = []
+    engine = DictationEngine(models, NullOutput(), sample_rate=sample_rate)
+    engine.on_result = lambda kind, text: events.append((kind, time.perf_counter()))
+    source = WavSource(samples, sample_rate, realtime)
+
+    started_cpu = time.process_time()
+    started = time.perf_counter()
+    engine.run(source)
+    wall = time.perf_counter() - started
+    cpu = time.process_time() - started_cpu
+
+    first_partial, final = [], []
+    for i, (onset, end) in enumerate(regions):
+        next_onset = regions[i + 1][0] if i + 1 < len(regions) else float('inf')
+        times = [(kind, source.audio_time(t)) for kind, t in events]
+        partials = [t for kind, t in times if kind == 'partial' and onset <= t < next_onset]
+        finals = [t for kind, t in times if kind == 'final' and t >= end and t < next_onset]
+        if partials:
+            first_partial.append(partials[0] - onset)
+        if finals:
+            final.append(finals[0] - end)
+
+    audio_seconds = len(samples) / sample_rate
+    return {
+        'fixture': os.path.basename(wav_path),
+        'audio_seconds': round(audio_seconds, 2),
+        'realtime': realtime,
+        'utterances': len(regions),
+        'time_to_first_partial_ms': summarize(first_partial),
+        'time_to_final_ms': summarize(final),
+        'cpu_seconds': round(cpu, 3),
+        'cpu_per_audio_second': round(cpu / audio_seconds, 4),
+        'wall_seconds': round(wall, 3),
+    }
+
+
+def bench_synthesis(models, voice_path, text, workers):
+    """Time to first audio and real-time factor, cold and warm cache, plus null-sink playback"""
+    from speak_engine import SpeechEngine, SynthCache
+
+    results = {}
+    speech = SpeechEngine(models, voice_path, SynthCache(256 * 1024 * 1024), workers)
+    # Every worker loads its own Piper session on first use; do that before timing,
+    # so "cold" means an empty sentence cache, not unloaded models
+    speech.pool.warm()
+    for label in ('cold_cache', 'warm_cache'):
+        started = time.perf_counter()
+        first = None
+        audio_seconds = 0.0
+        for samples, rate in speech.synthesize(text):
+            if first is None:
+                first = time.perf_counter() - started
+            audio_seconds += len(samples) / rate
+        elapsed = time.perf_counter() - started
+        results[label] = {
+            'time_to_first_audio_ms': round(1000 * (first or 0), 1),
+            'total_ms': round(1000 * elapsed, 1),
+            'audio_seconds': round(audio_seconds, 2),
+            'real_time_factor': round(elapsed / audio_seconds, 4) if audio_seconds else None,
+        }
+
+    # Full path - synthesis, time stretch and ring buffers - into the null sink
+    speech.pool.cache = SynthCache(256 * 1024 * 1024)
+    speech.stream_factory = NullOutputStream
+    NullOutputStream.first_audio = None
+    started = time.perf_counter()
+    playing = speech.speak(text)
+    while NullOutputStream.first_audio is None and time.perf_counter() - started < 60:
+        time.sleep(0.001)
+    first_heard = NullOutputStream.first_audio
+    speech.stop()
+    playing.join()
+    results['playback_time_to_first_sample_ms'] = (
+        round(1000 * (first_heard - started), 1) if first_heard else None)
+    results['workers'] = workers
+    return results
+
+
+def bench_startup(vosk_path, piper_path, launch_app=False):
+    """Import and model-load times; optionally the app's own startup trace"""
+    code = "import time; t = time.perf_counter(); import speak_engine; print(time.perf_counter() - t)"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=_HERE)
+    startup = {
+        'import_speak_engine_ms': round(1000 * float(result.stdout), 1) if result.returncode == 0 else None,
+    }
+    from speak_engine import load_piper_voice, load_vosk_model
+    for name, load, path in (('vosk', load_vosk_model, vosk_path), ('piper', load_piper_voice, piper_path)):
+        started = time.perf_counter()
+        try:
+            load(path)
+            startup[f'load_{name}_model_ms'] = round(1000 * (time.perf_counter() - started), 1)
+        except Exception as e:
+            startup[f'load_{name}_model_ms'] = None
+            print(f"Could not load {name} model: {e}")
+
+    if launch_app:
+        # The app writes startup_trace.json to its AppData folder and quits
+        subprocess.run([sys.executable, os.path.join(_HERE, "speak_anywhere.py"),
+                        "--trace-startup", "--exit-after-startup"], cwd=_HERE, timeout=120)
+        trace_path = os.path.join(os.environ.get('APPDATA', os.path.expanduser('~')),
+                                  'SpeakAnywhere', 'startup_trace.json')
+        try:
+            with open(trace_path) as f:
+                startup['app_trace'] = json.load(f)
+        except (OSError, ValueError):
+            startup['app_trace'] = None
+    return startup
+
+
+def machine_info():
+    info = {
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'python': sys.version.split()[0],
+        'numpy': np.__version__,
+    }
+    try:
+        info['commit'] = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                        text=True, cwd=_HERE).stdout.strip() or None
+    except OSError:
+        info['commit'] = None
+    return info
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="benchmark", description="Benchmark Speak Anywhere headlessly.")
+    parser.add_argument('--wav', nargs='*', default=[], help="Recorded dictation fixtures (WAV)")
+    parser.add_argument('--text', help="Text file to synthesize (default: a built-in paragraph)")
+    parser.add_argument('--vosk-model', default=DEFAULT_VOSK_MODEL)
+    parser.add_argument('--piper-model', default=DEFAULT_PIPER_MODEL)
+    parser.add_argument('--synth-workers', type=int, default=max(1, min(4, (os.cpu_count() or 2) // 2)))
+    parser.add_argument('--fast', action='store_true',
+                        help="Feed fixtures as fast as possible (throughput, not latency)")
+    parser.add_argument('--startup', action='store_true', help="Also launch the app once and record its startup")
+    parser.add_argument('--skip', nargs='*', default=[], choices=['dictation', 'synthesis', 'startup'])
+    parser.add_argument('--output', help="Write the JSON results here")
+    args = parser.parse_args(argv)
+
+    from speak_engine import ModelManager, load_piper_voice, load_vosk_model
+
+    results = {
+        'schema': SCHEMA_VERSION,
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'machine': machine_info(),
+    }
+    if 'startup' not in args.skip:
+        results['startup'] = bench_startup(args.vosk_model, args.piper_model, args.startup)
+
+    models = ModelManager({
+        'vosk': lambda: load_vosk_model(args.vosk_model),
+        'piper': lambda: load_piper_voice(args.piper_model),
+    })
+    # Load the models up front, so no timed run includes loading them
+    needed = []
+    if 'dictation' not in args.skip and args.wav:
+        needed.append('vosk')
+    if 'synthesis' not in args.skip:
+        needed.append('piper')
+    models.preload(*needed)
+    for name in needed:
+        models.get(name)
+
+    if 'dictation' not in args.skip and args.wav:
+        results['dictation'] = [bench_dictation(models, path, realtime=not args.fast) for path in args.wav]
+    if 'synthesis' not in args.skip:
+        text = DEFAULT_TEXT
+        if args.text:
+            with open(args.text, encoding='utf-8') as f:
+                text = f.read()
+        results['synthesis'] = bench_synthesis(models, args.piper_model, text, args.synth_workers)
+
+    # The engines' own runtime histograms (see metrics.py) over the whole run
+    from metrics import metrics
+    results['metrics'] = {key: value for key, value in metrics.snapshot().items() if key != 'time'}
+
+    peak = peak_rss_bytes()
+    results['memory'] = {'peak_rss_mb': round(peak / 1e6, 1) if peak else None}
+
+    report = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report + "\n")
+        print(f"Results written to {args.output}")
+    else:
+        print(report)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
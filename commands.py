@@ -0,0 +1,316 @@
+"""
+Voice commands and punctuation for Speak Anywhere's dictation.
+
+Spoken phrases ("new line", "question mark", "scratch that", "select all")
+are mapped to actions by a table the user can edit - commands.ini in the
+AppData folder, written with the defaults below on first use:
+
+    [punctuation]
+    question mark = punct ?
+
+Phrases are compiled into a word trie. Each run of dictated words is
+scanned once, taking the longest command that starts at each word, so
+commands work anywhere in a phrase and the words around them are typed
+as usual. A phrase that could still grow into a command ("question" at
+the end of a partial result) is held back until the next words arrive.
+
+Actions:
+    punct X      attach X to the previous word ("hello." rather than "hello .")
+    open X       type X with no space after it (opening quotes, brackets)
+    text X       type X as a word of its own
+    key K ...    press keys (enter and tab are tracked; other keys end undo)
+    hotkey K ... press a shortcut, e.g. hotkey ctrl s
+    cap / caps   capitalize / upper-case the next word
+    nospace      join the next word to the previous one
+    delete       remove the phrase just dictated
+"""
+
+import configparser
+import os
+from collections import namedtuple
+
+DEFAULT_COMMANDS = """\
+# Spoken phrase = action. See the top of commands.py for the actions.
+# Phrases are matched case-insensitively; edits apply while the app runs.
+
+[punctuation]
+period = punct .
+full stop = punct .
+comma = punct ,
+question mark = punct ?
+exclamation mark = punct !
+exclamation point = punct !
+colon = punct :
+semicolon = punct ;
+dash = text -
+open quote = open "
+close quote = punct "
+open paren = open (
+close paren = punct )
+
+[layout]
+new line = key enter
+new paragraph = key enter enter
+tab key = key tab
+no space = nospace
+
+[formatting]
+capitalize = cap
+all caps = caps
+
+[editing]
+delete that = delete
+scratch that = delete
+undo that = hotkey ctrl z
+select all = hotkey ctrl a
+copy that = hotkey ctrl c
+cut that = hotkey ctrl x
+paste that = hotkey ctrl v
+
+[shortcuts]
+save the file = hotkey ctrl s
+"""
+
+ACTIONS = ('punct', 'open', 'text', 'key', 'hotkey', 'cap', 'caps', 'nospace', 'delete')
+TRACKED_KEYS = {'enter': "\n", 'tab': "\t"}  # Keys whose effect on the text is known
+HISTORY_PHRASES = 20  # Earlier phrases "delete that" can still reach
+
+Command = namedtuple('Command', 'phrase action args')
+
+
+class CommandGrammar:
+    """The command table compiled into a trie over lower-cased words"""
+
+    def __init__(self, table=None, path=None):
+        self.path = path
+        self._mtime = None
+        self.compile(table if table is not None else parse_table(DEFAULT_COMMANDS))
+
+    @classmethod
+    def load(cls, path):
+        """Read the table at path, writing the defaults there first if it doesn't exist"""
+        if not os.path.exists(path):
+            try:
+                with open(path, 'w', encoding='utf-8') as f:
+                    f.write(DEFAULT_COMMANDS)
+            except OSError as e:
+                print(f"Could not write {path}: {e}")
+        grammar = cls(path=path)
+        grammar.reload_if_changed()
+        return grammar
+
+    def reload_if_changed(self):
+        """Re-read the table file if it was edited since the last load; True if so"""
+        try:
+            mtime = os.path.getmtime(self.path)
+        except (OSError, TypeError):
+            return False
+        if mtime == self._mtime:
+            return False
+        self._mtime = mtime
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                self.compile(parse_table(f.read()))
+        except (OSError, configparser.Error) as e:
+            print(f"Could not read voice commands, keeping the current ones: {e}")
+        return True
+
+    def compile(self, table):
+        """Build the trie: nested dicts keyed by word, with the Command under None"""
+        root = {}
+        for phrase, (action, args) in table.items():
+            node = root
+            for word in phrase.lower().split():
+                node = node.setdefault(word, {})
+            node[None] = Command(phrase, action, args)
+        self._root = root  # Swapped in whole, so a reload never shows a half-built trie
+
+    def match(self, words, final=True):
+        """Split words into plain words and Commands.
+
+        Returns (tokens, held): tokens is a list of words (str) and Commands
+        in order; held is how many trailing words were left out because they
+        could still be the start of a command. With final, nothing is held.
+        """
+        root = self._root
+        tokens = []
+        i = 0
+        while i < len(words):
+            node = root
+            found = None
+            j = i
+            while j < len(words):
+                node = node.get(words[j].lower())
+                if node is None:
+                    break
+                j += 1
+                if None in node:
+                    found = (node[None], j)
+            if not final and node is not None and j == len(words) and len(node) > (None in node):
+                return tokens, len(words) - i  # Ran out of words part way down the trie
+            if found:
+                tokens.append(found[0])
+                i = found[1]
+            else:
+                tokens.append(words[i])
+                i += 1
+        return tokens, 0
+
+
+def parse_table(text):
+    """{phrase: (action, args)} from the commands.ini format; bad lines are skipped"""
+    parser = configparser.ConfigParser(interpolation=None, delimiters=('=',))
+    parser.optionxform = str
+    parser.read_string(text)
+    table = {}
+    for section in parser.sections():
+        for phrase, value in parser[section].items():
+            action, _, args = value.strip().partition(' ')
+            if action not in ACTIONS:
+                print(f"Ignoring voice command {phrase!r}: unknown action {action!r}")
+                continue
+            table[" ".join(phrase.lower().split())] = (action, args.strip())
+    return table
+
+
+class CommandTyper:
+    """Types dictated words through a grammar, and can take its typing back.
+
+    output is a TypingQueue (or anything with type_text, press, hotkey and
+    erase). The typer remembers the text it has typed - the current phrase
+    and a few before it - so punctuation can replace the trailing space,
+    "delete that" knows what to remove and undo() can restore any earlier
+    checkpoint with backspace. A hotkey or untracked key makes the screen
+    unknown again, so checkpoints from before one can't be undone.
+    """
+
+    def __init__(self, grammar, output):
+        self.grammar = grammar
+        self.output = output
+        self.phrases = []   # Text of earlier phrases, oldest first
+        self.text = ""      # Text typed for the current phrase
+        self.held = []      # Words that may still become a command
+        self.cap = self.caps = False
+        self.epoch = 0      # Bumped whenever the screen stops matching what we typed
+
+    def checkpoint(self):
+        return (self.epoch, tuple(self.phrases), self.text, tuple(self.held), self.cap, self.caps)
+
+    def type_words(self, words, captured_at=None, final=False):
+        """Type words; returns a checkpoint from before them for undo()"""
+        checkpoint = self.checkpoint()
+        words = self.held + list(words)
+        tokens, held = self.grammar.match(words, final)
+        self.held = words[len(words) - held:] if held else []
+        for token in tokens:
+            if isinstance(token, Command):
+                self._run(token, captured_at)
+            else:
+                self._type_word(token, captured_at)
+        return checkpoint
+
+    def end_phrase(self, captured_at=None):
+        """Finish the current phrase, typing any words held back"""
+        if self.held:
+            held, self.held = self.held, []
+            self.type_words(held, captured_at, final=True)
+        if self.text:
+            self.phrases.append(self.text)
+            del self.phrases[:-HISTORY_PHRASES]
+            self.text = ""
+
+    def undo(self, checkpoint, captured_at=None):
+        """Put the screen back the way it was at checkpoint; False if it can't be"""
+        epoch, phrases, text, held, cap, caps = checkpoint
+        if epoch != self.epoch:
+            return False
+        current = self._tail()
+        wanted = "".join(phrases) + text
+        keep = 0
+        while keep < min(len(current), len(wanted)) and current[keep] == wanted[keep]:
+            keep += 1
+        self.output.erase(len(current) - keep, captured_at)
+        self._send(wanted[keep:], captured_at)
+        self.phrases, self.text, self.held = list(phrases), text, list(held)
+        self.cap, self.caps = cap, caps
+        return True
+
+    def _tail(self):
+        return "".join(self.phrases) + self.text
+
+    def _type_word(self, word, captured_at):
+        if self.caps:
+            word = word.upper()
+        elif self.cap:
+            word = word[:1].upper() + word[1:]
+        self.cap = self.caps = False
+        self._type(word + " ", captured_at)
+
+    def _type(self, text, captured_at):
+        self.output.type_text(text, captured_at)
+        self.text += text
+
+    def _send(self, text, captured_at):
+        """Type text that may contain tracked keys"""
+        run = ""
+        for ch in text:
+            key = next((k for k, v in TRACKED_KEYS.items() if v == ch), None)
+            if key is None:
+                run += ch
+                continue
+            if run:
+                self.output.type_text(run, captured_at)
+                run = ""
+            self.output.press(key, captured_at)
+        if run:
+            self.output.type_text(run, captured_at)
+
+    def _trim_space(self, captured_at):
+        """Take back the space after the last word, if we typed it"""
+        if self.text.endswith(" "):
+            self.output.erase(1, captured_at)
+            self.text = self.text[:-1]
+        elif not self.text and self.phrases and self.phrases[-1].endswith(" "):
+            self.output.erase(1, captured_at)
+            self.phrases[-1] = self.phrases[-1][:-1]
+
+    def _run(self, command, captured_at):
+        action, args = command.action, command.args
+        if action == 'punct':
+            self._trim_space(captured_at)
+            self._type(args + " ", captured_at)
+        elif action == 'open':
+            self._type(args, captured_at)
+        elif action == 'text':
+            self._type(args + " ", captured_at)
+        elif action == 'nospace':
+            self._trim_space(captured_at)
+        elif action == 'cap':
+            self.cap = True
+        elif action == 'caps':
+            self.caps = True
+        elif action == 'delete':
+            if self.text:
+                removed, self.text = self.text, ""
+            elif self.phrases:
+                removed = self.phrases.pop()
+            else:
+                return
+            self.output.erase(len(removed), captured_at)
+        elif action == 'key':
+            for key in args.split():
+                if key in TRACKED_KEYS:
+                    if key == 'enter':
+                        self._trim_space(captured_at)
+                    self.output.press(key, captured_at)
+                    self.text += TRACKED_KEYS[key]
+                else:
+                    self.output.press(key, captured_at)
+                    self._forget()
+        elif action == 'hotkey':
+            self.output.hotkey(args.split(), captured_at)
+            self._forget()
+
+    def _forget(self):
+        self.phrases, self.text = [], ""
+        self.epoch += 1
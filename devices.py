@@ -0,0 +1,220 @@
+"""
+Audio device discovery for Speak Anywhere.
+
+DeviceRegistry turns PortAudio's device list into the short lists of
+microphones and speakers shown in the dropdowns. What gets hidden or
+renamed is data (DEVICE_RULES, plus any name fragments the user adds),
+not code. Every device gets a stable key - host API and full device name -
+so a choice survives PortAudio renumbering the devices between runs or
+after a headset is plugged in.
+
+PortAudio only enumerates devices when it starts, so seeing a new device
+means restarting it. That is slow and closes any open streams, so it is
+only done when device_signature() - a cheap fingerprint of the endpoints
+the OS currently has - has changed since the last scan.
+
+    registry = DeviceRegistry(hidden=["virtual cable"])
+    registry.scan()
+    registry.inputs, registry.outputs     # [Device(index, name, key), ...]
+    if registry.changed():
+        registry.scan(reinitialize=True)
+"""
+
+import os
+import sys
+from collections import namedtuple
+
+# index: PortAudio index in this run (None = system default)
+# name: what the dropdown shows; key: stable identity across runs
+Device = namedtuple('Device', 'index name key')
+
+DEFAULT_INPUT = Device(None, "Default Microphone", 'default')
+DEFAULT_OUTPUT = Device(None, "Default Speakers", 'default')
+
+# (direction, name fragments that must all appear, action, shown name)
+# A fragment starting with '=' must be the whole name instead (ignoring case
+# and surrounding spaces). The first matching rule wins. Actions:
+#   hide  - never list the device
+#   alias - list only the first matching device, under the shown name
+DEVICE_RULES = [
+    ('both', ('primary sound',), 'hide', None),
+    ('both', ('@system32',), 'hide', None),            # Bluetooth placeholder
+    ('both', ('hands-free',), 'hide', None),           # Bluetooth audio gateway
+    ('input', ('stereo mix',), 'hide', None),
+    ('input', ('what u hear',), 'hide', None),
+    ('input', ('loopback',), 'hide', None),
+    ('input', ('camo',), 'hide', None),                # Camo virtual webcam
+    ('output', ('sound mapper',), 'hide', None),
+    ('output', ('=headphones ()',), 'hide', None),     # Unnamed endpoints, not every headset
+    ('output', ('=room speaker ()',), 'hide', None),
+    ('output', ('realtek', 'speaker'), 'alias', "Laptop Speakers"),
+    ('output', ('usb audio',), 'alias', "USB Headset"),
+]
+# Devices no rule matched: listed (one per name) for inputs, left out for outputs
+LIST_UNMATCHED = {'input': True, 'output': False}
+# Microphone picked when the user hasn't chosen one, best first
+MIC_PREFERENCES = [('realtek', 'mic'), ('usb',), ('external',), ('headset',)]
+NAME_LIMIT = 40
+
+
+# ============================================================================
+# CHANGE DETECTION - Cheap fingerprint of the OS's audio endpoints
+# ============================================================================
+if sys.platform == 'win32':
+    import ctypes
+    from ctypes import wintypes
+
+    class _WAVEINCAPSW(ctypes.Structure):
+        _fields_ = [('wMid', wintypes.WORD), ('wPid', wintypes.WORD), ('vDriverVersion', wintypes.UINT),
+                    ('szPname', wintypes.WCHAR * 32), ('dwFormats', wintypes.DWORD),
+                    ('wChannels', wintypes.WORD), ('wReserved1', wintypes.WORD)]
+
+    class _WAVEOUTCAPSW(ctypes.Structure):
+        _fields_ = _WAVEINCAPSW._fields_ + [('dwSupport', wintypes.DWORD)]
+
+
+def device_signature():
+    """Something that changes when audio devices come or go; None if unknown here"""
+    if sys.platform == 'win32':
+        # The legacy wave API sees hot-plugged endpoints straight away and
+        # costs microseconds, unlike a full PortAudio scan
+        winmm = ctypes.windll.winmm
+        names = []
+        for count, get_caps, caps_type in ((winmm.waveInGetNumDevs, winmm.waveInGetDevCapsW, _WAVEINCAPSW),
+                                           (winmm.waveOutGetNumDevs, winmm.waveOutGetDevCapsW, _WAVEOUTCAPSW)):
+            for i in range(count()):
+                caps = caps_type()
+                if get_caps(i, ctypes.byref(caps), ctypes.sizeof(caps)) == 0:
+                    names.append(caps.szPname)
+            names.append(None)  # Separates inputs from outputs
+        return tuple(names)
+    if os.path.exists('/proc/asound/cards'):
+        try:
+            with open('/proc/asound/cards') as f:
+                return f.read()
+        except OSError:
+            return None
+    return None
+
+
+def best_microphone(inputs):
+    """The microphone to use when the user hasn't picked one"""
+    for fragments in MIC_PREFERENCES:
+        for device in inputs:
+            if all(fragment in device.name.lower() for fragment in fragments):
+                return device
+    return inputs[0] if inputs else DEFAULT_INPUT
+
+
+# ============================================================================
+# REGISTRY
+# ============================================================================
+class DeviceRegistry:
+    """Filtered, cached microphone and speaker lists.
+
+    scan() queries PortAudio (restarting it first with reinitialize, to see
+    devices plugged in since it started) and rebuilds inputs and outputs
+    from the whole list. query, if given, replaces sounddevice and returns
+    (devices, hostapis) in sounddevice's format.
+    """
+
+    def __init__(self, rules=DEVICE_RULES, hidden=(), query=None):
+        self.rules = rules
+        self.set_hidden(hidden)
+        self.inputs = []
+        self.outputs = []
+        self._query = query
+        self._cache = {}   # Host API name -> ((index, info), ...) from the last scan
+        self._signature = None
+
+    def set_hidden(self, fragments):
+        """Also leave out devices whose names contain any of fragments (applies from the next scan)"""
+        self.hidden = [fragment.strip().lower() for fragment in fragments if fragment.strip()]
+
+    def changed(self):
+        """True if the OS's devices differ from those at the last scan"""
+        signature = device_signature()
+        return signature is not None and signature != self._signature
+
+    def scan(self, reinitialize=False):
+        """Enumerate devices; returns True if the lists changed"""
+        signature = device_signature()
+        devices, hostapis = self._enumerate(reinitialize)
+        by_hostapi = {}
+        for index, info in enumerate(devices):
+            hostapi = hostapis[info['hostapi']]['name'] if info['hostapi'] < len(hostapis) else '?'
+            by_hostapi.setdefault(hostapi, []).append((index, info))
+        self._cache = by_hostapi
+        self._signature = signature
+
+        inputs, outputs = self._filter('input'), self._filter('output')
+        changed = inputs != self.inputs or outputs != self.outputs
+        self.inputs, self.outputs = inputs, outputs
+        return changed
+
+    def find(self, devices, wanted):
+        """The device in devices with key (or, from older configs, name) wanted"""
+        for device in devices:
+            if device.key == wanted:
+                return device
+        for device in devices:
+            if device.name == wanted:
+                return device
+        return None
+
+    def _enumerate(self, reinitialize):
+        if self._query is not None:
+            return self._query()
+        import sounddevice as sd
+        if reinitialize:
+            # sounddevice has no public way to restart PortAudio, which is the
+            # only way it sees new devices; without these, rescan what it has
+            if hasattr(sd, '_terminate') and hasattr(sd, '_initialize'):
+                sd._terminate()
+                sd._initialize()
+        return sd.query_devices(), sd.query_hostapis()
+
+    def _rule_for(self, direction, lower):
+        for rule_direction, fragments, action, shown in self.rules:
+            if rule_direction in (direction, 'both') and all(self._matches(f, lower) for f in fragments):
+                return action, shown
+        return None, None
+
+    @staticmethod
+    def _matches(fragment, lower):
+        if fragment.startswith('='):
+            return lower.strip() == fragment[1:]
+        return fragment in lower
+
+    def _filter(self, direction):
+        channels = 'max_input_channels' if direction == 'input' else 'max_output_channels'
+        listed = []
+        seen = set()
+        # In PortAudio's order, so the first host API listing a device wins
+        entries = sorted((index, hostapi, info) for hostapi, group in self._cache.items()
+                         for index, info in group)
+        for index, hostapi, info in entries:
+            if info[channels] <= 0:
+                continue
+            name = info['name']
+            lower = name.lower()
+            if any(fragment in lower for fragment in self.hidden):
+                continue
+            action, shown = self._rule_for(direction, lower)
+            if action == 'hide':
+                continue
+            if action == 'alias':
+                identity = shown
+            elif LIST_UNMATCHED[direction]:
+                # One entry per device, though each host API lists it again
+                identity = name.split('(')[0].strip().lower()[:20]
+                shown = name if len(name) <= NAME_LIMIT else name[:NAME_LIMIT - 3] + "..."
+            else:
+                continue
+            if identity in seen:
+                continue
+            seen.add(identity)
+            listed.append(Device(index, shown, f"{hostapi}/{name}"))
+        if not listed:
+            listed.append(DEFAULT_INPUT if direction == 'input' else DEFAULT_OUTPUT)
+        return listed
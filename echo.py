@@ -0,0 +1,189 @@
+"""
+Echo suppression for Speak Anywhere's dictation while speech is playing.
+
+With barge-in set to duck, speech keeps playing quietly while dictation
+listens, and the microphone hears it. The speech player writes everything
+it sends to the speaker into an EchoReference, on the perf_counter clock;
+for each block of microphone audio, EchoSuppressor looks up what was
+playing when it was captured and attenuates the frames where the
+microphone holds no more than the expected echo. Frames clearly louder
+than that - the user talking over the speech - pass untouched. The echo
+level is learnt as it goes: the quietest ratio of microphone to reference
+energy seen while the reference plays is the speaker-to-mic coupling.
+
+This is suppression, not cancellation: during double talk the echo gets
+through underneath the user's voice, which the recognizer copes with far
+better than with speech on its own.
+
+Run this file directly to try it on recordings - a microphone WAV and the
+speech that was playing, both starting at the same moment:
+    python echo.py mic.wav speech.wav [out.wav]
+"""
+
+import sys
+import threading
+import time
+
+import numpy as np
+
+
+class EchoReference:
+    """Recently played audio, resampled to sample_rate, with its play times.
+
+    write() is called from the speaker callback with each block and the
+    time its last sample leaves the speaker; read() returns the audio that
+    was playing over any recent span, with silence where nothing played.
+    """
+
+    def __init__(self, sample_rate=16000, seconds=2.0):
+        self.sample_rate = sample_rate
+        self.capacity = int(sample_rate * seconds)
+        self._data = np.zeros(self.capacity, dtype=np.int16)
+        self._written = 0        # Samples written since the start
+        self._end_time = None    # Play time of the last sample written
+        self._lock = threading.Lock()
+
+    def write(self, samples, sample_rate, end_time=None):
+        if end_time is None:
+            end_time = time.perf_counter()
+        if sample_rate != self.sample_rate and len(samples):
+            count = int(round(len(samples) * self.sample_rate / sample_rate))
+            positions = np.arange(count) * (sample_rate / self.sample_rate)
+            samples = np.interp(positions, np.arange(len(samples)), samples).astype(np.int16)
+        with self._lock:
+            if self._end_time is not None:
+                # Nothing was played in between (paused, or between utterances)
+                gap = int(round((end_time - self._end_time) * self.sample_rate)) - len(samples)
+                if gap > 0:
+                    self._append(np.zeros(min(gap, self.capacity), dtype=np.int16))
+            self._append(samples)
+            self._end_time = end_time
+
+    def read(self, end_time, count):
+        """The count samples played up to end_time (zeros for what isn't known)"""
+        out = np.zeros(count, dtype=np.int16)
+        with self._lock:
+            if self._end_time is None:
+                return out
+            # Position of end_time in the written stream
+            end = self._written - int(round((self._end_time - end_time) * self.sample_rate))
+            start = end - count
+            oldest = max(0, self._written - self.capacity)
+            lo, hi = max(start, oldest), min(end, self._written)
+            if lo >= hi:
+                return out
+            index = np.arange(lo, hi) % self.capacity
+            out[lo - start:hi - start] = self._data[index]
+        return out
+
+    def _append(self, samples):
+        samples = samples[-self.capacity:]
+        n = len(samples)
+        start = self._written % self.capacity
+        first = min(n, self.capacity - start)
+        self._data[start:start + first] = samples[:first]
+        if n > first:
+            self._data[:n - first] = samples[first:]
+        self._written += n
+
+
+class EchoSuppressor:
+    """Attenuates microphone frames that hold only the echo of the reference.
+
+    delay_ms is the usual time from a sample being heard to the microphone
+    capture reporting it (input buffering plus the room, and output
+    buffering too on devices that don't report their latency); spread_ms
+    widens the reference window both ways, so the delay only needs to be
+    roughly right.
+    """
+
+    def __init__(self, reference, sample_rate=16000, frame_ms=20, delay_ms=80, spread_ms=60,
+                 margin_db=6.0, suppress_db=30.0, min_reference_db=-60.0):
+        self.reference = reference
+        self.sample_rate = sample_rate
+        self.frame = int(sample_rate * frame_ms / 1000)
+        self.delay = delay_ms / 1000.0
+        self.spread = int(sample_rate * spread_ms / 1000)
+        self.margin = 10 ** (margin_db / 10)
+        self.suppress_gain = 10 ** (-suppress_db / 20)
+        self.min_reference_power = 10 ** (min_reference_db / 10)
+        self.coupling = 1.0      # Echo power / reference power, learnt
+        self.frames_seen = 0
+        self.frames_suppressed = 0
+        self._gain = 1.0         # Gain at the end of the last frame, for smooth ramps
+
+    def process(self, samples, end_time):
+        """Suppress echo in samples, whose last sample was captured at end_time"""
+        n = len(samples)
+        if not n:
+            return samples
+        reference = self.reference.read(end_time - self.delay + self.spread / self.sample_rate,
+                                        n + 2 * self.spread)
+        reference_power = self._power(reference)
+        out = samples.astype(np.float32)
+        for start in range(0, n, self.frame):
+            stop = min(start + self.frame, n)
+            self.frames_seen += 1
+            echo_power = reference_power[start:stop + 2 * self.spread].max()
+            gain = 1.0
+            if echo_power > self.min_reference_power:
+                mic_power = np.mean((out[start:stop] / 32768.0) ** 2) + 1e-12
+                aligned_power = reference_power[start + self.spread:stop + self.spread].mean()
+                if aligned_power >= 0.5 * echo_power:
+                    # Steady reference, so the ratio means something. Track the
+                    # lowest - echo alone - falling fast and rising slowly
+                    ratio = mic_power / aligned_power
+                    rate = 0.3 if ratio < self.coupling else 0.01
+                    self.coupling = min(10.0, max(1e-6, self.coupling + rate * (ratio - self.coupling)))
+                if mic_power <= self.coupling * echo_power * self.margin:
+                    gain = self.suppress_gain
+                    self.frames_suppressed += 1
+            out[start:stop] *= np.linspace(self._gain, gain, stop - start, dtype=np.float32)
+            self._gain = gain
+        return np.clip(out, -32768, 32767).astype(np.int16)
+
+    def _power(self, reference):
+        """Mean power around each sample, over one frame"""
+        x = (reference.astype(np.float32) / 32768.0) ** 2
+        kernel = np.full(self.frame, 1.0 / self.frame, dtype=np.float32)
+        return np.convolve(x, kernel, mode='same')
+
+
+# ============================================================================
+# FILE TEST - Run recordings through the suppressor on a simulated clock
+# ============================================================================
+def suppress_files(mic_path, speech_path, out_path=None, sample_rate=16000, block=1024, **settings):
+    """Play speech_path into a reference and suppress it in mic_path, block by block.
+
+    Both files start at time 0; the speech is written to the reference as a
+    speaker callback would, just ahead of the microphone. Returns the
+    processed audio and the suppressor (for its counters).
+    """
+    from vad import _read_wav
+    mic = _read_wav(mic_path, sample_rate)
+    speech = _read_wav(speech_path, sample_rate)
+    reference = EchoReference(sample_rate)
+    suppressor = EchoSuppressor(reference, sample_rate, **settings)
+    out = np.empty_like(mic)
+    for i in range(0, len(mic), block):
+        end = min(i + block, len(mic))
+        played = speech[i:end]
+        if len(played) < end - i:
+            played = np.concatenate((played, np.zeros(end - i - len(played), dtype=np.int16)))
+        reference.write(played, sample_rate, end / sample_rate)
+        out[i:end] = suppressor.process(mic[i:end], end / sample_rate)
+    if out_path:
+        from speak_engine import save_wav
+        save_wav(out_path, out, sample_rate)
+    return out, suppressor
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3:
+        print(__doc__)
+        sys.exit(1)
+    # Files are aligned sample for sample, so there is no playback delay to allow for
+    audio, suppressor = suppress_files(sys.argv[1], sys.argv[2], sys.argv[3] if len(sys.argv) > 3 else None,
+                                       delay_ms=0)
+    print(f"{suppressor.frames_suppressed} of {suppressor.frames_seen} frames suppressed, "
+          f"echo coupling {10 * np.log10(suppressor.coupling):.1f} dB")
@@ -0,0 +1,165 @@
+"""
+Runtime metrics for Speak Anywhere: latency histograms, counters and gauges.
+
+Recording is cheap enough to leave on all the time - a histogram sample is
+one bisect over fixed bucket edges and a few integer adds, with no lock (a
+sample lost to a rare thread race doesn't matter for diagnostics). The
+audio callbacks record into it directly.
+
+    from metrics import metrics
+    metrics.observe('synthesis.sentence_ms', 42.0)
+    metrics.count('playback.underruns')
+    metrics.snapshot()   # plain dict, e.g. for JSON
+
+start_log() appends a snapshot to a JSON-lines file at a fixed interval.
+"""
+
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+# Bucket upper edges: roughly 1-2-5 steps from 0.5 to 60000 (ms or items)
+DEFAULT_EDGES = tuple(m * 10 ** e for e in range(-1, 5) for m in (1, 2, 5) if m * 10 ** e >= 0.5) + (60000,)
+LOG_MAX_BYTES = 1024 * 1024
+
+
+class Histogram:
+    """Fixed-bucket histogram; percentiles are estimated from the buckets"""
+
+    def __init__(self, edges=DEFAULT_EDGES):
+        self.edges = edges
+        self.buckets = [0] * (len(edges) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = None
+
+    def observe(self, value):
+        self.buckets[bisect_left(self.edges, value)] += 1
+        self.count += 1
+        self.total += value
+        self.last = value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, q):
+        """Upper edge of the bucket holding the q-th percentile (0-100)"""
+        if not self.count:
+            return None
+        target = self.count * q / 100.0
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if n and seen >= target:
+                return min(self.edges[i], self.max) if i < len(self.edges) else self.max
+        return self.max
+
+    def summary(self):
+        if not self.count:
+            return {'count': 0}
+        return {
+            'count': self.count,
+            'mean': round(self.total / self.count, 2),
+            'p50': round(self.percentile(50), 2),
+            'p95': round(self.percentile(95), 2),
+            'max': round(self.max, 2),
+            'last': round(self.last, 2),
+        }
+
+
+class Metrics:
+    """Named histograms, counters and gauges, created on first use"""
+
+    def __init__(self):
+        self.enabled = True
+        self.started = time.time()
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}
+        self._create_lock = threading.Lock()
+        self._log_thread = None
+        self._log_stop = threading.Event()
+        self._log_settings = None  # (path, interval_seconds) of the running log
+
+    def observe(self, name, value):
+        if not self.enabled:
+            return
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self._create_lock:
+                histogram = self.histograms.setdefault(name, Histogram())
+        histogram.observe(value)
+
+    def count(self, name, n=1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def gauge(self, name, value):
+        if self.enabled:
+            self.gauges[name] = value
+
+    def summary(self, name):
+        histogram = self.histograms.get(name)
+        return histogram.summary() if histogram else {'count': 0}
+
+    def snapshot(self):
+        return {
+            'time': round(time.time(), 3),
+            'uptime_s': round(time.time() - self.started, 1),
+            'histograms': {name: h.summary() for name, h in sorted(self.histograms.items())},
+            'counters': dict(sorted(self.counters.items())),
+            'gauges': dict(sorted(self.gauges.items())),
+        }
+
+    def reset(self):
+        with self._create_lock:
+            self.histograms = {}
+            self.counters = {}
+            self.gauges = {}
+            self.started = time.time()
+
+    def start_log(self, path, interval_seconds=60):
+        """Append a snapshot to path every interval_seconds on a background thread.
+
+        The file is JSON lines; once it passes LOG_MAX_BYTES it is moved to
+        path + '.1' (replacing the previous one) and a new file is started.
+        Called again with the same path and interval, it leaves the running
+        log alone, so settings can be re-applied freely.
+        """
+        if self._log_thread is not None and self._log_settings == (path, interval_seconds):
+            return
+        self.stop_log()
+        self._log_stop = stop = threading.Event()
+        self._log_settings = (path, interval_seconds)
+
+        def run():
+            while not stop.wait(interval_seconds):
+                self.write_log(path)
+            self.write_log(path)
+
+        self._log_thread = threading.Thread(target=run, daemon=True, name="metrics-log")
+        self._log_thread.start()
+
+    def stop_log(self):
+        """Stop the periodic log, writing one last snapshot"""
+        if self._log_thread is not None:
+            self._log_stop.set()
+            self._log_thread.join(timeout=2)
+            self._log_thread = None
+            self._log_settings = None
+
+    def write_log(self, path):
+        if not self.enabled:
+            return
+        try:
+            if os.path.exists(path) and os.path.getsize(path) > LOG_MAX_BYTES:
+                os.replace(path, path + '.1')
+            with open(path, 'a') as f:
+                f.write(json.dumps(self.snapshot()) + "\n")
+        except OSError as e:
+            print(f"Could not write metrics log: {e}")
+
+
+metrics = Metrics()
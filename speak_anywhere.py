@@ -29,9 +29,109 @@ Requirements:
 ================================================================================
 """
 
-import tkinter as tk
 import os
 import sys
+import time
+import json
+import threading
+import configparser
+from contextlib import contextmanager
+
+# Headless file transcription - no windows, no splash, just the model
+if len(sys.argv) > 1 and sys.argv[1] == '--transcribe':
+    from transcribe import main as transcribe_main
+    sys.exit(transcribe_main(sys.argv[2:]))
+
+# Headless speech server - shares the models with other local tools
+if len(sys.argv) > 1 and sys.argv[1] == '--serve':
+    from speech_server import main as server_main
+    sys.exit(server_main(sys.argv[2:]))
+
+# ============================================================================
+# STARTUP TRACE - Optional timing of every startup phase
+# ============================================================================
+# Enable with --trace-startup (or SPEAKANYWHERE_TRACE=1). Writes
+# startup_trace.json to the AppData folder; --trace-chrome (or
+# SPEAKANYWHERE_TRACE=chrome) also writes a chrome://tracing / Perfetto file.
+class StartupTrace:
+    """Records named, timed phases relative to process start-up"""
+
+    def __init__(self, enabled=False, chrome=False):
+        self.enabled = enabled
+        self.chrome = chrome
+        self.origin = time.perf_counter()
+        self.events = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name, category='startup'):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, category, start, time.perf_counter())
+
+    def record(self, name, category, start, end):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.events.append({
+                'name': name,
+                'category': category,
+                'start_ms': round((start - self.origin) * 1000, 2),
+                'duration_ms': round((end - start) * 1000, 2),
+                'thread': threading.current_thread().name,
+            })
+
+    def mark(self, name, category='startup'):
+        """Record an instant (zero-length) event such as the first paint"""
+        now = time.perf_counter()
+        self.record(name, category, now, now)
+
+    def write(self, directory, extra=None):
+        """Write the JSON report (and Chrome trace if enabled), return its path"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            events = sorted(self.events, key=lambda e: e['start_ms'])
+        report = {
+            'elapsed_ms': round((time.perf_counter() - self.origin) * 1000, 2),
+            'python': sys.version.split()[0],
+            'frozen': bool(getattr(sys, 'frozen', False)),
+            'phases': events,
+        }
+        report.update(extra or {})
+        path = os.path.join(directory, 'startup_trace.json')
+        try:
+            with open(path, 'w') as f:
+                json.dump(report, f, indent=2)
+            if self.chrome:
+                threads = {}
+                trace_events = [{
+                    'name': e['name'], 'cat': e['category'], 'ph': 'X' if e['duration_ms'] else 'i',
+                    'ts': int(e['start_ms'] * 1000), 'dur': int(e['duration_ms'] * 1000),
+                    'pid': os.getpid(), 'tid': threads.setdefault(e['thread'], len(threads) + 1),
+                } for e in events]
+                with open(os.path.join(directory, 'startup_trace.chrome.json'), 'w') as f:
+                    json.dump({'traceEvents': trace_events}, f)
+        except OSError as e:
+            print(f"Could not write startup trace: {e}")
+            return None
+        return path
+
+_trace_mode = os.environ.get('SPEAKANYWHERE_TRACE', '').strip().lower()
+if '--trace-chrome' in sys.argv:
+    _trace_mode = 'chrome'
+elif '--trace-startup' in sys.argv and not _trace_mode:
+    _trace_mode = '1'
+startup_trace = StartupTrace(enabled=_trace_mode not in ('', '0', 'false', 'no'),
+                             chrome=_trace_mode == 'chrome')
+
+with startup_trace.phase("import tkinter", "import"):
+    import tkinter as tk
 
 # ============================================================================
 # IMMEDIATE LOADING SCREEN - Shows instantly before any heavy imports
@@ -43,6 +143,7 @@ else:
     _APP_DIR = os.path.dirname(os.path.abspath(__file__))
 
 # Show loading window IMMEDIATELY - before ANYTHING else
+_loading_started = time.perf_counter()
 _loading_root = tk.Tk()
 _loading_root.withdraw()
 _loading_root.overrideredirect(True)
@@ -81,34 +182,31 @@ _loading_root.lift()
 _loading_root.focus_force()
 _loading_root.update_idletasks()
 _loading_root.update()
+startup_trace.record("loading window", "ui", _loading_started, time.perf_counter())
 
 # Now do the heavy imports with progress updates
-import time as _time
-_time.sleep(0.05)
+time.sleep(0.05)
 
 _update_progress(10, "Loading core modules...")
-import pyperclip
-from tkinter import Canvas
-import threading
-from PIL import Image, ImageTk, ImageDraw, ImageFilter
-import pyautogui
-import time
-
-_update_progress(20, "Loading audio system...")
-import pyaudio
-
-_update_progress(30, "Loading speech recognition...")
-from vosk import Model, KaldiRecognizer
-import json
+with startup_trace.phase("import core modules", "import"):
+    import pyperclip
+    from tkinter import Canvas
+    from PIL import Image, ImageTk, ImageDraw, ImageFilter
+    import pyautogui
 
 _update_progress(50, "Loading video system...")
-import cv2
-import pygame
+with startup_trace.phase("import pygame", "import"):
+    import pygame
+    from splash_frames import SplashFrames
 
 _update_progress(60, "Loading audio playback...")
-import wave
-import sounddevice as sd
-import numpy as np
+with startup_trace.phase("import speak_engine + numpy", "import"):
+    from speak_engine import (ModelManager, SynthCache, SpeechEngine, DictationEngine, TypingQueue,
+                              AudioSession, load_vosk_model, load_piper_voice)
+    from echo import EchoReference
+    from commands import CommandGrammar
+    from devices import Device, DeviceRegistry, best_microphone
+    from metrics import metrics
 
 # ============================================================================
 # APPLICATION INFO
@@ -123,8 +221,6 @@ APP_COPYRIGHT = "Copyright (c) 2024 Nice Dreamz LLC. All Rights Reserved."
 # ============================================================================
 # SETTINGS - Auto-detect paths for portability
 # ============================================================================
-FORCE_MICROPHONE_INDEX = None
-
 # Get the application directory (works for both script and PyInstaller exe)
 # Already determined earlier for loading screen
 APP_DIR = _APP_DIR
@@ -133,8 +229,8 @@ APP_DIR = _APP_DIR
 RESOURCES_DIR = os.path.join(APP_DIR, "_resources")
 
 # Config file location - use AppData so it persists even if app is moved/run from USB
-def get_config_path():
-    """Get config file path in user's AppData folder (persists across app locations)"""
+def get_config_dir():
+    """Get the app's folder in the user's AppData (persists across app locations)"""
     appdata = os.environ.get('APPDATA', os.path.expanduser('~'))
     config_dir = os.path.join(appdata, 'SpeakAnywhere')
     if not os.path.exists(config_dir):
@@ -142,63 +238,339 @@ def get_config_path():
             os.makedirs(config_dir)
         except:
             pass
-    return os.path.join(config_dir, 'config.ini')
+    return config_dir
+
+def get_config_path():
+    """Get config file path in user's AppData folder"""
+    return os.path.join(get_config_dir(), 'config.ini')
 
 CONFIG_FILE = get_config_path()
 
+# ============================================================================
+# CONFIG - Typed settings in config.ini, re-read when the file changes
+# ============================================================================
+def _parse_bool(value):
+    value = value.strip().lower()
+    if value in ('1', 'true', 'yes', 'on'):
+        return True
+    if value in ('0', 'false', 'no', 'off', ''):
+        return False
+    raise ValueError(f"not a boolean: {value!r}")
+
+def _parse_optional_int(value):
+    return int(value) if value.strip() else None
+
+# (section, key, parser, default, description) - keys are unique across sections
+CONFIG_SCHEMA = [
+    ('general', 'setup_complete', _parse_bool, False, "First-run setup has been shown"),
+    ('general', 'fast_start', _parse_bool, False, "Skip the splash screen"),
+    ('general', 'preload_models', _parse_bool, True,
+     "Load both models in the background at startup (false = on first use)"),
+    ('audio', 'sample_rate', int, 16000, "Microphone sample rate for recognition (Hz)"),
+    ('audio', 'chunk_size', int, 1024, "Microphone frames per recognizer step"),
+    ('audio', 'capture_buffer_seconds', float, 10.0,
+     "Microphone audio buffered while recognition catches up (overflow is dropped)"),
+    ('audio', 'force_microphone_index', _parse_optional_int, None,
+     "Always use this PortAudio input device index (blank = pick automatically)"),
+    ('audio', 'playback_block_size', int, 1024, "Frames per speaker callback"),
+    ('audio', 'playback_buffer_seconds', float, 5.0, "How far synthesis may run ahead of the speaker"),
+    ('audio', 'stretch_buffer_seconds', float, 0.25,
+     "Stretched audio queued for the speaker (speed change latency)"),
+    ('dictation', 'timeout_seconds', float, 10.0, "Stop dictating after this long without speech"),
+    ('dictation', 'debounce_seconds', float, 0.3, "Ignore repeated mic clicks within this time"),
+    ('dictation', 'vad', _parse_bool, True,
+     "Only pass detected speech to the recognizer (saves CPU while the mic is open)"),
+    ('dictation', 'vad_margin_db', float, 10.0, "How far above background noise counts as speech"),
+    ('dictation', 'vad_hangover_ms', int, 400, "Keep listening this long after speech stops"),
+    ('dictation', 'vad_preroll_ms', int, 300, "Audio kept from before speech starts"),
+    ('dictation', 'stable_partials', int, 2,
+     "Partial results a word must survive before it is typed (higher = fewer corrections, more lag)"),
+    ('dictation', 'corrections', _parse_bool, True,
+     "Backspace over typed words when the recognizer revises them"),
+    ('dictation', 'barge_in', str, 'pause',
+     "Speech still playing when dictation starts: pause (resumes after), duck (keeps playing quietly) or stop"),
+    ('dictation', 'duck_volume', float, 0.2, "Speech volume while ducked, 0 - 1"),
+    ('dictation', 'echo_suppression', _parse_bool, True,
+     "Keep speech that is playing out of the recognizer, using what the speaker plays as the reference"),
+    ('typing', 'method', str, 'keys',
+     "How dictated text is typed: keys (keystroke per character), paste (clipboard + Ctrl+V) "
+     "or unicode (Windows text input events, one batch per phrase)"),
+    ('typing', 'char_interval', float, 0.005, "Delay between keystrokes for the keys method"),
+    ('speech', 'speed', float, 1.0, "Playback speed, 0.5 - 2.0"),
+    ('speech', 'synth_workers', int, 0, "Parallel Piper sessions (0 = half the CPU cores, at most 4)"),
+    ('speech', 'synth_lookahead', int, 0, "Sentences synthesized ahead of playback (0 = 2 x workers)"),
+    ('speech', 'export_audio', _parse_bool, False, "Also save each utterance to tts_export.wav"),
+    ('cache', 'memory_mb', int, 64, "In-memory cache of synthesized sentences"),
+    ('cache', 'disk_mb', int, 0, "On-disk sentence cache in this folder (0 = off)"),
+    ('metrics', 'enabled', _parse_bool, True, "Record latency histograms and audio glitch counters"),
+    ('metrics', 'log_interval_seconds', int, 60, "Append a metrics snapshot to metrics.jsonl this often (0 = never)"),
+    ('metrics', 'overlay', _parse_bool, False, "Show the live metrics overlay at startup (Ctrl+Shift+D toggles it)"),
+    ('devices', 'hide', str, '', "Extra device name fragments to leave out of the lists, comma separated"),
+    ('devices', 'poll_seconds', float, 3.0, "How often to check for plugged-in or removed devices (0 = never)"),
+    ('devices', 'microphone', str, '', "Last chosen microphone"),
+    ('devices', 'speaker', str, '', "Last chosen speaker"),
+    ('devices', 'input_devices', str, '', "Last microphone scan (shown at startup while devices are re-scanned)"),
+    ('devices', 'output_devices', str, '', "Last speaker scan (shown at startup while devices are re-scanned)"),
+]
+
+class AppConfig:
+    """Typed settings backed by an INI file.
+
+    Values that are missing or don't parse fall back to their defaults. The
+    file is rewritten with every key (and its description) on save, so all
+    the knobs are visible to anyone tuning a machine. on_reload, if set, is
+    called whenever edits made to the file by hand have been read in.
+    """
+
+    def __init__(self, path, schema):
+        self.path = path
+        self.schema = {(section, key): (parser, default, description)
+                       for section, key, parser, default, description in schema}
+        self.on_reload = None
+        self._values = {}
+        self._mtime = None
+        self._lock = threading.RLock()
+        self.load()
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def get(self, section, key):
+        return self._values[(section, key)]
+
+    def load(self):
+        with self._lock:
+            values = {name: spec[1] for name, spec in self.schema.items()}
+            raw = self._read_raw()
+            # False for a new file, the old flat format or one missing newer keys
+            self.complete = all(name in raw for name in self.schema)
+            for name, text in raw.items():
+                if name not in self.schema:
+                    continue
+                try:
+                    values[name] = self.schema[name][0](text)
+                except ValueError as e:
+                    print(f"Ignoring bad config value {name[0]}.{name[1]}: {e}")
+            self._values = values
+            self._mtime = self._current_mtime()
+
+    def reload_if_changed(self):
+        """Re-read the file if it was edited since the last load; True if so"""
+        if not self._load_if_changed():
+            return False
+        if self.on_reload:
+            self.on_reload()
+        return True
+
+    def update(self, section, **values):
+        """Set values in one section and save"""
+        with self._lock:
+            reloaded = self._load_if_changed()  # Don't overwrite edits made by hand
+            for key, value in values.items():
+                if (section, key) not in self.schema:
+                    raise KeyError(f"unknown setting {section}.{key}")
+                self._values[(section, key)] = value
+            self.save()
+        # The save hides the edit from the reload poll, so apply it here
+        if reloaded and self.on_reload:
+            self.on_reload()
+
+    def _load_if_changed(self):
+        if self._current_mtime() == self._mtime:
+            return False
+        self.load()
+        return True
+
+    def save(self):
+        with self._lock:
+            lines = []
+            current = None
+            for (section, key), (parser, default, description) in self.schema.items():
+                if section != current:
+                    if lines:
+                        lines.append("")
+                    lines.append(f"[{section}]")
+                    current = section
+                lines.append(f"# {description}")
+                lines.append(f"{key} = {self._format(self._values[(section, key)])}")
+            try:
+                temp_file = self.path + ".tmp"
+                with open(temp_file, 'w', encoding='utf-8') as f:
+                    f.write("\n".join(lines) + "\n")
+                os.replace(temp_file, self.path)
+                self._mtime = self._current_mtime()
+            except OSError as e:
+                print(f"Could not save config: {e}")
+
+    @staticmethod
+    def _format(value):
+        if isinstance(value, bool):
+            return 'true' if value else 'false'
+        return '' if value is None else str(value)
+
+    def _current_mtime(self):
+        try:
+            return os.path.getmtime(self.path)
+        except OSError:
+            return None
+
+    def _read_raw(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                text = f.read()
+        except OSError:
+            return {}
+        parser = configparser.ConfigParser(interpolation=None)
+        try:
+            parser.read_string(text)
+        except configparser.MissingSectionHeaderError:
+            # Older versions wrote flat key=value lines
+            sections = {key: section for section, key in self.schema}
+            raw = {}
+            for line in text.splitlines():
+                key, sep, value = line.partition('=')
+                key = key.strip()
+                if sep and key in sections:
+                    raw[(sections[key], key)] = value.strip()
+            return raw
+        except configparser.Error as e:
+            print(f"Could not read config, using defaults: {e}")
+            return {}
+        return {(section, key): value
+                for section in parser.sections() for key, value in parser[section].items()}
+
+config = AppConfig(CONFIG_FILE, CONFIG_SCHEMA)
+
+def apply_config():
+    """Copy the tunables from config into the module-level settings.
+
+    Everything reads these globals when it starts a new utterance, stream or
+    synthesis run, so re-applying after a reload changes behaviour without a
+    restart.
+    """
+    global FORCE_MICROPHONE_INDEX, SAMPLE_RATE, CHUNK_SIZE, CAPTURE_BUFFER_SECONDS
+    global TIMEOUT_SECONDS, DEBOUNCE_SECONDS, TYPING_METHOD, TYPING_CHAR_INTERVAL
+    global VAD_ENABLED, VAD_MARGIN_DB, VAD_HANGOVER_MS, VAD_PREROLL_MS, STABLE_PARTIALS, CORRECTIONS
+    global BARGE_IN, DUCK_VOLUME, ECHO_SUPPRESSION
+    global PLAYBACK_BLOCK_SIZE, PLAYBACK_BUFFER_SECONDS, STRETCH_BUFFER_SECONDS
+    global SYNTH_WORKERS, SYNTH_LOOKAHEAD, EXPORT_AUDIO, TTS_CACHE_MEMORY_MB, TTS_CACHE_DISK_MB
+    global PRELOAD_MODELS, METRICS_ENABLED, METRICS_LOG_INTERVAL, METRICS_OVERLAY
+    global DEVICE_HIDE, DEVICE_POLL_SECONDS
+    FORCE_MICROPHONE_INDEX = config.get('audio', 'force_microphone_index')
+    SAMPLE_RATE = config.get('audio', 'sample_rate')
+    CHUNK_SIZE = config.get('audio', 'chunk_size')
+    CAPTURE_BUFFER_SECONDS = config.get('audio', 'capture_buffer_seconds')
+    PLAYBACK_BLOCK_SIZE = config.get('audio', 'playback_block_size')
+    PLAYBACK_BUFFER_SECONDS = config.get('audio', 'playback_buffer_seconds')
+    STRETCH_BUFFER_SECONDS = config.get('audio', 'stretch_buffer_seconds')
+    TIMEOUT_SECONDS = config.get('dictation', 'timeout_seconds')
+    DEBOUNCE_SECONDS = config.get('dictation', 'debounce_seconds')
+    VAD_ENABLED = config.get('dictation', 'vad')
+    VAD_MARGIN_DB = config.get('dictation', 'vad_margin_db')
+    VAD_HANGOVER_MS = config.get('dictation', 'vad_hangover_ms')
+    VAD_PREROLL_MS = config.get('dictation', 'vad_preroll_ms')
+    STABLE_PARTIALS = config.get('dictation', 'stable_partials')
+    CORRECTIONS = config.get('dictation', 'corrections')
+    BARGE_IN = config.get('dictation', 'barge_in').strip().lower()
+    DUCK_VOLUME = min(1.0, max(0.0, config.get('dictation', 'duck_volume')))
+    ECHO_SUPPRESSION = config.get('dictation', 'echo_suppression')
+    TYPING_METHOD = config.get('typing', 'method').strip().lower()
+    TYPING_CHAR_INTERVAL = config.get('typing', 'char_interval')
+    # Long text is synthesized a few sentences at a time on worker threads,
+    # each with its own Piper session, while earlier sentences are playing
+    SYNTH_WORKERS = config.get('speech', 'synth_workers') or max(1, min(4, (os.cpu_count() or 2) // 2))
+    SYNTH_LOOKAHEAD = config.get('speech', 'synth_lookahead') or 2 * SYNTH_WORKERS
+    # Speech is played straight from memory; export_audio also saves each
+    # utterance as a WAV file (off by default - APP_DIR may be a USB stick)
+    EXPORT_AUDIO = config.get('speech', 'export_audio')
+    # Synthesized sentences are cached so repeated text plays instantly. The
+    # disk tier lives in AppData (not APP_DIR) and is off unless given a size.
+    TTS_CACHE_MEMORY_MB = config.get('cache', 'memory_mb')
+    TTS_CACHE_DISK_MB = config.get('cache', 'disk_mb')
+    # Warm both models in the background as soon as the app starts. With this
+    # off, each model only loads the first time dictation / speech is used.
+    PRELOAD_MODELS = config.get('general', 'preload_models')
+    METRICS_ENABLED = config.get('metrics', 'enabled')
+    METRICS_LOG_INTERVAL = config.get('metrics', 'log_interval_seconds')
+    METRICS_OVERLAY = config.get('metrics', 'overlay')
+    DEVICE_HIDE = config.get('devices', 'hide')
+    DEVICE_POLL_SECONDS = config.get('devices', 'poll_seconds')
+
+apply_config()
+if not config.complete:
+    config.save()  # Write every key out (and migrate the old flat format)
+
 def is_first_run():
     """Check if this is the first time running the app"""
-    return not os.path.exists(CONFIG_FILE)
+    return not config.get('general', 'setup_complete')
 
 def save_first_run_complete():
     """Mark that first run setup is complete"""
-    try:
-        with open(CONFIG_FILE, 'w') as f:
-            f.write("setup_complete=true\n")
-    except:
-        pass
+    config.update('general', setup_complete=True)
+
+# Fast start skips the splash video and reuses the device lists from the last
+# run, scanning devices again in the background once the window is up.
+# Turn on with fast_start = true in config.ini or --fast-start.
+FAST_START = config.get('general', 'fast_start') or '--fast-start' in sys.argv
 
-VIDEO_FILE = os.path.join(RESOURCES_DIR, "splash_video.mp4")
+# Splash animation, pre-cropped and scaled from splash_video.mp4 by
+# "python splash_frames.py convert" so OpenCV isn't needed at runtime
+SPLASH_FRAMES_FILE = os.path.join(RESOURCES_DIR, "splash_frames.bin")
 MODEL_PATH = os.path.join(RESOURCES_DIR, "vosk-model-small-en-us-0.15")
 # Piper TTS voice model (offline neural voice - HFC Male, natural casual voice)
 PIPER_MODEL_PATH = os.path.join(RESOURCES_DIR, "piper", "en_US-hfc_male-medium.onnx")
 # ============================================================================
 
+# ============================================================================
+# MODEL MANAGER - Background loading, waited on only when first needed
+# ============================================================================
+models = ModelManager({
+    'vosk': lambda: load_vosk_model(MODEL_PATH),
+    'piper': lambda: load_piper_voice(PIPER_MODEL_PATH),
+}, trace=startup_trace)
+if PRELOAD_MODELS:
+    models.preload('vosk', 'piper')
+
 # ============================================================================
 # VIDEO SPLASH SCREEN WITH AUDIO
 # ============================================================================
 # Close the loading screen, switch to video splash
 _loading_root.destroy()
 
+_splash_started = time.perf_counter()
 splash = tk.Tk()
 splash.overrideredirect(True)
 splash.attributes('-topmost', True)
 splash.configure(bg='black')
 
-# Initialize pygame mixer for audio
-AUDIO_FILE = os.path.join(RESOURCES_DIR, "splash_audio.mp3")
-pygame.mixer.init()
-try:
-    pygame.mixer.music.load(AUDIO_FILE)
-    pygame.mixer.music.set_volume(0.4)
-    pygame.mixer.music.play(0)  # Play once
-except:
-    pass
-
-# Get video dimensions
-cap = cv2.VideoCapture(VIDEO_FILE)
-video_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-video_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-fps = cap.get(cv2.CAP_PROP_FPS)
-if fps <= 0:
-    fps = 24
-
-# Crop to square
-square_size = min(video_width, video_height)
-crop_x = (video_width - square_size) // 2
-crop_y = (video_height - square_size) // 2
+# Fast start goes straight to the main window. The first run still shows the
+# splash, which the setup dialog is parented to.
+skip_splash = FAST_START and not is_first_run()
+frames = None
+fps = 24
 display_size = 250
 
+if skip_splash:
+    splash.withdraw()
+else:
+    # Initialize pygame mixer for audio
+    AUDIO_FILE = os.path.join(RESOURCES_DIR, "splash_audio.mp3")
+    pygame.mixer.init()
+    try:
+        pygame.mixer.music.load(AUDIO_FILE)
+        pygame.mixer.music.set_volume(0.4)
+        pygame.mixer.music.play(0)  # Play once
+    except:
+        pass
+
+    # Open the pre-baked frames (no animation if they're missing)
+    try:
+        frames = SplashFrames(SPLASH_FRAMES_FILE)
+        fps = frames.fps if frames.fps > 0 else 24
+        display_size = frames.width
+    except (OSError, ValueError) as e:
+        print(f"Splash frames unavailable: {e}")
+
 # Center on screen
 x = (splash.winfo_screenwidth() - display_size) // 2
 y = (splash.winfo_screenheight() - display_size) // 2
@@ -211,12 +583,14 @@ loading_text = tk.Label(splash, text="Loading...", bg='black', fg='#00d4ff', fon
 loading_text.pack(pady=3)
 
 # Play video once
-model_loaded = [False]
 video_finished = [False]
 
+frame_index = [0]
+frame_image = ImageTk.PhotoImage('RGB', (display_size, display_size))
+video_label.configure(image=frame_image)
+
 def play_video():
-    ret, frame = cap.read()
-    if not ret:
+    if frames is None or frame_index[0] >= len(frames):
         video_finished[0] = True
         try:
             pygame.mixer.music.stop()
@@ -224,51 +598,26 @@ def play_video():
             pass
         return
 
-    frame = frame[crop_y:crop_y+square_size, crop_x:crop_x+square_size]
-    frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    frame = cv2.resize(frame, (display_size, display_size))
-    img = Image.fromarray(frame)
-    imgtk = ImageTk.PhotoImage(image=img)
-    video_label.imgtk = imgtk
-    video_label.configure(image=imgtk)
+    # Frames are already cropped and scaled - just decode and paste in place
+    started = time.perf_counter()
+    frame_image.paste(frames.image(frame_index[0]))
+    frame_index[0] += 1
 
     if not video_finished[0]:
-        splash.after(int(1000/fps), play_video)
+        elapsed_ms = int((time.perf_counter() - started) * 1000)
+        splash.after(max(1, int(1000 / fps) - elapsed_ms), play_video)
 
 play_video()
 splash.update()
 
-# Load model in background
-model = [None]
-def load_model():
-    model[0] = Model(MODEL_PATH)
-    model_loaded[0] = True
-
-load_thread = threading.Thread(target=load_model, daemon=True)
-load_thread.start()
-
-# Wait for video to finish
+# Wait for video to finish (models keep loading in the background)
 while not video_finished[0]:
     splash.update()
     time.sleep(0.01)
 
-cap.release()
-
-# Wait for model if needed
-if not model_loaded[0]:
-    loading_text.config(text="Almost ready...")
-    splash.update()
-    while not model_loaded[0]:
-        splash.update()
-        time.sleep(0.01)
-
-model = model[0]
-
-# Pre-load Piper TTS voice during splash to avoid delay on first use
-loading_text.config(text="Loading voice...")
-splash.update()
-from piper import PiperVoice
-_piper_voice = PiperVoice.load(PIPER_MODEL_PATH)
+if frames is not None:
+    frames.close()
+startup_trace.record("splash video", "ui", _splash_started, time.perf_counter())
 
 # ============================================================================
 # SETUP DIALOG - First run options
@@ -401,7 +750,8 @@ def create_shortcuts(desktop=False, startmenu=False):
 
 # Only show setup dialog on FIRST RUN
 if is_first_run():
-    setup_result = show_setup_dialog()
+    with startup_trace.phase("setup dialog", "ui"):
+        setup_result = show_setup_dialog()
 
     # Create shortcuts if requested
     create_shortcuts(setup_result.get('desktop', False), setup_result.get('startmenu', False))
@@ -418,132 +768,53 @@ if is_first_run():
 # ============================================================================
 # SETUP
 # ============================================================================
-speaking_thread = None
-dictation_thread = None
-dictation_active = False
-stream = None
-is_speaking = False
-stop_playback = False
 last_click_time = 0
-DEBOUNCE_SECONDS = 0.3
-current_speed = 1.0
-temp_audio_file = os.path.join(APP_DIR, "tts_temp.wav")
-
-pa = pyaudio.PyAudio()
-SAMPLE_RATE = 16000
-CHUNK_SIZE = 1024
-TIMEOUT_SECONDS = 10
+current_speed = min(2.0, max(0.5, config.get('speech', 'speed')))
+export_audio_file = os.path.join(APP_DIR, "tts_export.wav")
+TTS_CACHE_DIR = os.path.join(get_config_dir(), "tts_cache")
+METRICS_LOG_FILE = os.path.join(get_config_dir(), "metrics.jsonl")
+COMMANDS_FILE = os.path.join(get_config_dir(), "commands.ini")
 
-# Microphone index will be set after device detection below
+# Microphone and speaker streams stay open for the whole run (sounddevice for both)
+with startup_trace.phase("audio session", "devices"):
+    audio = AudioSession()
 
-# Get available microphones - show only real physical microphones
-def get_input_devices():
-    devices = []
-    seen_simple_names = set()
-
-    for i in range(pa.get_device_count()):
-        try:
-            info = pa.get_device_info_by_index(i)
-            if info.get('maxInputChannels', 0) > 0:
-                name = info['name']
-                name_lower = name.lower()
+# Microphones and speakers worth listing (rules in devices.py, plus [devices] hide)
+device_registry = DeviceRegistry(hidden=DEVICE_HIDE.split(','))
 
-                # Skip system/virtual devices
-                if 'primary sound' in name_lower:
-                    continue
-                if 'stereo mix' in name_lower or 'what u hear' in name_lower:
-                    continue
-                if 'loopback' in name_lower:
-                    continue
-                # Skip virtual/fake devices
-                if 'camo' in name_lower:  # Camo virtual webcam
-                    continue
-                if '@system32' in name_lower:  # Bluetooth placeholder
-                    continue
-                if 'hands-free' in name_lower:  # Bluetooth audio gateway
-                    continue
-
-                # Create a simple name for deduplication (remove host API suffix)
-                simple_name = name.split('(')[0].strip().lower()[:20]
-                if simple_name in seen_simple_names:
-                    continue
-                seen_simple_names.add(simple_name)
-
-                # Truncate display name if needed
-                display_name = name if len(name) <= 40 else name[:37] + "..."
-                devices.append((i, display_name))
-        except:
-            pass
-
-    if not devices:
-        devices.append((0, "Default Microphone"))
-    return devices
-
-# Get available speakers using sounddevice (better device control)
-def get_output_devices():
-    devices = []
-    has_realtek = False
-    has_usb = False
-
-    for i, dev in enumerate(sd.query_devices()):
-        if dev['max_output_channels'] > 0:
-            name = dev['name']
-            name_lower = name.lower()
-
-            # Skip system/virtual devices
-            if 'primary sound' in name_lower:
-                continue
-            if 'sound mapper' in name_lower:
-                continue
-            if '@system32' in name_lower:
-                continue
-            if 'hands-free' in name_lower:
-                continue
-            if name.strip() == 'Headphones ()' or name.strip() == 'Room Speaker ()':
-                continue
-
-            # Only keep one Realtek (laptop speakers) - prefer "Speakers" not "Headphones"
-            if 'realtek' in name_lower and 'speaker' in name_lower:
-                if has_realtek:
-                    continue
-                has_realtek = True
-                devices.append((i, "Laptop Speakers"))
-            # Only keep one USB Audio Device
-            elif 'usb audio' in name_lower:
-                if has_usb:
-                    continue
-                has_usb = True
-                devices.append((i, "USB Headset"))
-
-    if not devices:
-        devices.append((-1, "Default Speakers"))
-    return devices
-
-input_devices = get_input_devices()
-output_devices = get_output_devices()
-
-# Auto-select best microphone (prefer Realtek/built-in, then USB/external)
-def auto_select_best_mic():
-    # First try to find Realtek (laptop built-in mic)
-    for idx, name in input_devices:
-        name_lower = name.lower()
-        if 'realtek' in name_lower and 'mic' in name_lower:
-            return idx, name
-    # Then try USB or external microphones
-    for idx, name in input_devices:
-        name_lower = name.lower()
-        if 'usb' in name_lower or 'external' in name_lower or 'headset' in name_lower:
-            return idx, name
-    # Otherwise use first available
-    if input_devices:
-        return input_devices[0]
-    return (0, "Default")
-
-MICROPHONE_INDEX, selected_mic_name = auto_select_best_mic()
-
-# Track selected speaker for audio output
-SPEAKER_INDEX = output_devices[0][0] if output_devices else -1
-selected_speaker_name = output_devices[0][1] if output_devices else "Default"
+def load_cached_devices(key):
+    """Device list saved by a previous run, or None"""
+    try:
+        return [Device(*device) for device in json.loads(config.get('devices', key))]
+    except (KeyError, ValueError, TypeError):
+        return None
+
+def save_device_lists():
+    """Remember the device lists so the next start can skip enumeration"""
+    inputs, outputs = json.dumps(input_devices), json.dumps(output_devices)
+    if config.get('devices', 'input_devices') != inputs or config.get('devices', 'output_devices') != outputs:
+        config.update('devices', input_devices=inputs, output_devices=outputs)
+
+# Show last run's devices now and re-scan once the window is up; only a
+# first run (or one after an upgrade) has to enumerate before the window
+input_devices = load_cached_devices('input_devices')
+output_devices = load_cached_devices('output_devices')
+devices_from_cache = bool(input_devices and output_devices)
+if not devices_from_cache:
+    with startup_trace.phase("scan devices", "devices"):
+        device_registry.scan()
+    input_devices, output_devices = device_registry.inputs, device_registry.outputs
+    save_device_lists()
+
+def find_device(devices, wanted, fallback):
+    """Look a device up by its stable key (indexes can change between runs)"""
+    return device_registry.find(devices, wanted) or fallback
+
+# Use last run's choices when those devices are still present
+selected_mic = find_device(input_devices, config.get('devices', 'microphone'), best_microphone(input_devices))
+selected_speaker = find_device(output_devices, config.get('devices', 'speaker'), output_devices[0])
+MICROPHONE_INDEX = selected_mic.index
+SPEAKER_INDEX = selected_speaker.index
 
 pyautogui.FAILSAFE = False
 pyautogui.PAUSE = 0.01
@@ -609,216 +880,181 @@ def create_mic_button(size, color, glow=False):
     return img
 
 # ============================================================================
-# FUNCTIONS
+# UI EVENTS - Worker threads post UI changes here; the Tk thread applies them
+# ============================================================================
+# Tk isn't thread-safe: the engines, device scans and stream warm-up run on
+# their own threads and must never call into it. They post a function instead,
+# and drain_ui_events() runs the pending ones on the Tk thread once a frame,
+# in the order posted. Redraws that only show current state can pass a key:
+# posts with the same key coalesce, so only the latest gets drawn. State
+# transitions with side effects are posted without one and never dropped.
+UI_FRAME_MS = 16
+ui_events = {}   # key -> (func, args), in the order last posted
+ui_events_lock = threading.Lock()
+
+def post_ui(func, *args, key=None):
+    """Run func(*args) on the Tk thread; with key, replaces a pending post with the same key"""
+    if key is None:
+        key = object()  # Never matches another post
+    with ui_events_lock:
+        if ui_events.pop(key, None) is not None:
+            metrics.count('ui.events_coalesced')
+        ui_events[key] = (func, args)
+
+def drain_ui_events(due=None):
+    started = time.perf_counter()
+    if due is not None:
+        metrics.observe('ui.frame_lag_ms', max(0.0, 1000 * (started - due)))
+    with ui_events_lock:
+        pending = list(ui_events.values())
+        ui_events.clear()
+    for func, args in pending:
+        try:
+            func(*args)
+        except Exception as e:
+            print(f"UI update failed: {e}")
+    # Schedule against the start of this frame, so slow updates don't stretch the cadence
+    delay = max(1, UI_FRAME_MS - int(1000 * (time.perf_counter() - started)))
+    root.after(delay, drain_ui_events, time.perf_counter() + delay / 1000)
+
 # ============================================================================
+# ENGINES - Speech and dictation pipelines (speak_engine.py), driven by the UI
+# ============================================================================
+synth_cache = SynthCache(TTS_CACHE_MEMORY_MB * 1024 * 1024, TTS_CACHE_DIR,
+                         TTS_CACHE_DISK_MB * 1024 * 1024)
+typing_queue = TypingQueue()
+
+def on_speech_state(state):
+    # Drawn from speech.state, not state, so a coalesced post loses nothing
+    if speech.state == 'loading':
+        show_status("Loading voice...", GREEN_ACTIVE)
+    else:
+        update_speak_button()
+
+def on_dictation_state(state):
+    if state == 'starting':
+        update_mic_button(True)
+    elif state == 'loading':
+        show_instruction("Loading speech model...", GREEN_ACTIVE)
+    elif state == 'listening':
+        show_instruction("Listening...", GREEN_ACTIVE)
+    elif state == 'stopped':
+        if typing_queue.latencies:
+            latencies = list(typing_queue.latencies)
+            print(f"Typing latency: {len(latencies)} phrases, "
+                  f"avg {1000 * sum(latencies) / len(latencies):.0f} ms, "
+                  f"max {1000 * max(latencies):.0f} ms")
+        update_mic_button(False)
+        end_barge_in()
+
+speech = SpeechEngine(models, PIPER_MODEL_PATH, synth_cache, SYNTH_WORKERS,
+                      speed=current_speed,
+                      on_state=lambda state: post_ui(on_speech_state, state, key='speech_state'))
+speech.stream_factory = audio.output
+dictation = DictationEngine(models, typing_queue, audio,
+                            on_state=lambda state: post_ui(on_dictation_state, state))
+# Voice commands and punctuation, editable in commands.ini next to config.ini
+dictation.commands = CommandGrammar.load(COMMANDS_FILE)
+
+def apply_engine_settings():
+    """Hand the current settings to the engines (on startup and config reload)"""
+    synth_cache.resize(TTS_CACHE_MEMORY_MB * 1024 * 1024, TTS_CACHE_DISK_MB * 1024 * 1024)
+    speech.pool.set_workers(SYNTH_WORKERS)
+    speech.lookahead = SYNTH_LOOKAHEAD
+    speech.export_path = export_audio_file if EXPORT_AUDIO else None
+    speech.block_size = PLAYBACK_BLOCK_SIZE
+    speech.buffer_seconds = PLAYBACK_BUFFER_SECONDS
+    speech.stretch_buffer_seconds = STRETCH_BUFFER_SECONDS
+    typing_queue.method = TYPING_METHOD
+    typing_queue.char_interval = TYPING_CHAR_INTERVAL
+    dictation.sample_rate = SAMPLE_RATE
+    dictation.chunk_size = CHUNK_SIZE
+    dictation.buffer_seconds = CAPTURE_BUFFER_SECONDS
+    dictation.timeout_seconds = TIMEOUT_SECONDS
+    dictation.vad = VAD_ENABLED
+    dictation.vad_margin_db = VAD_MARGIN_DB
+    dictation.vad_hangover_ms = VAD_HANGOVER_MS
+    dictation.vad_preroll_ms = VAD_PREROLL_MS
+    dictation.stable_partials = STABLE_PARTIALS
+    dictation.corrections = CORRECTIONS
+    if not ECHO_SUPPRESSION:
+        speech.echo_reference = None
+    elif speech.echo_reference is None or speech.echo_reference.sample_rate != SAMPLE_RATE:
+        speech.echo_reference = EchoReference(SAMPLE_RATE)
+    dictation.echo_reference = speech.echo_reference
+    metrics.enabled = METRICS_ENABLED
+    if METRICS_ENABLED and METRICS_LOG_INTERVAL > 0:
+        metrics.start_log(METRICS_LOG_FILE, METRICS_LOG_INTERVAL)  # Left running if unchanged
+    else:
+        metrics.stop_log()
 
-# Use pre-loaded Piper TTS voice (loaded during splash screen)
-def get_piper_voice():
-    return _piper_voice
+apply_engine_settings()
 
-def generate_speech_piper(text, output_file):
-    """Generate speech using Piper TTS (offline neural voice)"""
-    voice = get_piper_voice()
+def current_microphone_index():
+    return MICROPHONE_INDEX if FORCE_MICROPHONE_INDEX is None else FORCE_MICROPHONE_INDEX
 
-    # Collect audio from chunks
-    audio_bytes = b''
-    sample_rate = None
-    for chunk in voice.synthesize(text):
-        audio_bytes += chunk.audio_int16_bytes
-        sample_rate = chunk.sample_rate
+def current_speaker_index():
+    return SPEAKER_INDEX
 
-    # Adjust sample rate for speed (higher = faster playback)
-    adjusted_rate = int(sample_rate * current_speed)
+def warm_audio_streams():
+    """Open the chosen microphone and speaker in the background, so the first
+    dictation or speech doesn't wait for the devices"""
+    def warm():
+        dictation.prepare(current_microphone_index())
+        speech.device = current_speaker_index()
+        if PRELOAD_MODELS:
+            try:
+                speech.prepare(models.get('piper').config.sample_rate)
+            except Exception:
+                pass  # Reported when speech is first used
+    threading.Thread(target=warm, daemon=True, name="warm-audio").start()
 
-    # Save to WAV file
-    with wave.open(output_file, 'wb') as f:
-        f.setnchannels(1)
-        f.setsampwidth(2)  # 16-bit audio
-        f.setframerate(adjusted_rate)  # Speed controlled by sample rate
-        f.writeframes(audio_bytes)
+warm_audio_streams()
 
+# ============================================================================
+# FUNCTIONS
+# ============================================================================
 def speak_clipboard():
-    global speaking_thread, is_speaking, stop_playback
-
     text = pyperclip.paste().strip()
     if not text:
         return
-
-    # If already speaking, stop first and reset
-    if is_speaking or (speaking_thread and speaking_thread.is_alive()):
-        stop_playback = True
-        try:
-            sd.stop()
-        except:
-            pass
-        time.sleep(0.1)
-
-    # Reset state
-    is_speaking = True
-    stop_playback = False
-    update_speak_button()
-
-    def run():
-        global is_speaking, stop_playback
-        try:
-            # Generate speech using Piper TTS (offline neural voice)
-            generate_speech_piper(text, temp_audio_file)
-
-            if stop_playback:
-                is_speaking = False
-                update_speak_button()
-                return
-
-            # Read the WAV file
-            with wave.open(temp_audio_file, 'rb') as wf:
-                sample_rate = wf.getframerate()
-                audio_data = wf.readframes(wf.getnframes())
-                audio_array = np.frombuffer(audio_data, dtype=np.int16)
-
-            # Play using sounddevice with selected output device
-            device_id = SPEAKER_INDEX if SPEAKER_INDEX >= 0 else None
-            sd.play(audio_array, samplerate=sample_rate, device=device_id)
-
-            # Wait for playback to finish or be stopped
-            while True:
-                if stop_playback:
-                    sd.stop()
-                    break
-                try:
-                    stream = sd.get_stream()
-                    if not stream.active:
-                        break
-                except:
-                    break
-                time.sleep(0.1)
-
-        except Exception as e:
-            print(f"Speech error: {e}")
-
-        is_speaking = False
-        update_speak_button()
-
-    speaking_thread = threading.Thread(target=run, daemon=True)
-    speaking_thread.start()
+    speech.device = current_speaker_index()
+    speech.speak(text)
 
 def stop_speaking():
-    global speaking_thread, is_speaking, stop_playback
-    stop_playback = True
-    is_speaking = False
-    try:
-        sd.stop()
-    except:
-        pass
-    speaking_thread = None
+    speech.stop()
     update_speak_button()
 
-def dictation_loop():
-    global dictation_active, stream
-    try:
-        stream = pa.open(format=pyaudio.paInt16, channels=1, rate=SAMPLE_RATE,
-                        input=True, frames_per_buffer=CHUNK_SIZE, input_device_index=MICROPHONE_INDEX)
-    except:
-        dictation_active = False
-        return
-
-    recognizer = KaldiRecognizer(model, SAMPLE_RATE)
-    last_speech_time = time.time()
-    start_time = time.time()
-    typed_words = []
-    last_partial_words = []
-
-    while dictation_active:
-        try:
-            if stream is None or not dictation_active or not stream.is_active():
-                break
-            data = stream.read(CHUNK_SIZE, exception_on_overflow=False)
-            if not dictation_active:
-                break
-            if recognizer.AcceptWaveform(data):
-                result = json.loads(recognizer.Result())
-                if 'text' in result and result['text']:
-                    text = result['text']
-                    final_words = text.split()
-                    new_words = final_words[len(typed_words):]
-                    if new_words:
-                        new_text = " ".join(new_words)
-                        if "new line" in new_text.lower():
-                            pyautogui.press("enter")
-                        else:
-                            new_text = new_text.replace(" period", ".").replace(" comma", ",")
-                            pyautogui.write(new_text + " ", interval=0.005)
-                    typed_words = []
-                    last_partial_words = []
-                    last_speech_time = time.time()
-            else:
-                partial_result = json.loads(recognizer.PartialResult())
-                if 'partial' in partial_result and partial_result['partial']:
-                    partial_words = partial_result['partial'].split()
-                    if len(partial_words) > len(typed_words):
-                        stable_new_words = []
-                        for i, word in enumerate(partial_words[len(typed_words):], start=len(typed_words)):
-                            if i < len(last_partial_words):
-                                stable_new_words.append(word)
-                        if stable_new_words:
-                            new_text = " ".join(stable_new_words)
-                            if "new line" in new_text.lower():
-                                pyautogui.press("enter")
-                            else:
-                                new_text = new_text.replace(" period", ".").replace(" comma", ",")
-                                pyautogui.write(new_text + " ", interval=0.005)
-                            typed_words.extend(stable_new_words)
-                    last_partial_words = partial_words
-                    last_speech_time = time.time()
-            if (time.time() - start_time) > 1.0 and (time.time() - last_speech_time) > TIMEOUT_SECONDS:
-                break
-        except:
-            break
-
-    dictation_active = False
-    if stream:
-        try:
-            stream.stop_stream()
-            stream.close()
-        except:
-            pass
-        stream = None
-    try:
-        update_mic_button(False)
-    except:
-        pass
-
 def toggle_dictation(event=None):
-    global dictation_active, dictation_thread, stream, last_click_time, is_speaking, stop_playback
+    global last_click_time
     current_time = time.time()
     if current_time - last_click_time < DEBOUNCE_SECONDS:
         return
     last_click_time = current_time
 
-    # If speaking, stop speaking first
-    if is_speaking:
-        stop_playback = True
-        is_speaking = False
-        try:
-            pygame.mixer.music.stop()
-        except:
-            pass
-        update_speak_button()
-
-    if not dictation_active:
-        dictation_active = True
-        update_mic_button(True)
-        dictation_thread = threading.Thread(target=dictation_loop, daemon=True)
-        dictation_thread.start()
+    if not dictation.active:
+        barge_in()
+        dictation.start(current_microphone_index())
     else:
-        dictation_active = False
+        dictation.stop()
         update_mic_button(False)
-        if stream:
-            try:
-                stream.stop_stream()
-                stream.close()
-            except:
-                pass
-            stream = None
+        end_barge_in()
+
+def barge_in():
+    """Make way for dictation: pause, duck or stop the speech that is playing"""
+    if BARGE_IN == 'duck':
+        speech.duck(DUCK_VOLUME)  # Also for anything spoken while dictating
+    elif BARGE_IN == 'stop':
+        speech.stop()
+    else:
+        speech.pause()
+    update_speak_button()
+
+def end_barge_in():
+    """Dictation is over: bring paused or ducked speech back"""
+    speech.duck(1.0)
+    speech.resume()
+    update_speak_button()
 
 # Drag window
 drag_data = {"x": 0, "y": 0}
@@ -836,6 +1072,7 @@ def do_drag(event):
 # ============================================================================
 splash.destroy()
 
+_main_window_started = time.perf_counter()
 root = tk.Tk()
 root.title("SpeakAnywhere")
 root.overrideredirect(True)
@@ -917,46 +1154,118 @@ style.map('Dark.TCombobox',
           selectforeground=[('readonly', '#ffffff')])
 
 # Mic dropdown
-mic_names = [name for idx, name in input_devices]
-mic_var = tk.StringVar(value=selected_mic_name[:25] if mic_names else "Default")
+mic_names = [device.name for device in input_devices]
+mic_var = tk.StringVar(value=selected_mic.name[:25] if mic_names else "Default")
 mic_combo = ttk.Combobox(root, textvariable=mic_var, values=mic_names,
                          width=24, state='readonly', style='Dark.TCombobox', font=("Segoe UI", 8))
 mic_combo.place(relx=0.5, y=145, anchor='center')
 
 def on_mic_change(event):
-    global MICROPHONE_INDEX, selected_mic_name
+    global MICROPHONE_INDEX, selected_mic
     selected_name = mic_var.get()
-    for idx, name in input_devices:
-        if name == selected_name:
-            MICROPHONE_INDEX = idx
-            selected_mic_name = name
+    for device in input_devices:
+        if device.name == selected_name:
+            MICROPHONE_INDEX = device.index
+            selected_mic = device
+            config.update('devices', microphone=device.key)
+            warm_audio_streams()
             break
 mic_combo.bind('<<ComboboxSelected>>', on_mic_change)
 
 # Speaker dropdown
-speaker_names = [name for idx, name in output_devices]
-speaker_var = tk.StringVar(value=speaker_names[0][:25] if speaker_names else "Default")
+speaker_names = [device.name for device in output_devices]
+speaker_var = tk.StringVar(value=selected_speaker.name[:25] if speaker_names else "Default")
 speaker_combo = ttk.Combobox(root, textvariable=speaker_var, values=speaker_names,
                              width=24, state='readonly', style='Dark.TCombobox', font=("Segoe UI", 8))
 speaker_combo.place(relx=0.5, y=172, anchor='center')
 
 def on_speaker_change(event):
-    global SPEAKER_INDEX, selected_speaker_name
+    global SPEAKER_INDEX, selected_speaker
     selected_name = speaker_var.get()
-    for idx, name in output_devices:
-        if name == selected_name:
-            SPEAKER_INDEX = idx
-            selected_speaker_name = name
+    for device in output_devices:
+        if device.name == selected_name:
+            SPEAKER_INDEX = device.index
+            selected_speaker = device
+            config.update('devices', speaker=device.key)
+            warm_audio_streams()
             break
 speaker_combo.bind('<<ComboboxSelected>>', on_speaker_change)
 
+def refresh_devices(reinitialize=False):
+    """Re-scan devices off the main thread, then update the dropdowns.
+
+    reinitialize restarts PortAudio to pick up devices plugged in since it
+    started; the warm streams are closed for that and reopened after.
+    """
+    def scan():
+        with startup_trace.phase("scan devices (deferred)", "devices"):
+            if reinitialize:
+                audio.reinitialize(lambda: device_registry.scan(reinitialize=True))
+            else:
+                device_registry.scan()
+        inputs, outputs = device_registry.inputs, device_registry.outputs
+        post_ui(apply_devices, inputs, outputs, key='devices')
+    threading.Thread(target=scan, daemon=True).start()
+
+def apply_devices(inputs, outputs):
+    global input_devices, output_devices
+    global MICROPHONE_INDEX, selected_mic, SPEAKER_INDEX, selected_speaker
+    input_devices, output_devices = inputs, outputs
+    save_device_lists()
+
+    # Keep the current choices if they're still plugged in (by key - their index may have moved)
+    selected_mic = find_device(input_devices, selected_mic.key, best_microphone(input_devices))
+    selected_speaker = find_device(output_devices, selected_speaker.key, output_devices[0])
+    MICROPHONE_INDEX = selected_mic.index
+    SPEAKER_INDEX = selected_speaker.index
+    mic_combo.config(values=[device.name for device in input_devices])
+    speaker_combo.config(values=[device.name for device in output_devices])
+    mic_var.set(selected_mic.name[:25])
+    speaker_var.set(selected_speaker.name[:25])
+    warm_audio_streams()
+
+if devices_from_cache:
+    root.after(100, refresh_devices)
+
+def poll_devices():
+    """Notice headsets and microphones being plugged in or removed"""
+    if DEVICE_POLL_SECONDS > 0:
+        # Restarting PortAudio would cut off audio, so wait until both are idle
+        if not dictation.active and not speech.is_speaking and device_registry.changed():
+            refresh_devices(reinitialize=True)
+        root.after(int(DEVICE_POLL_SECONDS * 1000), poll_devices)
+    else:
+        root.after(5000, poll_devices)  # Check again later in case it's turned back on
+
+root.after(5000, poll_devices)
+root.after(0, drain_ui_events)
+
+# Pick up edits to config.ini while running - tune a machine without restarting
+CONFIG_POLL_MS = 2000
+
+def apply_reloaded_config():
+    """Apply hand edits to config.ini, found by the poll below or by config.update()"""
+    apply_config()
+    apply_engine_settings()
+    device_registry.set_hidden(DEVICE_HIDE.split(','))
+    refresh_devices()
+
+config.on_reload = apply_reloaded_config
+
+def reload_config():
+    config.reload_if_changed()
+    dictation.commands.reload_if_changed()
+    root.after(CONFIG_POLL_MS, reload_config)
+
+root.after(CONFIG_POLL_MS, reload_config)
+
 # ===== SPEAK CLIPBOARD BUTTON =====
 speak_btn = tk.Label(root, text="🔊 Speak Clipboard", bg='#2d2d44', fg=TEXT_SECONDARY,
                      font=("Segoe UI", 10), cursor="hand2", padx=10, pady=4)
 speak_btn.place(relx=0.5, y=210, anchor='center')
-speak_btn.bind("<Button-1>", lambda e: stop_speaking() if is_speaking else speak_clipboard())
-speak_btn.bind("<Enter>", lambda e: speak_btn.config(bg='#3b82f6', fg=TEXT_PRIMARY) if not is_speaking else None)
-speak_btn.bind("<Leave>", lambda e: speak_btn.config(bg='#2d2d44', fg=TEXT_SECONDARY) if not is_speaking else None)
+speak_btn.bind("<Button-1>", lambda e: stop_speaking() if speech.is_speaking else speak_clipboard())
+speak_btn.bind("<Enter>", lambda e: speak_btn.config(bg='#3b82f6', fg=TEXT_PRIMARY) if not speech.is_speaking else None)
+speak_btn.bind("<Leave>", lambda e: speak_btn.config(bg='#2d2d44', fg=TEXT_SECONDARY) if not speech.is_speaking else None)
 
 # ===== SPEED SELECTOR (under speak button) =====
 speed_frame = tk.Frame(root, bg=CARD_BG)
@@ -966,8 +1275,12 @@ speeds = [0.5, 1.0, 1.5, 2.0]
 speed_buttons = []
 
 def select_speed(spd):
-    global current_speed
-    current_speed = spd
+    # Applies to speech that is already playing, too
+    speech.set_speed(spd)
+    config.update('speech', speed=spd)
+    highlight_speed(spd)
+
+def highlight_speed(spd):
     for i, btn in enumerate(speed_buttons):
         if speeds[i] == spd:
             btn.config(fg=TEXT_PRIMARY, bg=ACCENT_BLUE)
@@ -975,18 +1288,18 @@ def select_speed(spd):
             btn.config(fg=TEXT_SECONDARY, bg='#2d2d44')
 
 for spd in speeds:
-    btn = tk.Label(speed_frame, text=f"{spd}x", bg='#2d2d44' if spd != 1.0 else ACCENT_BLUE,
-                   fg=TEXT_SECONDARY if spd != 1.0 else TEXT_PRIMARY,
+    btn = tk.Label(speed_frame, text=f"{spd}x", bg='#2d2d44', fg=TEXT_SECONDARY,
                    font=("Segoe UI", 8), cursor="hand2", padx=6, pady=1)
     btn.pack(side='left', padx=1)
     btn.bind("<Button-1>", lambda e, s=spd: select_speed(s))
     speed_buttons.append(btn)
+highlight_speed(speech.speed)
 
 # Recording timer
 recording_start_time = [0]
 
 def update_timer():
-    if dictation_active:
+    if dictation.active:
         elapsed = int(time.time() - recording_start_time[0])
         mins = elapsed // 60
         secs = elapsed % 60
@@ -994,16 +1307,29 @@ def update_timer():
         root.after(1000, update_timer)
 
 # Update functions
+def show_status(text, color=TEXT_SECONDARY):
+    try:
+        status_label.config(text=text, fg=color)
+    except:
+        pass
+
+def show_instruction(text, color=TEXT_SECONDARY):
+    try:
+        instruction_label.config(text=text, fg=color)
+    except:
+        pass
+
 def update_speak_button():
     try:
-        if is_speaking:
+        if speech.is_speaking:
             speak_btn.config(text="🛑 Stop", bg=GREEN_ACTIVE, fg=TEXT_PRIMARY)
-            status_label.config(text="Playing...", fg=GREEN_ACTIVE)
+            if not dictation.active:  # The recording timer has the status line while dictating
+                status_label.config(text="Paused" if speech.state == 'paused' else "Playing...",
+                                    fg=GREEN_ACTIVE)
         else:
             speak_btn.config(text="🔊 Speak Clipboard", bg='#2d2d44', fg=TEXT_SECONDARY)
-            if not dictation_active:
+            if not dictation.active:
                 status_label.config(text="", fg=TEXT_SECONDARY)
-        root.update()
     except:
         pass
 
@@ -1018,9 +1344,80 @@ def update_mic_button(active):
             mic_label.config(fg=GRAY_INACTIVE)
             instruction_label.config(text="Tap to dictate", fg=TEXT_SECONDARY)
             status_label.config(text="", fg=TEXT_SECONDARY)
-        root.update()
     except:
         pass
 
+# ===== METRICS OVERLAY (Ctrl+Shift+D) =====
+OVERLAY_REFRESH_MS = 500
+OVERLAY_LATENCIES = [
+    ("mic > typed", 'dictation.capture_to_typed_ms'),
+    ("first partial", 'dictation.first_partial_ms'),
+    ("recognize", 'dictation.recognize_ms'),
+    ("typing", 'typing.latency_ms'),
+    ("sentence", 'synthesis.sentence_ms'),
+    ("first audio", 'speech.first_audio_ms'),
+    ("ui frame lag", 'ui.frame_lag_ms'),
+]
+overlay = None
+
+def toggle_overlay(event=None):
+    global overlay
+    if overlay is not None:
+        overlay.destroy()
+        overlay = None
+        return
+    overlay = tk.Toplevel(root)
+    overlay.overrideredirect(True)
+    overlay.attributes('-topmost', True)
+    overlay.attributes('-alpha', 0.85)
+    overlay.configure(bg=CARD_BG)
+    overlay.geometry(f"+{root.winfo_x()}+{root.winfo_y() + WIN_H + 4}")
+    overlay_text = tk.Label(overlay, text="", fg=TEXT_SECONDARY, bg=CARD_BG, font=("Consolas", 8),
+                            justify='left', padx=8, pady=6)
+    overlay_text.pack()
+    overlay_text.bind("<Button-1>", toggle_overlay)
+    refresh_overlay(overlay, overlay_text)
+
+def refresh_overlay(window, label):
+    if overlay is not window:
+        return  # Closed (or reopened) since this refresh was scheduled
+    if not metrics.enabled:
+        lines = ["metrics off ([metrics] enabled)"]
+    else:
+        lines = [f"{'ms':14} {'p50':>6} {'p95':>6} {'n':>5}"]
+        for title, name in OVERLAY_LATENCIES:
+            s = metrics.summary(name)
+            if s['count']:
+                lines.append(f"{title:14} {s['p50']:>6.0f} {s['p95']:>6.0f} {s['count']:>5}")
+            else:
+                lines.append(f"{title:14} {'-':>6} {'-':>6} {0:>5}")
+        counters, gauges = metrics.counters, metrics.gauges
+        lines.append(f"underruns {counters.get('playback.underruns', 0)}  "
+                     f"mic overflows {counters.get('capture.overflows', 0)}")
+        lines.append(f"queues: typing {gauges.get('typing.queue_depth', 0)}  "
+                     f"synth {gauges.get('synthesis.queue_depth', 0)}")
+    label.config(text="\n".join(lines))
+    root.after(OVERLAY_REFRESH_MS, refresh_overlay, window, label)
+
+root.bind("<Control-Shift-D>", toggle_overlay)
+if METRICS_OVERLAY:
+    root.after(0, toggle_overlay)
+
+def _on_first_paint():
+    startup_trace.record("build main window", "ui", _main_window_started, time.perf_counter())
+    startup_trace.mark("first window paint", "ui")
+    startup_trace.write(get_config_dir(), {'app_version': APP_VERSION})
+    # Used by benchmark.py --startup to time a launch without staying open
+    if '--exit-after-startup' in sys.argv:
+        root.after(0, root.destroy)
+
+# Idle callbacks run in order, so this fires once the window's first redraw is done
+root.after_idle(_on_first_paint)
+
 root.mainloop()
-pa.terminate()
+dictation.stop()
+speech.stop()
+audio.close()
+metrics.stop_log()
+# Rewrite the trace on exit so model loads that finished later are included
+startup_trace.write(get_config_dir(), {'app_version': APP_VERSION})
@@ -32,13 +32,11 @@ a = Analysis(
         'numpy',
         'sounddevice',
         'vosk',
-        'pyaudio',
         'PIL',
         'PIL.Image',
         'PIL.ImageTk',
         'PIL.ImageDraw',
         'PIL.ImageFilter',
-        'cv2',
         'pygame',
         'pygame.mixer',
         'pyperclip',
@@ -73,6 +71,8 @@ a = Analysis(
         'docutils',
         'lxml',
         'coremltools',
+        # Splash plays pre-baked frames (splash_frames.py), OpenCV isn't used
+        'cv2',
     ],
     noarchive=False,
     optimize=0,
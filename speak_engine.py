@@ -0,0 +1,1535 @@
+"""
+Speak Anywhere's dictation and text-to-speech pipelines, without the GUI.
+
+Importing this module has no side effects: no windows open, no audio devices
+are touched and the heavy libraries (Vosk, Piper, sounddevice, pyautogui)
+are only imported once something that needs them is created.
+speak_anywhere.py drives these classes from its Tk front end; the same
+objects can be used from a service, a benchmark or a script:
+
+    models = ModelManager({'vosk': lambda: load_vosk_model(vosk_path),
+                           'piper': lambda: load_piper_voice(voice_path)})
+    speech = SpeechEngine(models, voice_path)
+    speech.speak("Hello there.")
+
+    dictation = DictationEngine(models, output=TypingQueue())
+    dictation.start()
+
+Give both engines one AudioSession to keep their audio streams open
+between utterances instead of opening a new one each time.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import wave
+import struct
+import hashlib
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import nullcontext
+
+import numpy as np
+
+from metrics import metrics
+from time_stretch import WsolaStretcher
+from commands import CommandGrammar, CommandTyper
+from echo import EchoSuppressor
+from stabilizer import PartialStabilizer
+from vad import VoiceActivityDetector
+
+# ============================================================================
+# MODELS - Background loading, waited on only when first needed
+# ============================================================================
+def load_vosk_model(model_path):
+    from vosk import Model
+    return Model(model_path)
+
+def load_piper_voice(model_path, intra_op_threads=0):
+    """Load the Piper voice, optionally capping ONNX Runtime's thread count.
+
+    Each synthesis worker owns a session; without a cap every session would
+    spin up one inference thread per core and they'd fight each other.
+    """
+    from piper import PiperVoice
+    if intra_op_threads:
+        try:
+            import onnxruntime
+            from piper.config import PiperConfig
+            with open(model_path + ".json", encoding='utf-8') as f:
+                config = PiperConfig.from_dict(json.load(f))
+            options = onnxruntime.SessionOptions()
+            options.intra_op_num_threads = intra_op_threads
+            session = onnxruntime.InferenceSession(model_path, sess_options=options,
+                                                   providers=['CPUExecutionProvider'])
+            return PiperVoice(session=session, config=config)
+        except Exception as e:
+            print(f"Falling back to default Piper session options: {e}")
+    return PiperVoice.load(model_path)
+
+class ModelManager:
+    """Loads each model once, on a background thread, the first time it's asked for.
+
+    future() starts loading (if it hasn't started) and returns immediately;
+    get() blocks until the model is ready. Loads are timed through trace
+    (a StartupTrace) when one is given.
+    """
+
+    def __init__(self, loaders, trace=None):
+        self._loaders = loaders
+        self._trace = trace
+        self._futures = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=len(loaders), thread_name_prefix="model-load")
+
+    def future(self, name):
+        with self._lock:
+            future = self._futures.get(name)
+            if future is None:
+                future = self._futures[name] = self._executor.submit(self._load, name)
+            return future
+
+    def _load(self, name):
+        with self._trace.phase(f"load {name} model", "model") if self._trace else nullcontext():
+            return self._loaders[name]()
+
+    def preload(self, *names):
+        for name in names:
+            self.future(name)
+
+    def is_ready(self, name):
+        future = self._futures.get(name)
+        return future is not None and future.done() and future.exception() is None
+
+    def get(self, name):
+        return self.future(name).result()
+
+
+# ============================================================================
+# CANCELLATION - One token per utterance or dictation session
+# ============================================================================
+class CancelToken(threading.Event):
+    """A threading.Event that also runs callbacks when it is set.
+
+    Every stage of a pipeline gets the same token. Stages that block
+    (waiting on a synthesis future, a full ring buffer, an audio stream)
+    register a callback that wakes or aborts them, so set() stops the whole
+    pipeline at once instead of when each stage next polls the flag.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._callbacks = []
+        self._callbacks_lock = threading.Lock()
+
+    def on_cancel(self, callback):
+        """Call callback() when the token is set - right away if it already is"""
+        with self._callbacks_lock:
+            if not self.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def set(self):
+        with self._callbacks_lock:
+            if self.is_set():
+                return
+            super().set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"Cancel callback failed: {e}")
+
+
+# ============================================================================
+# SENTENCES - Splitting text and running Piper
+# ============================================================================
+# Sentence boundaries: end punctuation (optionally followed by a closing quote
+# or bracket) then whitespace, or a blank line between paragraphs
+_SENTENCE_BREAK = re.compile(r'(?<=[.!?])\s+|(?<=[.!?]["\')\]])\s+|\n\s*\n')
+
+def normalize_sentence(text):
+    """Collapse whitespace so re-copied text maps to the same cache entry"""
+    return " ".join(text.split())
+
+def split_sentences(text):
+    """Split text into normalized, non-empty sentences"""
+    sentences = (normalize_sentence(part) for part in _SENTENCE_BREAK.split(text))
+    return [sentence for sentence in sentences if sentence]
+
+def synthesize_sentence(voice, sentence):
+    """Run Piper on one sentence and return (samples, sample_rate)"""
+    chunks = []
+    sample_rate = None
+    for chunk in voice.synthesize(sentence):
+        chunks.append(chunk.audio_int16_array)
+        sample_rate = chunk.sample_rate
+    if not chunks:
+        return np.zeros(0, dtype=np.int16), sample_rate
+    samples = chunks[0] if len(chunks) == 1 else np.concatenate(chunks)
+    return samples, sample_rate
+
+def save_wav(path, samples, sample_rate):
+    """Write mono int16 samples to a WAV file"""
+    with wave.open(path, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)  # 16-bit audio
+        f.setframerate(sample_rate)
+        f.writeframes(samples)
+
+class PcmBuffer:
+    """Growable int16 sample buffer.
+
+    Doubles its capacity when full so appends are amortized O(1), and view()
+    returns the filled part without copying.
+    """
+
+    def __init__(self, initial_capacity=16000 * 30):
+        self._data = np.empty(initial_capacity, dtype=np.int16)
+        self._length = 0
+
+    def __len__(self):
+        return self._length
+
+    def append(self, samples):
+        end = self._length + len(samples)
+        if end > len(self._data):
+            grown = np.empty(max(end, len(self._data) * 2), dtype=np.int16)
+            grown[:self._length] = self._data[:self._length]
+            self._data = grown
+        self._data[self._length:end] = samples
+        self._length = end
+
+    def view(self):
+        return self._data[:self._length]
+
+# ============================================================================
+# SYNTHESIS CACHE - Memory LRU plus optional disk tier
+# ============================================================================
+class SynthCache:
+    """Cache of synthesized sentences keyed by sentence text and voice.
+
+    The memory tier is an LRU bounded by total sample bytes. The optional disk
+    tier keeps WAV files in the AppData folder and drops the least recently
+    used files once it grows past its limit. Audio is cached at the voice's
+    native speed - speed is applied later by the time stretcher, so one entry
+    serves every speed setting.
+    """
+
+    def __init__(self, max_bytes, disk_dir=None, disk_max_bytes=0):
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._disk_root = disk_dir
+        self.disk_dir = None
+        self._disk_bytes = 0
+        self.resize(max_bytes, disk_max_bytes)
+
+    def resize(self, max_bytes, disk_max_bytes):
+        """Apply new size limits, evicting whatever no longer fits"""
+        with self._lock:
+            self.max_bytes = max_bytes
+            while self._bytes > self.max_bytes:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+        self.disk_max_bytes = disk_max_bytes
+        self.disk_dir = None
+        if self._disk_root and disk_max_bytes > 0:
+            try:
+                os.makedirs(self._disk_root, exist_ok=True)
+                self._disk_bytes = sum(entry.stat().st_size for entry in os.scandir(self._disk_root))
+                self.disk_dir = self._disk_root
+            except OSError:
+                return
+            if self._disk_bytes > self.disk_max_bytes:
+                self._trim_disk()
+
+    @staticmethod
+    def make_key(sentence, voice_path):
+        """Key for a normalized sentence spoken by the voice at voice_path"""
+        try:
+            voice_id = f"{voice_path}|{os.path.getmtime(voice_path)}"
+        except OSError:
+            voice_id = voice_path
+        return hashlib.sha1(f"{voice_id}\0{sentence}".encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Return (samples, sample_rate) or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+        entry = self._load_from_disk(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._remember(key, entry)
+        return entry
+
+    def put(self, key, samples, sample_rate):
+        samples.setflags(write=False)  # Shared with every later playback
+        entry = (samples, sample_rate)
+        self._remember(key, entry)
+        self._save_to_disk(key, entry)
+
+    def _remember(self, key, entry):
+        size = entry[0].nbytes
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[0].nbytes
+            self._entries[key] = entry
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key + ".wav")
+
+    def _load_from_disk(self, key):
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with wave.open(path, 'rb') as wf:
+                sample_rate = wf.getframerate()
+                samples = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+            os.utime(path)  # Mark as recently used for eviction
+        except (OSError, EOFError, wave.Error):
+            return None
+        return samples, sample_rate
+
+    def _save_to_disk(self, key, entry):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        if os.path.exists(path):
+            return
+        try:
+            save_wav(path, entry[0], entry[1])
+            self._disk_bytes += os.path.getsize(path)
+            if self._disk_bytes > self.disk_max_bytes:
+                self._trim_disk()
+        except (OSError, wave.Error) as e:
+            print(f"Could not write TTS cache: {e}")
+
+    def _trim_disk(self):
+        try:
+            files = sorted(os.scandir(self.disk_dir), key=lambda entry: entry.stat().st_mtime)
+        except OSError:
+            return
+        total = sum(entry.stat().st_size for entry in files)
+        # Trim to 90% so a full cache doesn't rescan on every new sentence
+        for entry in files:
+            if total <= self.disk_max_bytes * 0.9:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                total -= size
+            except OSError:
+                pass
+        self._disk_bytes = total
+
+
+# ============================================================================
+# SYNTHESIS POOL - Parallel sentence synthesis, results kept in order
+# ============================================================================
+class SynthesisPool:
+    """Synthesizes sentences on worker threads, one Piper session per worker.
+
+    ONNX Runtime releases the GIL while running inference, so threads give
+    real parallelism. The first worker reuses the model manager's voice; the
+    others load their own session the first time they are needed.
+    """
+
+    def __init__(self, models, voice_path, workers, cache=None):
+        self.models = models
+        self.voice_path = voice_path
+        self.cache = cache
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="piper")
+        self._local = threading.local()
+        self._shared_voice_taken = False
+        self._lock = threading.Lock()
+
+    def _voice(self):
+        voice = getattr(self._local, 'voice', None)
+        if voice is None:
+            with self._lock:
+                take_shared = not self._shared_voice_taken
+                self._shared_voice_taken = True
+            if take_shared:
+                voice = self.models.get('piper')
+            else:
+                voice = load_piper_voice(self.voice_path, max(1, (os.cpu_count() or 1) // self.workers))
+            self._local.voice = voice
+        return voice
+
+    def set_workers(self, workers):
+        """Resize the pool; sentences already running finish on the old one"""
+        if workers == self.workers:
+            return
+        old = self._executor
+        with self._lock:
+            self.workers = workers
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="piper")
+            self._shared_voice_taken = False
+        old.shutdown(wait=False)
+
+    def warm(self, sentence="Ready."):
+        """Load every worker's voice by running one throwaway synthesis on each"""
+        barrier = threading.Barrier(self.workers)
+
+        def run():
+            barrier.wait(timeout=120)  # Holds each worker until all have a task, so none runs two
+            synthesize_sentence(self._voice(), sentence)
+
+        for future in [self._executor.submit(run) for _ in range(self.workers)]:
+            future.result()
+
+    def _synthesize(self, sentence, key, cancel):
+        if cancel.is_set():
+            return None
+        started = time.perf_counter()
+        result = synthesize_sentence(self._voice(), sentence)
+        metrics.observe('synthesis.sentence_ms', 1000 * (time.perf_counter() - started))
+        if result[1] is not None and self.cache is not None:
+            self.cache.put(key, *result)
+        return result
+
+    def stream(self, sentences, cancel, lookahead):
+        """Yield (samples, sample_rate) per sentence in order.
+
+        At most lookahead sentences are queued or synthesized ahead of the one
+        being consumed, which caps memory on long documents. cancel (a
+        CancelToken) ends the stream at once, without waiting for the
+        sentence being synthesized; sentences not yet started are dropped.
+        """
+        pending = deque()
+        remaining = iter(sentences)
+        cancelled = Future()
+        cancel.on_cancel(lambda: cancelled.set_result(None))
+
+        def submit_next():
+            for sentence in remaining:
+                key = SynthCache.make_key(sentence, self.voice_path)
+                cached = self.cache.get(key) if self.cache is not None else None
+                if cached is not None:
+                    metrics.count('synthesis.cache_hits')
+                    future = Future()
+                    future.set_result(cached)
+                else:
+                    metrics.count('synthesis.cache_misses')
+                    future = self._executor.submit(self._synthesize, sentence, key, cancel)
+                pending.append(future)
+                metrics.gauge('synthesis.queue_depth', len(pending))
+                return True
+            return False
+
+        try:
+            while len(pending) < lookahead and submit_next():
+                pass
+            while pending and not cancel.is_set():
+                wait((pending[0], cancelled), return_when=FIRST_COMPLETED)
+                if cancel.is_set():
+                    break
+                result = pending.popleft().result()
+                submit_next()
+                if result is not None and result[1] is not None:
+                    yield result
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+# ============================================================================
+# AUDIO SESSION - Long-lived streams, reused from one utterance to the next
+# ============================================================================
+class SharedStream:
+    """One warm sounddevice stream of a kind ('input' or 'output').
+
+    Calling it with the usual stream arguments returns a handle that acts
+    like a new stream (start, stop, abort, close), so it can be passed to
+    StreamingPlayer or MicCapture as their stream_factory. The PortAudio
+    stream underneath stays open between handles: closing a handle only
+    stops it, and the next handle with the same device, rate and block
+    size starts it again. It is reopened when those change, or once if the
+    device fails to start (unplugged, or lost its driver). Open, start,
+    stop and close times go to the audio.* metrics.
+    """
+
+    def __init__(self, kind, stream_class=None):
+        if stream_class is None:
+            import sounddevice as sd
+            stream_class = sd.InputStream if kind == 'input' else sd.OutputStream
+            self.CallbackStop = sd.CallbackStop
+        else:
+            self.CallbackStop = stream_class.CallbackStop
+        self.kind = kind
+        self.stream_class = stream_class
+        self._stream = None
+        self._settings = None
+        self._owner = None       # Handle the stream is currently running for
+        self._completing = None  # Handle whose callback ended the stream
+        self._lock = threading.RLock()
+
+    def __call__(self, callback, finished_callback=None, **settings):
+        return _StreamHandle(self, settings, callback, finished_callback)
+
+    def prepare(self, **settings):
+        """Open the stream now so the next start doesn't wait for the device"""
+        with self._lock:
+            if self._owner is None:
+                try:
+                    self._open(settings)
+                except Exception as e:
+                    print(f"Could not open {self.kind} stream: {e}")
+
+    def close(self):
+        with self._lock:
+            if self._owner is not None:
+                self.abort(self._owner)
+            self._close_stream()
+
+    def start(self, handle):
+        with self._lock:
+            if self._owner is not None:
+                self.abort(self._owner)
+            for attempt in (1, 2):
+                try:
+                    self._open(handle.settings)
+                    self._stream.stop()  # No-op unless a callback ended the last run
+                    self._owner = handle
+                    started = time.perf_counter()
+                    self._stream.start()
+                    metrics.observe(f'audio.{self.kind}_start_ms', 1000 * (time.perf_counter() - started))
+                    return
+                except Exception:
+                    self._owner = None
+                    self._close_stream()
+                    if attempt == 2:
+                        raise
+                    metrics.count(f'audio.{self.kind}_reopens')
+
+    def stop(self, handle, abort=False):
+        """Stop the stream for handle (abort drops what is still buffered)"""
+        with self._lock:
+            if self._owner is not handle:
+                return
+            self._completing = None
+            started = time.perf_counter()
+            try:
+                if abort:
+                    self._stream.abort()
+                else:
+                    self._stream.stop()
+            except Exception as e:
+                print(f"Could not stop {self.kind} stream: {e}")
+                self._close_stream()
+            metrics.observe(f'audio.{self.kind}_stop_ms', 1000 * (time.perf_counter() - started))
+            self._owner = None
+        handle.finished()
+
+    def abort(self, handle):
+        self.stop(handle, abort=True)
+
+    def is_active(self, handle):
+        stream = self._stream
+        return self._owner is handle and stream is not None and stream.active
+
+    def _open(self, settings):
+        if self._stream is not None and settings == self._settings:
+            return
+        self._close_stream()
+        started = time.perf_counter()
+        self._stream = self.stream_class(callback=self._callback, finished_callback=self._finished,
+                                         **settings)
+        self._settings = dict(settings)
+        metrics.observe(f'audio.{self.kind}_open_ms', 1000 * (time.perf_counter() - started))
+
+    def _close_stream(self):
+        stream, self._stream = self._stream, None
+        if stream is None:
+            return
+        started = time.perf_counter()
+        try:
+            stream.close()
+        except Exception:
+            pass
+        metrics.observe(f'audio.{self.kind}_close_ms', 1000 * (time.perf_counter() - started))
+
+    def _callback(self, data, frames, time_info, status):
+        owner = self._owner
+        if owner is None:
+            if self.kind == 'output':
+                data.fill(0)
+            return
+        try:
+            owner.callback(data, frames, time_info, status)
+        except self.CallbackStop:
+            self._completing = owner
+            raise
+
+    def _finished(self):
+        # A run its own callback ended is reported from here; stop() and
+        # abort() report theirs directly, so a late call can't reach a newer handle
+        handle, self._completing = self._completing, None
+        if handle is None:
+            # Or the device failed or went away under the owner: tell it, unless
+            # the stream is running again (for a newer handle) by now
+            handle, stream = self._owner, self._stream
+            if handle is None or stream is None or stream.active:
+                return
+        handle.finished()
+
+
+class _StreamHandle:
+    """What SharedStream hands out in place of a new stream"""
+
+    def __init__(self, shared, settings, callback, finished_callback):
+        self.shared = shared
+        self.settings = settings
+        self.callback = callback
+        self._finished_callback = finished_callback
+
+    @property
+    def active(self):
+        return self.shared.is_active(self)
+
+    def start(self):
+        self.shared.start(self)
+
+    def stop(self):
+        self.shared.stop(self)
+
+    def abort(self):
+        self.shared.abort(self)
+
+    def close(self):
+        self.shared.stop(self)
+
+    def finished(self):
+        if self._finished_callback:
+            self._finished_callback()
+
+
+class AudioSession:
+    """The app's microphone and speaker streams, kept open for its lifetime.
+
+    Input and output both go through sounddevice. Pass session.input to
+    MicCapture / DictationEngine and session.output to StreamingPlayer /
+    SpeechEngine; close() at exit.
+    """
+
+    def __init__(self, input_class=None, output_class=None):
+        self.input = SharedStream('input', input_class)
+        self.output = SharedStream('output', output_class)
+
+    def close(self):
+        self.input.close()
+        self.output.close()
+
+    def reinitialize(self, restart):
+        """Close both streams and call restart() - which may restart PortAudio,
+        e.g. to find new devices - with neither stream usable in the meantime"""
+        with self.input._lock, self.output._lock:
+            self.input.close()
+            self.output.close()
+            return restart()
+
+# ============================================================================
+# STREAMING PLAYBACK - Ring buffer feeding a sounddevice output stream
+# ============================================================================
+class AudioRingBuffer:
+    """Single-producer / single-consumer int16 ring buffer.
+
+    One thread writes and another thread (or the audio callback) reads. Each
+    side only advances its own counter, so the reader never waits on a lock.
+    release() ends all waiting, for when input is finished or cancelled.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._data = np.zeros(capacity, dtype=np.int16)
+        self._written = 0
+        self._read = 0
+        self._space_freed = threading.Event()
+        self._data_added = threading.Event()
+        self._released = False
+
+    def available(self):
+        return self._written - self._read
+
+    def write(self, samples, cancel):
+        """Copy samples in, blocking while full. Returns False if cancelled or released."""
+        offset = 0
+        total = len(samples)
+        while offset < total:
+            if cancel.is_set() or self._released:
+                return False
+            free = self.capacity - self.available()
+            if free == 0:
+                self._space_freed.clear()
+                # Re-check after clearing so a read in between isn't missed
+                if self.capacity - self.available() == 0 and not self._released:
+                    self._space_freed.wait()
+                continue
+            n = min(free, total - offset)
+            self._copy_in(samples[offset:offset + n])
+            offset += n
+        return True
+
+    def write_nowait(self, samples):
+        """Copy in as much as fits without waiting, return the count written"""
+        n = min(len(samples), self.capacity - self.available())
+        if n:
+            self._copy_in(samples[:n])
+        return n
+
+    def _copy_in(self, samples):
+        n = len(samples)
+        start = self._written % self.capacity
+        first = min(n, self.capacity - start)
+        self._data[start:start + first] = samples[:first]
+        if n > first:
+            self._data[:n - first] = samples[first:]
+        self._written += n
+        self._data_added.set()
+
+    def wait_for_data(self, timeout=None):
+        """Block until something has been written, release() is called, or timeout"""
+        self._data_added.clear()
+        if not self.available() and not self._released:
+            self._data_added.wait(timeout)
+
+    def release(self):
+        """Wake any waiter and stop all later waits"""
+        self._released = True
+        self._space_freed.set()
+        self._data_added.set()
+
+    def read_into(self, out):
+        """Fill out with as many buffered samples as possible, return the count"""
+        n = min(len(out), self.available())
+        if n:
+            start = self._read % self.capacity
+            first = min(n, self.capacity - start)
+            out[:first] = self._data[start:start + first]
+            if n > first:
+                out[first:n] = self._data[:n - first]
+            self._read += n
+            self._space_freed.set()
+        return n
+
+class StreamingPlayer:
+    """Plays mono int16 audio while it is still being synthesized.
+
+    Audio is queued at the voice's own sample rate. A feeder thread runs it
+    through the time stretcher in small blocks into a short output buffer, so
+    a speed change is heard within a fraction of a second, at natural pitch.
+    stream_factory replaces sounddevice.OutputStream (it must also provide
+    the CallbackStop exception), e.g. with a null sink for benchmarks.
+    Setting cancel (a CancelToken, shared with the synthesis feeding the
+    player) silences the stream from the next audio block and aborts it.
+    paused and gain also apply from the next block: paused plays silence
+    without consuming any audio, so playback resumes where it left off,
+    and gain (ducking) is ramped across the block. Everything actually
+    played is written to reference (an echo.EchoReference) when given.
+    However the stream ends - drained, stopped, or the device failing -
+    both buffers are released, so nothing waits on audio that won't play.
+    """
+
+    def __init__(self, sample_rate, device=None, speed=1.0, block_size=1024,
+                 buffer_seconds=30.0, stretch_buffer_seconds=0.25, stream_factory=None,
+                 cancel=None, reference=None):
+        if stream_factory is None:
+            import sounddevice as sd
+            stream_factory = sd.OutputStream
+            self._callback_stop = sd.CallbackStop
+        else:
+            self._callback_stop = stream_factory.CallbackStop
+        self.pending = AudioRingBuffer(int(sample_rate * buffer_seconds))
+        self.ring = AudioRingBuffer(int(sample_rate * stretch_buffer_seconds))
+        self.sample_rate = sample_rate
+        self.block_size = block_size
+        self.stretcher = WsolaStretcher(sample_rate, speed)
+        self.paused = False
+        self.gain = 1.0
+        self.reference = reference
+        self._applied_gain = 1.0
+        self.cancelled = cancel if cancel is not None else CancelToken()
+        self.finished = threading.Event()
+        self._input_done = False
+        self._output_done = False
+        self._started_playing = False
+        self._stream = stream_factory(callback=self._callback, finished_callback=self._stream_finished,
+                                      **self.stream_settings(sample_rate, device, block_size))
+        self._feeder = threading.Thread(target=self._feed, daemon=True)
+        self._feeder.start()
+        self._stream.start()
+        self.cancelled.on_cancel(self._abort)
+
+    @staticmethod
+    def stream_settings(sample_rate, device=None, block_size=1024):
+        return {'samplerate': sample_rate, 'channels': 1, 'dtype': 'int16',
+                'blocksize': block_size, 'device': device}
+
+    def _feed(self):
+        block = np.empty(self.block_size, dtype=np.int16)
+        while not self.cancelled.is_set() and not self.finished.is_set():
+            n = self.pending.read_into(block)
+            if n:
+                if not self.ring.write(self.stretcher.process(block[:n]), self.cancelled):
+                    return
+            elif self._input_done:
+                if self.pending.available():
+                    continue
+                self.ring.write(self.stretcher.flush(), self.cancelled)
+                self._output_done = True
+                return
+            else:
+                self.pending.wait_for_data()
+
+    def _callback(self, outdata, frames, time_info, status):
+        out = outdata[:, 0]
+        if self.cancelled.is_set():
+            out[:] = 0
+            raise self._callback_stop
+        if self.paused:
+            out[:] = 0
+            return
+        n = self.ring.read_into(out)
+        gain = self.gain
+        if gain != self._applied_gain:
+            out[:n] = out[:n] * np.linspace(self._applied_gain, gain, n)
+            self._applied_gain = gain
+        elif gain != 1.0:
+            out[:n] = out[:n] * gain
+        if self.reference is not None:
+            # Stamped with when the last of these n samples will be heard
+            heard = time.perf_counter() + self._output_latency(time_info) + n / self.sample_rate
+            self.reference.write(out[:n], self.sample_rate, heard)
+        if n < frames:
+            out[n:] = 0
+            if self._output_done and self.ring.available() == 0:
+                raise self._callback_stop
+            # Ran dry mid-utterance (not just before the first audio)
+            if self._started_playing:
+                metrics.count('playback.underruns')
+        elif not self._started_playing:
+            self._started_playing = True
+
+    @staticmethod
+    def _output_latency(time_info):
+        """Seconds until the first sample of this block reaches the speaker, 0 if not known"""
+        try:
+            latency = time_info.outputBufferDacTime - time_info.currentTime
+        except AttributeError:
+            return 0.0
+        # Some host APIs leave the times at 0
+        return latency if 0 < latency < 1 else 0.0
+
+    def set_speed(self, speed):
+        """Change speed mid-playback without re-synthesizing"""
+        self.stretcher.set_speed(speed)
+
+    def write(self, samples):
+        """Queue samples for playback. Returns False once stopped."""
+        return self.pending.write(samples, self.cancelled)
+
+    def finish(self):
+        """Mark the end of input - the stream stops once the buffer drains"""
+        self._input_done = True
+        self.pending.release()
+
+    def wait(self):
+        """Block until everything written has played (or playback was stopped)"""
+        self.finished.wait()
+        self.close()
+
+    def stop(self):
+        self.cancelled.set()
+
+    def _abort(self):
+        try:
+            self._stream.abort()
+        except Exception:
+            pass
+        self._stream_finished()
+
+    def _stream_finished(self):
+        # Nothing reads the buffers any more; wake the writer and the feeder
+        self.finished.set()
+        self.pending.release()
+        self.ring.release()
+
+    def close(self):
+        try:
+            self._stream.close()
+        except Exception:
+            pass
+
+# ============================================================================
+# SPEECH ENGINE - Text in, audio out of the speaker
+# ============================================================================
+# Speech states, and the states each can move to
+SPEECH_TRANSITIONS = {
+    'idle': ('loading', 'speaking'),
+    'loading': ('speaking', 'paused', 'idle'),
+    'speaking': ('loading', 'paused', 'idle'),
+    'paused': ('loading', 'speaking', 'idle'),
+}
+
+class SpeechEngine:
+    """Speaks text: sentences are synthesized in parallel (or served from the
+    cache) and streamed to the speaker while later ones are still rendering.
+
+    speak() returns at once and plays on a background thread; a new speak()
+    or stop() cuts off whatever is playing. Each utterance has a CancelToken
+    shared by its synthesis and playback, so cutting it off takes effect
+    within one audio block, and only the current utterance can change the
+    state (see SPEECH_TRANSITIONS). pause() / resume() and duck() take
+    effect within a block too, for barge-in while dictating. on_state, if
+    given, is called with the new state from whichever thread changed it.
+    Settings are plain attributes and apply from the next utterance.
+    """
+
+    def __init__(self, models, voice_path, cache=None, workers=1, lookahead=None,
+                 speed=1.0, device=None, on_state=None):
+        self.models = models
+        self.voice_path = voice_path
+        self.pool = SynthesisPool(models, voice_path, workers, cache)
+        self.lookahead = lookahead or 2 * workers
+        self.speed = speed
+        self.device = device
+        self.export_path = None  # Also save each utterance as a WAV file when set
+        self.block_size = 1024
+        self.buffer_seconds = 30.0
+        self.stretch_buffer_seconds = 0.25
+        self.stream_factory = None  # AudioSession.output, a stream class, or None for a new sounddevice stream
+        self.echo_reference = None  # echo.EchoReference that hears everything played
+        self.on_state = on_state
+        self.player = None
+        self.state = 'idle'
+        self.paused = False
+        self.gain = 1.0
+        self._cancel = CancelToken()
+        self._lock = threading.Lock()
+
+    @property
+    def is_speaking(self):
+        return self.state != 'idle'
+
+    def synthesize(self, text, cancel=None):
+        """Yield (samples, sample_rate) one sentence at a time, in order"""
+        return self.pool.stream(split_sentences(text), cancel or CancelToken(), self.lookahead)
+
+    def speak(self, text):
+        """Start speaking text, cutting off anything already playing"""
+        cancel = CancelToken()
+        with self._lock:
+            previous, self._cancel = self._cancel, cancel
+            self.paused = False
+        previous.set()
+        self._set_state(cancel, 'speaking')
+        thread = threading.Thread(target=self._run, args=(text, cancel), daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        cancel = self._cancel
+        cancel.set()
+        self._set_state(cancel, 'idle')
+
+    def pause(self):
+        """Hold playback where it is; resume() carries on from the same sample"""
+        with self._lock:
+            if self.state == 'idle':
+                return
+            self.paused = True
+            cancel, player = self._cancel, self.player
+        if player is not None:
+            player.paused = True
+        self._set_state(cancel, 'paused')
+
+    def resume(self):
+        with self._lock:
+            if not self.paused:
+                return
+            self.paused = False
+            if self.state == 'idle':
+                return
+            cancel, player = self._cancel, self.player
+            loading = self.state == 'paused' and not self.models.is_ready('piper')
+        if player is not None:
+            player.paused = False
+        self._set_state(cancel, 'loading' if loading else 'speaking')
+
+    def duck(self, gain=1.0):
+        """Play at gain (0 - 1) from the next block, including later utterances; 1 undoes it"""
+        self.gain = gain
+        player = self.player
+        if player is not None:
+            player.gain = gain
+
+    def prepare(self, sample_rate):
+        """Open the output stream ahead of the first utterance (when it is a SharedStream)"""
+        prepare = getattr(self.stream_factory, 'prepare', None)
+        if prepare is not None:
+            prepare(**StreamingPlayer.stream_settings(sample_rate, self.device, self.block_size))
+
+    def set_speed(self, speed):
+        """Change the speed, including for speech that is already playing"""
+        self.speed = speed
+        player = self.player
+        if player is not None:
+            player.set_speed(speed)
+
+    def _set_state(self, cancel, state):
+        """Move to state for the utterance cancel belongs to; False if it has been replaced or stopped"""
+        with self._lock:
+            if cancel is not self._cancel or (cancel.is_set() and state != 'idle'):
+                return False
+            if state == self.state:
+                return True
+            if state not in SPEECH_TRANSITIONS[self.state]:
+                raise ValueError(f"Speech can't go from {self.state} to {state}")
+            self.state = state
+        if self.on_state:
+            self.on_state(state)
+        return True
+
+    def _run(self, text, cancel):
+        requested = time.perf_counter()
+        player = None
+        sample_rate = None
+        exported = PcmBuffer() if self.export_path else None
+        try:
+            # First use may still be waiting on the voice model
+            if not self.models.is_ready('piper'):
+                self._set_state(cancel, 'loading')
+                self.models.get('piper')
+                if not self._set_state(cancel, 'paused' if self.paused else 'speaking'):
+                    return
+
+            for samples, sample_rate in self.synthesize(text, cancel):
+                if cancel.is_set():
+                    break
+                if exported is not None:
+                    exported.append(samples)
+                if player is None:
+                    player = StreamingPlayer(sample_rate, self.device, self.speed, self.block_size,
+                                             self.buffer_seconds, self.stretch_buffer_seconds,
+                                             self.stream_factory, cancel, self.echo_reference)
+                    player.gain = self.gain
+                    with self._lock:
+                        player.paused = self.paused
+                        self.player = player
+                    metrics.observe('speech.first_audio_ms', 1000 * (time.perf_counter() - requested))
+                if not player.write(samples):
+                    break
+
+            # Save a copy only when asked to, while the tail is still playing
+            if exported is not None and len(exported) and not cancel.is_set():
+                save_wav(self.export_path, exported.view(), sample_rate)
+
+            # Wait for playback to finish or be stopped
+            if player is not None:
+                player.finish()
+                player.wait()
+
+        except Exception as e:
+            print(f"Speech error: {e}")
+            if player is not None:
+                player.stop()
+        finally:
+            if self.player is player:
+                self.player = None
+            self._set_state(cancel, 'idle')
+
+# ============================================================================
+# TYPING QUEUE - Keystroke injection on its own thread
+# ============================================================================
+if sys.platform == 'win32':
+    import ctypes
+    from ctypes import wintypes
+
+    class _KEYBDINPUT(ctypes.Structure):
+        _fields_ = [('wVk', wintypes.WORD), ('wScan', wintypes.WORD), ('dwFlags', wintypes.DWORD),
+                    ('time', wintypes.DWORD), ('dwExtraInfo', ctypes.c_size_t)]
+
+    class _MOUSEINPUT(ctypes.Structure):
+        _fields_ = [('dx', wintypes.LONG), ('dy', wintypes.LONG), ('mouseData', wintypes.DWORD),
+                    ('dwFlags', wintypes.DWORD), ('time', wintypes.DWORD),
+                    ('dwExtraInfo', ctypes.c_size_t)]
+
+    class _INPUTUNION(ctypes.Union):
+        _fields_ = [('ki', _KEYBDINPUT), ('mi', _MOUSEINPUT)]
+
+    class _INPUT(ctypes.Structure):
+        _fields_ = [('type', wintypes.DWORD), ('union', _INPUTUNION)]
+
+_INPUT_KEYBOARD = 1
+_KEYEVENTF_KEYUP = 0x0002
+_KEYEVENTF_UNICODE = 0x0004
+
+def send_unicode_text(text):
+    """Type text with a single SendInput call of Unicode key events (Windows).
+
+    Independent of keyboard layout, and the whole phrase arrives at once
+    instead of one pyautogui call per character.
+    """
+    units = text.encode('utf-16-le')
+    codes = struct.unpack(f'<{len(units) // 2}H', units)
+    inputs = (_INPUT * (2 * len(codes)))()
+    for i, code in enumerate(codes):
+        for j, flags in enumerate((_KEYEVENTF_UNICODE, _KEYEVENTF_UNICODE | _KEYEVENTF_KEYUP)):
+            event = inputs[2 * i + j]
+            event.type = _INPUT_KEYBOARD
+            event.union.ki = _KEYBDINPUT(0, code, flags, 0, 0)
+    ctypes.windll.user32.SendInput(len(inputs), inputs, ctypes.sizeof(_INPUT))
+
+def paste_text(text):
+    """Type text by pasting it, then put the user's clipboard back"""
+    import pyautogui
+    import pyperclip
+    try:
+        previous = pyperclip.paste()
+    except Exception:
+        previous = None
+    pyperclip.copy(text)
+    pyautogui.hotkey('ctrl', 'v')
+    time.sleep(0.1)  # Give the target app time to read the clipboard
+    if previous is not None:
+        pyperclip.copy(previous)
+
+class TypingQueue:
+    """Types dictated text on its own thread so recognition never waits on keystrokes.
+
+    Text queued while an earlier phrase is still being typed is merged and
+    injected in one go. The time from queueing to typed is kept per phrase;
+    type_text() can also be given the moment its audio was captured, for
+    the end-to-end latency. method is 'keys' (pyautogui, char_interval apart), 'paste' or 'unicode'.
+    """
+
+    def __init__(self, method='keys', char_interval=0.005):
+        self.method = method
+        self.char_interval = char_interval
+        self.latencies = deque(maxlen=200)
+        self._pending = deque()
+        self._ready = threading.Condition()
+        threading.Thread(target=self._run, daemon=True, name="typing").start()
+
+    def type_text(self, text, captured_at=None):
+        self._put('text', text, captured_at)
+
+    def press(self, key, captured_at=None):
+        self._put('key', key, captured_at)
+
+    def hotkey(self, keys, captured_at=None):
+        self._put('hotkey', tuple(keys), captured_at)
+
+    def erase(self, count, captured_at=None):
+        """Backspace over the last count characters typed"""
+        if count > 0:
+            self._put('erase', count, captured_at)
+
+    def _put(self, kind, value, captured_at):
+        with self._ready:
+            self._pending.append((kind, value, time.perf_counter(), captured_at))
+            self._ready.notify()
+
+    def _run(self):
+        import pyautogui
+        while True:
+            with self._ready:
+                while not self._pending:
+                    self._ready.wait()
+                batch = list(self._pending)
+                self._pending.clear()
+            metrics.gauge('typing.queue_depth', len(batch))
+            for kind, value, queued_at, captured_at in self._coalesce(batch):
+                try:
+                    if kind == 'key':
+                        pyautogui.press(value)
+                    elif kind == 'hotkey':
+                        pyautogui.hotkey(*value)
+                    elif kind == 'erase':
+                        pyautogui.press('backspace', presses=value, interval=self.char_interval)
+                    else:
+                        self._inject(value)
+                except Exception as e:
+                    print(f"Typing error: {e}")
+                typed_at = time.perf_counter()
+                self.latencies.append(typed_at - queued_at)
+                metrics.observe('typing.latency_ms', 1000 * (typed_at - queued_at))
+                if captured_at is not None:
+                    metrics.observe('dictation.capture_to_typed_ms', 1000 * (typed_at - captured_at))
+
+    @staticmethod
+    def _coalesce(batch):
+        """Merge runs of queued text, keeping key presses in order between them.
+
+        Text that a later erase takes back is dropped instead of being typed
+        and then deleted.
+        """
+        merged = []
+        for entry in batch:
+            previous = merged[-1] if merged else None
+            if entry[0] == 'text' and previous and previous[0] == 'text':
+                merged[-1] = ('text', previous[1] + entry[1], previous[2], previous[3] or entry[3])
+            elif entry[0] == 'erase' and previous and previous[0] == 'text':
+                kept = previous[1][:max(0, len(previous[1]) - entry[1])]
+                remaining = entry[1] - (len(previous[1]) - len(kept))
+                merged.pop()
+                if kept:
+                    merged.append(('text', kept, previous[2], previous[3]))
+                if remaining:
+                    merged.append(('erase', remaining, entry[2], entry[3]))
+            elif entry[0] == 'erase' and previous and previous[0] == 'erase':
+                merged[-1] = ('erase', previous[1] + entry[1], previous[2], previous[3] or entry[3])
+            else:
+                merged.append(entry)
+        return merged
+
+    def _inject(self, text):
+        if self.method == 'paste':
+            paste_text(text)
+        elif self.method == 'unicode' and sys.platform == 'win32':
+            send_unicode_text(text)
+        else:
+            import pyautogui
+            pyautogui.write(text, interval=self.char_interval)
+
+# ============================================================================
+# MICROPHONE CAPTURE - PortAudio callback into a ring buffer
+# ============================================================================
+class MicCapture:
+    """Callback-driven microphone capture.
+
+    PortAudio calls _callback on its own thread and it only copies samples
+    into a ring buffer, so slow recognition or typing can never stall the
+    microphone. If the reader falls a whole buffer behind, new audio is
+    dropped and counted rather than silently overwriting the stream.
+    stream_factory replaces sounddevice.InputStream, e.g. with an
+    AudioSession's warm input stream.
+    """
+
+    def __init__(self, device_index, sample_rate, chunk_size, buffer_seconds, stream_factory=None):
+        if stream_factory is None:
+            import sounddevice as sd
+            stream_factory = sd.InputStream
+        self.sample_rate = sample_rate
+        self.ring = AudioRingBuffer(int(sample_rate * buffer_seconds))
+        self.frames_captured = 0
+        self.frames_dropped = 0
+        self.overflows = 0
+        self.read_until = None  # perf_counter time the last sample read() returned was captured
+        self._callback_time = time.perf_counter()
+        self._closed = threading.Event()
+        self._stream = stream_factory(callback=self._callback,
+                                      **self.stream_settings(device_index, sample_rate, chunk_size))
+        self._stream.start()
+
+    @staticmethod
+    def stream_settings(device_index, sample_rate, chunk_size):
+        return {'samplerate': sample_rate, 'channels': 1, 'dtype': 'int16',
+                'blocksize': chunk_size, 'device': device_index}
+
+    def _callback(self, indata, frames, time_info, status):
+        if status.input_overflow:
+            self.overflows += 1
+            metrics.count('capture.overflows')
+        samples = indata[:, 0]
+        dropped = len(samples) - self.ring.write_nowait(samples)
+        if dropped:
+            self.frames_dropped += dropped
+            metrics.count('capture.dropped_samples', dropped)
+        self.frames_captured += frames
+        self._callback_time = time.perf_counter()
+
+    def read(self, out, timeout):
+        """Copy buffered samples into out, waiting up to timeout for some"""
+        if not self.ring.available():
+            self.ring.wait_for_data(timeout)
+        metrics.observe('capture.backlog_ms', 1000 * self.ring.available() / self.sample_rate)
+        n = self.ring.read_into(out)
+        self.read_until = self._callback_time - self.ring.available() / self.sample_rate
+        return n
+
+    def is_active(self):
+        try:
+            return not self._closed.is_set() and self._stream.active
+        except Exception:
+            return False
+
+    def close(self):
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        self.ring.release()  # Wakes a read() waiting for audio
+        try:
+            self._stream.stop()
+            self._stream.close()
+        except Exception as e:
+            print(f"Could not close microphone: {e}")
+
+# ============================================================================
+# DICTATION ENGINE - Microphone in, typed text out
+# ============================================================================
+class DictationEngine:
+    """Live dictation: microphone -> voice activity gate -> Vosk -> output.
+
+    Recognized words go to output, which needs type_text(text, captured_at),
+    press(key, captured_at), hotkey(keys, captured_at) and erase(count,
+    captured_at) - a TypingQueue in the app, anything else in a test or
+    service. Partial results are typed once they settle (see stabilizer.py)
+    and corrected with backspace if the recognizer changes its mind; voice
+    commands come from the commands grammar (see commands.py). With an
+    echo_reference, speech still playing is suppressed from the microphone
+    audio before the voice activity gate (see echo.py). The
+    microphone is opened through session (an AudioSession) when given,
+    so the stream stays warm between starts. Each session has a
+    CancelToken; stop() sets it, which closes the microphone and wakes
+    the dictation thread at once. on_state, if given, is called with
+    'starting' (from start() itself), then 'loading', 'listening' and
+    'stopped' from the dictation thread - only for the latest session, so
+    a slow-to-exit earlier one can't report over a new one. Settings are
+    plain attributes and apply from the next start().
+    """
+
+    def __init__(self, models, output, session=None, sample_rate=16000, chunk_size=1024,
+                 buffer_seconds=2.0, timeout_seconds=10, on_state=None):
+        self.models = models
+        self.output = output
+        self.sample_rate = sample_rate
+        self.chunk_size = chunk_size
+        self.buffer_seconds = buffer_seconds
+        self.timeout_seconds = timeout_seconds
+        self.vad = True
+        self.vad_margin_db = 10.0
+        self.vad_hangover_ms = 400
+        self.vad_preroll_ms = 300
+        self.stable_partials = 2   # Partials a word must survive before it is typed
+        self.corrections = True    # Backspace over typed words the recognizer revises
+        self.commands = CommandGrammar()
+        self.echo_reference = None  # echo.EchoReference of the speech playing, kept out of the mic
+        self.on_state = on_state
+        self.on_result = None  # Called with ('partial' or 'final', text) as results arrive
+        self.capture = None
+        self.session = session
+        self._cancel = CancelToken()
+        self._cancel.set()  # No session running yet
+        self._lock = threading.Lock()
+
+    @property
+    def active(self):
+        return not self._cancel.is_set()
+
+    def start(self, device_index=None):
+        """Open the microphone and dictate on a background thread until stopped"""
+        with self._lock:
+            if not self._cancel.is_set():
+                return None
+            cancel = self._cancel = CancelToken()
+        self._notify(cancel, 'starting')
+        thread = threading.Thread(target=self._run_microphone, args=(device_index, cancel), daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        self._cancel.set()
+
+    def prepare(self, device_index=None):
+        """Open the microphone stream ahead of the first start()"""
+        if self.session is not None:
+            self.session.input.prepare(**MicCapture.stream_settings(device_index, self.sample_rate,
+                                                                     self.chunk_size))
+
+    def run(self, source, auto_stop=False):
+        """Dictate from source on the calling thread until it runs dry or stop() is called.
+
+        source needs read(out, timeout) -> sample count and is_active(), like
+        MicCapture; a recording played back through the same interface works.
+        """
+        cancel = CancelToken()
+        with self._lock:
+            previous, self._cancel = self._cancel, cancel
+        previous.set()
+        try:
+            self._recognize(source, self.models.get('vosk'), auto_stop, cancel)
+        finally:
+            cancel.set()
+
+    def _notify(self, cancel, state):
+        if self.on_state and cancel is self._cancel:
+            self.on_state(state)
+
+    def _run_microphone(self, device_index, cancel):
+        try:
+            if not self.models.is_ready('vosk'):
+                self._notify(cancel, 'loading')
+            model = self.models.get('vosk')
+        except Exception as e:
+            print(f"Could not load speech model: {e}")
+            cancel.set()
+            self._notify(cancel, 'stopped')
+            return
+        if cancel.is_set():
+            self._notify(cancel, 'stopped')
+            return
+
+        try:
+            capture = self.capture = MicCapture(device_index, self.sample_rate, self.chunk_size,
+                                                self.buffer_seconds,
+                                                self.session.input if self.session else None)
+        except Exception as e:
+            print(f"Could not open microphone: {e}")
+            cancel.set()
+            self._notify(cancel, 'stopped')
+            return
+        cancel.on_cancel(capture.close)
+        self._notify(cancel, 'listening')
+
+        try:
+            self._recognize(capture, model, True, cancel)
+        finally:
+            cancel.set()
+            if self.capture is capture:
+                self.capture = None
+            if capture.frames_dropped or capture.overflows:
+                print(f"Dictation capture: {capture.frames_captured} frames, "
+                      f"{capture.frames_dropped} dropped, {capture.overflows} overflows")
+            self._notify(cancel, 'stopped')
+
+    @staticmethod
+    def _apply_edit(edit, typer, typed, captured_at):
+        """Carry out a stabilizer Edit; typed holds (words, checkpoint) per chunk typed this utterance"""
+        retract = edit.retract
+        checkpoint = None
+        retype = []
+        while retract > 0 and typed:
+            words, checkpoint = typed.pop()
+            retract -= len(words)
+        if checkpoint is not None:
+            typer.undo(checkpoint, captured_at)
+        if retract < 0:
+            retype = words[:-retract]  # Took back part of a chunk; put the rest back
+        words = retype + edit.words
+        if words:
+            typed.append((words, typer.type_words(words, captured_at)))
+
+    def _recognize(self, source, model, auto_stop, cancel):
+        from vosk import KaldiRecognizer
+
+        recognizer = KaldiRecognizer(model, self.sample_rate)
+        vad = None
+        if self.vad:
+            vad = VoiceActivityDetector(self.sample_rate, margin_db=self.vad_margin_db,
+                                        hangover_ms=self.vad_hangover_ms,
+                                        preroll_ms=self.vad_preroll_ms)
+        echo = None
+        if self.echo_reference is not None and self.echo_reference.sample_rate == self.sample_rate:
+            echo = EchoSuppressor(self.echo_reference, self.sample_rate)
+        last_speech_time = time.time()
+        start_time = time.time()
+        stabilizer = PartialStabilizer(self.stable_partials, self.corrections)
+        typer = CommandTyper(self.commands, self.output)
+        typed = []  # (words, checkpoint) for each chunk typed in the current utterance
+        partial_seen = False
+        # Take whatever has built up (up to a few chunks) so a backlog clears quickly
+        block = np.empty(self.chunk_size * 4, dtype=np.int16)
+        captured_at = None       # When the last sample of the block being recognized was captured
+        utterance_started = None  # When this utterance's first audio reached the recognizer
+
+        def handle_final(result):
+            nonlocal partial_seen, last_speech_time, utterance_started
+            text = json.loads(result).get('text', '')
+            utterance_started = None
+            partial_seen = False
+            if text and self.on_result:
+                self.on_result('final', text)
+            edit = stabilizer.final(text.split())
+            if edit:
+                self._apply_edit(edit, typer, typed, captured_at)
+                if edit.retract:
+                    metrics.count('dictation.corrected_words', edit.retract)
+            typer.end_phrase(captured_at)
+            typed.clear()
+            if text:
+                last_speech_time = time.time()
+
+        def handle_partial():
+            nonlocal partial_seen, last_speech_time
+            partial = json.loads(recognizer.PartialResult()).get('partial', '')
+            if partial:
+                if self.on_result:
+                    self.on_result('partial', partial)
+                if not partial_seen and utterance_started is not None:
+                    metrics.observe('dictation.first_partial_ms',
+                                    1000 * (time.perf_counter() - utterance_started))
+                partial_seen = True
+                edit = stabilizer.partial(partial.split())
+                if edit:
+                    self._apply_edit(edit, typer, typed, captured_at)
+                    if edit.retract:
+                        metrics.count('dictation.corrected_words', edit.retract)
+                last_speech_time = time.time()
+
+        while not cancel.is_set():
+            try:
+                if (auto_stop and (time.time() - start_time) > 1.0
+                        and (time.time() - last_speech_time) > self.timeout_seconds):
+                    break
+                n = source.read(block, 0.1)
+                # Sources that know when their audio was captured say so; for
+                # the rest, reading it is the closest we can tell
+                captured_at = getattr(source, 'read_until', None) or time.perf_counter()
+                if cancel.is_set():
+                    break
+                if not n:
+                    if not source.is_active():
+                        # The source ran dry - type whatever is still pending
+                        handle_final(recognizer.FinalResult())
+                        break
+                    continue
+                if echo is not None:
+                    block[:n] = echo.process(block[:n], captured_at)
+                # Silence never reaches the recognizer; the end of each speech
+                # region flushes it so the phrase is typed straight away
+                pieces = vad.process(block[:n]) if vad else [(block[:n], False)]
+                # Auto-stop counts words and ended regions, not an open gate,
+                # so noise the gate lets through can't keep dictation running
+                for speech, ended in pieces:
+                    if len(speech):
+                        if utterance_started is None:
+                            utterance_started = captured_at
+                        started = time.perf_counter()
+                        accepted = recognizer.AcceptWaveform(speech.tobytes())
+                        metrics.observe('dictation.recognize_ms', 1000 * (time.perf_counter() - started))
+                        if accepted:
+                            handle_final(recognizer.Result())
+                        else:
+                            handle_partial()
+                    if ended:
+                        last_speech_time = time.time()
+                        handle_final(recognizer.FinalResult())
+            except Exception as e:
+                print(f"Dictation error: {e}")
+                break
+        if echo is not None:
+            metrics.count('dictation.echo_suppressed_frames', echo.frames_suppressed)
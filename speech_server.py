@@ -0,0 +1,320 @@
+"""
+Local speech server: one loaded Vosk model and Piper voice shared by every
+tool on the machine.
+
+Clients connect over localhost TCP, a Unix socket or (on Windows) a named
+pipe and exchange frames. A frame is a 1-byte kind, a 4-byte little-endian
+payload length, then the payload:
+
+    b'J'  a UTF-8 JSON object
+    b'A'  raw mono int16 PCM
+
+Recognition - the client sends
+    {"op": "recognize", "id": "r1", "sample_rate": 16000}
+followed by 'A' frames of microphone audio, then {"op": "end", "id": "r1"}.
+The server answers {"event": "partial", ...} as the hypothesis changes,
+{"event": "final", "text": ..., "words": [...]} at each utterance end and
+{"event": "done", "id": "r1"} once the stream is closed.
+
+Synthesis - the client sends {"op": "speak", "id": "s1", "text": "..."}; the
+server answers {"event": "audio", "id": "s1", "sample_rate": 22050} followed
+by one 'A' frame per sentence as soon as it is synthesized, then
+{"event": "done", "id": "s1"}. {"op": "cancel", "id": "s1"} stops it early.
+Speak requests on one connection are queued, so the 'A' frames after an
+"audio" event always belong to it; a queued request can be cancelled too.
+
+An id stays in use until its "done"; a recognize or speak reusing one
+that is still open is answered with an error and ignored.
+
+Every client gets its own recognizer; the model, the Piper sessions and the
+sentence cache are shared. Blocking model calls run on a thread pool so one
+busy client never holds up the others.
+
+    python speech_server.py [--tcp 127.0.0.1:8765] [--unix PATH] [--pipe NAME]
+    SpeakAnywhere.exe --serve [options]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import struct
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from speak_engine import CancelToken, ModelManager, SpeechEngine, SynthCache, load_piper_voice, load_vosk_model
+
+if getattr(sys, 'frozen', False):
+    _APP_DIR = os.path.dirname(sys.executable)
+else:
+    _APP_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_VOSK_MODEL = os.path.join(_APP_DIR, "_resources", "vosk-model-small-en-us-0.15")
+DEFAULT_PIPER_MODEL = os.path.join(_APP_DIR, "_resources", "piper", "en_US-hfc_male-medium.onnx")
+DEFAULT_PORT = 8765
+DEFAULT_PIPE = r'\\.\pipe\SpeakAnywhere'
+
+FRAME_HEADER = struct.Struct('<cI')
+JSON_FRAME = b'J'
+AUDIO_FRAME = b'A'
+MAX_FRAME_BYTES = 16 * 1024 * 1024
+
+
+# ============================================================================
+# FRAMING - Shared by the server and by clients
+# ============================================================================
+async def read_frame(reader):
+    """Return (kind, payload), or (None, None) once the peer has gone"""
+    try:
+        header = await reader.readexactly(FRAME_HEADER.size)
+        kind, length = FRAME_HEADER.unpack(header)
+        if length > MAX_FRAME_BYTES:
+            print(f"Dropping client: frame of {length} bytes is too large")
+            return None, None
+        return kind, await reader.readexactly(length)
+    except (asyncio.IncompleteReadError, ConnectionError):
+        return None, None
+
+
+def encode_frame(kind, payload):
+    if kind == JSON_FRAME:
+        payload = json.dumps(payload).encode('utf-8')
+    return FRAME_HEADER.pack(kind, len(payload)) + payload
+
+
+# ============================================================================
+# SERVER
+# ============================================================================
+class SpeechServer:
+    """Serves recognition and synthesis to any number of local clients"""
+
+    def __init__(self, models, speech, sample_rate=16000, threads=None):
+        self.models = models
+        self.speech = speech
+        self.sample_rate = sample_rate
+        self.executor = ThreadPoolExecutor(max_workers=threads or max(2, os.cpu_count() or 2),
+                                           thread_name_prefix="speech-server")
+        self.clients = 0
+
+    async def handle_client(self, reader, writer):
+        self.clients += 1
+        try:
+            await ClientSession(self, reader, writer).run()
+        finally:
+            self.clients -= 1
+            writer.close()
+
+    async def serve(self, tcp=None, unix=None, pipe=None):
+        """Listen on every requested endpoint until cancelled"""
+        loop = asyncio.get_running_loop()
+        servers = []
+        if tcp:
+            host, port = tcp
+            servers.append(await asyncio.start_server(self.handle_client, host, port))
+            print(f"Listening on {host}:{port}")
+        if unix:
+            servers.append(await asyncio.start_unix_server(self.handle_client, unix))
+            print(f"Listening on {unix}")
+        if pipe:
+            # Windows only - named pipes are served by the proactor event loop
+            def protocol():
+                reader = asyncio.StreamReader()
+                return asyncio.StreamReaderProtocol(reader, self.handle_client)
+            servers.extend(await loop.start_serving_pipe(protocol, pipe))
+            print(f"Listening on {pipe}")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            for server in servers:
+                server.close()
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def run_blocking(self, func, *args):
+        return asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+
+class ClientSession:
+    """One connection: its recognizers, its synthesis tasks and its writer"""
+
+    def __init__(self, server, reader, writer):
+        self.server = server
+        self.reader = reader
+        self.writer = writer
+        self.recognizers = {}
+        self.speaking = {}
+        self._tasks = set()
+        self._send_lock = asyncio.Lock()
+        self._speak_lock = asyncio.Lock()  # One synthesis at a time, in request order
+
+    async def send(self, kind, payload):
+        async with self._send_lock:
+            self.writer.write(encode_frame(kind, payload))
+            await self.writer.drain()
+
+    async def error(self, message, request_id=None):
+        await self.send(JSON_FRAME, {'event': 'error', 'id': request_id, 'message': message})
+
+    async def run(self):
+        current = None  # Recognition stream that audio frames belong to
+        try:
+            while True:
+                kind, payload = await read_frame(self.reader)
+                if kind is None:
+                    break
+                if kind == AUDIO_FRAME:
+                    if current in self.recognizers:
+                        await self.recognize(current, payload)
+                    continue
+                try:
+                    message = json.loads(payload)
+                    op = message['op']
+                except (ValueError, KeyError, TypeError):
+                    await self.error("Malformed request")
+                    continue
+                request_id = message.get('id')
+                try:
+                    current = await self.dispatch(op, request_id, message, current)
+                except ConnectionError:
+                    raise
+                except Exception as e:
+                    await self.error(f"{op} failed: {e}", request_id)
+        except ConnectionError:
+            pass
+        finally:
+            for cancel in self.speaking.values():
+                cancel.set()
+
+    async def dispatch(self, op, request_id, message, current):
+        """Handle one JSON request; returns the recognition stream audio now goes to"""
+        if op == 'recognize':
+            if request_id in self.recognizers:
+                await self.error("Request id already in use", request_id)
+                return current
+            await self.start_recognition(request_id, message.get('sample_rate'))
+            return request_id
+        if op == 'end':
+            await self.end_recognition(request_id)
+        elif op == 'speak':
+            if request_id in self.speaking:
+                await self.error("Request id already in use", request_id)
+            else:
+                self.start_speaking(request_id, message.get('text', ''))
+        elif op == 'cancel':
+            cancel = self.speaking.pop(request_id, None)
+            if cancel is not None:
+                cancel.set()
+        elif op == 'ping':
+            await self.send(JSON_FRAME, {'event': 'pong', 'id': request_id})
+        else:
+            await self.error(f"Unknown op: {op}", request_id)
+        return current
+
+    # ----- Recognition -----
+    async def start_recognition(self, request_id, sample_rate):
+        from vosk import KaldiRecognizer
+        model = await self.server.run_blocking(self.server.models.get, 'vosk')
+        recognizer = KaldiRecognizer(model, sample_rate or self.server.sample_rate)
+        recognizer.SetWords(True)
+        self.recognizers[request_id] = [recognizer, ""]
+
+    async def recognize(self, request_id, pcm):
+        state = self.recognizers[request_id]
+        recognizer = state[0]
+        if await self.server.run_blocking(recognizer.AcceptWaveform, pcm):
+            await self.send_final(request_id, recognizer.Result())
+            state[1] = ""
+        else:
+            partial = json.loads(recognizer.PartialResult()).get('partial', '')
+            if partial != state[1]:
+                state[1] = partial
+                await self.send(JSON_FRAME, {'event': 'partial', 'id': request_id, 'text': partial})
+
+    async def send_final(self, request_id, result):
+        result = json.loads(result)
+        if result.get('text'):
+            await self.send(JSON_FRAME, {'event': 'final', 'id': request_id, 'text': result['text'],
+                                         'words': result.get('result', [])})
+
+    async def end_recognition(self, request_id):
+        state = self.recognizers.pop(request_id, None)
+        if state is None:
+            await self.error("No such recognition stream", request_id)
+            return
+        await self.send_final(request_id, await self.server.run_blocking(state[0].FinalResult))
+        await self.send(JSON_FRAME, {'event': 'done', 'id': request_id})
+
+    # ----- Synthesis -----
+    def start_speaking(self, request_id, text):
+        cancel = CancelToken()
+        self.speaking[request_id] = cancel
+        task = asyncio.ensure_future(self.speak(request_id, text, cancel))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def speak(self, request_id, text, cancel):
+        async with self._speak_lock:
+            await self._speak(request_id, text, cancel)
+
+    async def _speak(self, request_id, text, cancel):
+        sentences = self.server.speech.synthesize(text, cancel)
+        sample_rate = None
+        try:
+            await self.server.run_blocking(self.server.models.get, 'piper')
+            while not cancel.is_set():
+                item = await self.server.run_blocking(next, sentences, None)
+                if item is None:
+                    break
+                samples, rate = item
+                if sample_rate is None:
+                    sample_rate = rate
+                    await self.send(JSON_FRAME, {'event': 'audio', 'id': request_id, 'sample_rate': rate})
+                await self.send(AUDIO_FRAME, samples.tobytes())
+            await self.send(JSON_FRAME, {'event': 'done', 'id': request_id, 'cancelled': cancel.is_set()})
+        except ConnectionError:
+            cancel.set()
+        except Exception as e:
+            await self.error(f"Synthesis failed: {e}", request_id)
+        finally:
+            try:
+                sentences.close()
+            except ValueError:
+                pass  # Still running on a worker; the cancel flag stops it
+            if self.speaking.get(request_id) is cancel:
+                del self.speaking[request_id]
+
+
+def _parse_tcp(value):
+    host, _, port = value.rpartition(':')
+    return host or '127.0.0.1', int(port)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="speech_server",
+                                     description="Share Speak Anywhere's speech models with local tools.")
+    parser.add_argument('--tcp', type=_parse_tcp, help=f"HOST:PORT (default 127.0.0.1:{DEFAULT_PORT})")
+    parser.add_argument('--unix', help="Unix socket path")
+    parser.add_argument('--pipe', nargs='?', const=DEFAULT_PIPE, help=f"Windows named pipe (default {DEFAULT_PIPE})")
+    parser.add_argument('--vosk-model', default=DEFAULT_VOSK_MODEL)
+    parser.add_argument('--piper-model', default=DEFAULT_PIPER_MODEL)
+    parser.add_argument('--synth-workers', type=int, default=max(1, min(4, (os.cpu_count() or 2) // 2)))
+    parser.add_argument('--cache-mb', type=int, default=64, help="Synthesized sentence cache size")
+    args = parser.parse_args(argv)
+    if not (args.tcp or args.unix or args.pipe):
+        args.tcp = ('127.0.0.1', DEFAULT_PORT)
+
+    models = ModelManager({
+        'vosk': lambda: load_vosk_model(args.vosk_model),
+        'piper': lambda: load_piper_voice(args.piper_model),
+    })
+    models.preload('vosk', 'piper')
+    speech = SpeechEngine(models, args.piper_model, SynthCache(args.cache_mb * 1024 * 1024),
+                          args.synth_workers)
+    server = SpeechServer(models, speech)
+    try:
+        asyncio.run(server.serve(args.tcp, args.unix, args.pipe))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,185 @@
+"""
+Pre-baked splash animation for Speak Anywhere.
+
+The splash video is cropped to a square, scaled to the splash size and
+JPEG-encoded frame by frame into one file (_resources/splash_frames.bin)
+ahead of time. At startup the app memory-maps that file and decodes one small
+JPEG per frame with Pillow, so OpenCV is never imported and doesn't need to
+be bundled into the EXE.
+
+File layout (little-endian):
+    header   magic "SAFR", version, width, height, fps, frame count
+    index    (offset, length) of each frame
+    frames   JPEG data
+
+One-time conversion (needs opencv-python, only on the build machine):
+    python splash_frames.py convert [video.mp4] [output.bin] [size]
+Compare against decoding the MP4 with OpenCV:
+    python splash_frames.py benchmark [video.mp4] [frames.bin]
+"""
+
+import io
+import mmap
+import os
+import struct
+import sys
+import time
+
+from PIL import Image
+
+MAGIC = b'SAFR'
+VERSION = 1
+HEADER = struct.Struct('<4sHHHfI')
+INDEX_ENTRY = struct.Struct('<II')
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_VIDEO = os.path.join(_HERE, "_resources", "splash_video.mp4")
+DEFAULT_FRAMES = os.path.join(_HERE, "_resources", "splash_frames.bin")
+DEFAULT_SIZE = 250
+
+
+class SplashFrames:
+    """Read-only view of a packed frame file"""
+
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, self.width, self.height, self.fps, count = HEADER.unpack_from(self._map, 0)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"{path} is not a splash frame file")
+        except Exception:
+            self._file.close()
+            raise
+        self._index = [INDEX_ENTRY.unpack_from(self._map, HEADER.size + i * INDEX_ENTRY.size)
+                       for i in range(count)]
+
+    def __len__(self):
+        return len(self._index)
+
+    def image(self, i):
+        """Decode frame i as an RGB PIL image"""
+        offset, length = self._index[i]
+        img = Image.open(io.BytesIO(self._map[offset:offset + length]))
+        img.load()
+        return img
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+def convert(video_path=DEFAULT_VIDEO, output_path=DEFAULT_FRAMES, size=DEFAULT_SIZE, quality=90):
+    """Crop, scale and pack every frame of video_path into output_path"""
+    import cv2
+
+    cap = cv2.VideoCapture(video_path)
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    if fps <= 0:
+        fps = 24
+    square = min(width, height)
+    crop_x = (width - square) // 2
+    crop_y = (height - square) // 2
+
+    encoded = []
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frame = frame[crop_y:crop_y + square, crop_x:crop_x + square]
+        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        frame = cv2.resize(frame, (size, size), interpolation=cv2.INTER_AREA)
+        buf = io.BytesIO()
+        Image.fromarray(frame).save(buf, format='JPEG', quality=quality)
+        encoded.append(buf.getvalue())
+    cap.release()
+
+    offset = HEADER.size + INDEX_ENTRY.size * len(encoded)
+    with open(output_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, size, size, fps, len(encoded)))
+        for data in encoded:
+            f.write(INDEX_ENTRY.pack(offset, len(data)))
+            offset += len(data)
+        for data in encoded:
+            f.write(data)
+    print(f"Wrote {len(encoded)} frames ({size}x{size} @ {fps:.2f} fps) to {output_path} "
+          f"({os.path.getsize(output_path) / 1024:.0f} KB)")
+
+
+# ============================================================================
+# BENCHMARK - OpenCV video decode vs pre-baked frames
+# ============================================================================
+def _import_seconds(statement):
+    """Cold import time of a module, measured in a fresh interpreter"""
+    import subprocess
+    code = f"import time; t = time.perf_counter(); {statement}; print(time.perf_counter() - t)"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    return float(result.stdout.strip()) if result.returncode == 0 else float('nan')
+
+
+def _dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+def benchmark(video_path=DEFAULT_VIDEO, frames_path=DEFAULT_FRAMES, size=DEFAULT_SIZE):
+    """Print import cost, per-frame cost and on-disk size of both splash paths"""
+    import cv2
+
+    started = time.perf_counter()
+    cap = cv2.VideoCapture(video_path)
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    square = min(width, height)
+    crop_x = (width - square) // 2
+    crop_y = (height - square) // 2
+    video_frames = 0
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frame = frame[crop_y:crop_y + square, crop_x:crop_x + square]
+        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        frame = cv2.resize(frame, (size, size))
+        Image.fromarray(frame)
+        video_frames += 1
+    cap.release()
+    video_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    frames = SplashFrames(frames_path)
+    for i in range(len(frames)):
+        frames.image(i)
+    baked_frames = len(frames)
+    frames.close()
+    baked_seconds = time.perf_counter() - started
+
+    cv2_import = _import_seconds("import cv2")
+    pil_import = _import_seconds("import PIL.Image")
+    cv2_size = _dir_size(os.path.dirname(cv2.__file__))
+
+    print(f"{'':24} {'OpenCV (mp4)':>14} {'pre-baked':>12}")
+    print(f"{'import (ms)':24} {cv2_import * 1000:>14.1f} {pil_import * 1000:>12.1f}")
+    print(f"{'all frames (ms)':24} {video_seconds * 1000:>14.1f} {baked_seconds * 1000:>12.1f}")
+    print(f"{'per frame (ms)':24} {video_seconds * 1000 / max(video_frames, 1):>14.2f} "
+          f"{baked_seconds * 1000 / max(baked_frames, 1):>12.2f}")
+    print(f"{'adds to bundle (MB)':24} {cv2_size / 1e6:>14.1f} "
+          f"{os.path.getsize(frames_path) / 1e6:>12.1f}")
+    print("(Pillow is bundled either way; its import is shown only for comparison.)")
+
+
+if __name__ == '__main__':
+    command = sys.argv[1] if len(sys.argv) > 1 else 'convert'
+    args = sys.argv[2:]
+    if command == 'convert':
+        convert(*(args[:2]), *([int(args[2])] if len(args) > 2 else []))
+    elif command == 'benchmark':
+        benchmark(*args[:2])
+    else:
+        print(__doc__)
+        sys.exit(1)
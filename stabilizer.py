@@ -0,0 +1,191 @@
+"""
+Partial-result stabilization for Speak Anywhere's dictation.
+
+Vosk revises its partial hypothesis as more audio arrives, so words can't
+be typed the moment they first appear. PartialStabilizer lines each new
+hypothesis up against the previous one (common prefix first, then a
+word-level edit-distance alignment of the rest) and counts for how many
+partials in a row every word has survived. Words are committed - typed -
+once they and everything before them have been stable for stable_partials
+partials. If a later partial or the final result disagrees with words
+already typed, it returns a correction: how many typed words to take back
+(with backspace) and what to type instead.
+
+It only deals in word lists, so it can be driven from recorded Vosk
+output. Replay a recording (one Vosk result JSON object per line), or
+record one from a WAV file first:
+    python stabilizer.py --record recording.wav vosk_model_dir > results.jsonl
+    python stabilizer.py results.jsonl [stable_partials]
+"""
+
+import json
+import sys
+from collections import namedtuple
+
+# Take back the last `retract` typed words, then type `words`
+Edit = namedtuple('Edit', 'retract words')
+
+
+def common_prefix(a, b):
+    """Number of leading items a and b have in common"""
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    return i
+
+
+def align(old, new):
+    """Word-level edit-distance alignment.
+
+    Returns, for each index of new, the index of the word in old it
+    matched (same word, kept in place by the minimal edit), or None if
+    it was inserted or substituted.
+    """
+    rows, cols = len(old) + 1, len(new) + 1
+    cost = [list(range(cols))] + [[i] + [0] * (cols - 1) for i in range(1, rows)]
+    for i in range(1, rows):
+        above, row = cost[i - 1], cost[i]
+        for j in range(1, cols):
+            if old[i - 1] == new[j - 1]:
+                row[j] = above[j - 1]
+            else:
+                row[j] = 1 + min(above[j - 1], above[j], row[j - 1])
+    matches = [None] * len(new)
+    i, j = len(old), len(new)
+    while i and j:
+        if old[i - 1] == new[j - 1] and cost[i][j] == cost[i - 1][j - 1]:
+            matches[j - 1] = i - 1
+            i -= 1
+            j -= 1
+        elif cost[i][j] == cost[i - 1][j] + 1:
+            i -= 1
+        elif cost[i][j] == cost[i][j - 1] + 1:
+            j -= 1
+        else:
+            i -= 1
+            j -= 1
+    return matches
+
+
+class PartialStabilizer:
+    """Turns a stream of partial and final hypotheses into typing edits.
+
+    partial() and final() take the hypothesis as a list of words and
+    return an Edit, or None when nothing needs typing. With corrections
+    off, typed words are never taken back (the final result only appends).
+    """
+
+    def __init__(self, stable_partials=2, corrections=True):
+        self.stable_partials = max(1, stable_partials)
+        self.corrections = corrections
+        self.committed = []    # Words typed so far in this utterance
+        self.hypothesis = []   # Latest partial
+        self.ages = []         # Partials in a row each hypothesis word has survived
+        self.corrected_words = 0
+
+    def partial(self, words):
+        self._track(words)
+        stable = 0
+        while stable < len(self.ages) and self.ages[stable] >= self.stable_partials:
+            stable += 1
+        target = words[:stable]
+        kept = common_prefix(self.committed, target)
+        if kept == len(self.committed):
+            return self._commit(0, target[kept:])
+        if kept < len(target) and self.corrections:
+            # A typed word has been replaced by one that has now settled
+            return self._commit(len(self.committed) - kept, target[kept:])
+        return None  # Wait: the hypothesis is shorter than what's typed, or unsettled
+
+    def final(self, words):
+        """Close the utterance with the recognizer's final words"""
+        if self.corrections:
+            kept = common_prefix(self.committed, words)
+            edit = self._commit(len(self.committed) - kept, words[kept:])
+        else:
+            edit = self._commit(0, words[len(self.committed):])
+        self.reset()
+        return edit
+
+    def reset(self):
+        self.committed = []
+        self.hypothesis = []
+        self.ages = []
+
+    def _track(self, words):
+        old, ages = self.hypothesis, self.ages
+        prefix = common_prefix(old, words)
+        new_ages = [age + 1 for age in ages[:prefix]]
+        if prefix < len(old) and prefix < len(words):
+            # Words that survive an insertion or substitution keep their age
+            for match in align(old[prefix:], words[prefix:]):
+                new_ages.append(1 if match is None else ages[prefix + match] + 1)
+        else:
+            new_ages.extend([1] * (len(words) - prefix))
+        self.hypothesis = words
+        self.ages = new_ages
+
+    def _commit(self, retract, words):
+        if not retract and not words:
+            return None
+        self.corrected_words += retract
+        if retract:
+            del self.committed[len(self.committed) - retract:]
+        self.committed.extend(words)
+        return Edit(retract, list(words))
+
+
+def replay(results, stable_partials=2, corrections=True):
+    """Feed Vosk result dicts (partial or final) through a stabilizer.
+
+    Returns the text that would be on screen afterwards and the edits that
+    got it there.
+    """
+    stabilizer = PartialStabilizer(stable_partials, corrections)
+    screen = []
+    edits = []
+    for result in results:
+        if 'partial' in result:
+            if not result['partial']:
+                continue
+            edit = stabilizer.partial(result['partial'].split())
+        else:
+            edit = stabilizer.final(result.get('text', '').split())
+        if edit:
+            edits.append(edit)
+            del screen[len(screen) - edit.retract:]
+            screen.extend(edit.words)
+    return {'text': " ".join(screen), 'edits': edits, 'corrected_words': stabilizer.corrected_words}
+
+
+def record(wav_path, model_path, sample_rate=16000, block=4096):
+    """Print the Vosk results for a WAV file as JSON lines, in the order dictation sees them"""
+    from vosk import Model, KaldiRecognizer, SetLogLevel
+    from vad import _read_wav
+    SetLogLevel(-1)
+    audio = _read_wav(wav_path, sample_rate)
+    recognizer = KaldiRecognizer(Model(model_path), sample_rate)
+    for i in range(0, len(audio), block):
+        if recognizer.AcceptWaveform(audio[i:i + block].tobytes()):
+            print(json.dumps({'text': json.loads(recognizer.Result()).get('text', '')}))
+        else:
+            print(json.dumps({'partial': json.loads(recognizer.PartialResult()).get('partial', '')}))
+    print(json.dumps({'text': json.loads(recognizer.FinalResult()).get('text', '')}))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 4 and sys.argv[1] == '--record':
+        record(sys.argv[2], sys.argv[3])
+        sys.exit(0)
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    with open(sys.argv[1], encoding='utf-8') as f:
+        recorded = [json.loads(line) for line in f if line.strip()]
+    n = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    outcome = replay(recorded, n)
+    for edit in outcome['edits']:
+        print(f"{'-' + str(edit.retract) if edit.retract else '  ':>4}  {' '.join(edit.words)}")
+    print(f"\n{outcome['text']}")
+    print(f"{len(outcome['edits'])} edits, {outcome['corrected_words']} words corrected")
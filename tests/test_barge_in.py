@@ -0,0 +1,163 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from speak_engine import ModelManager, SpeechEngine
+
+VOICE_RATE = 22050
+SENTENCE_SAMPLES = VOICE_RATE // 2
+LEVEL = 1000
+
+
+class Chunk:
+    def __init__(self, samples):
+        self.audio_int16_array = samples
+        self.sample_rate = VOICE_RATE
+
+
+class ConstantVoice:
+    """Piper look-alike: half a second of constant level per sentence"""
+
+    def synthesize(self, sentence):
+        yield Chunk(np.full(SENTENCE_SAMPLES, LEVEL, dtype=np.int16))
+
+
+class NullOutputStream:
+    """Output stream look-alike that pulls blocks a few times faster than real time and keeps them"""
+
+    class CallbackStop(Exception):
+        pass
+
+    def __init__(self, samplerate, channels, dtype, blocksize, device, callback, finished_callback=None):
+        self.blocksize = blocksize
+        self.callback = callback
+        self.finished_callback = finished_callback
+        self.blocks = []
+        self.active = False
+        self._stopped = threading.Event()
+
+    def start(self):
+        self.active = True
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        try:
+            while not self._stopped.is_set():
+                block = np.zeros((self.blocksize, 1), dtype=np.int16)
+                try:
+                    self.callback(block, self.blocksize, None, None)
+                except self.CallbackStop:
+                    self.blocks.append(block[:, 0])
+                    break
+                self.blocks.append(block[:, 0])
+                time.sleep(0.005)
+        finally:
+            self.active = False
+            if self.finished_callback:
+                self.finished_callback()
+
+    def stop(self):
+        self._stopped.set()
+
+    abort = close = stop
+
+
+class Speaker:
+    """Stream factory that remembers every stream it opened"""
+
+    CallbackStop = NullOutputStream.CallbackStop
+
+    def __init__(self):
+        self.streams = []
+
+    def __call__(self, **settings):
+        stream = NullOutputStream(**settings)
+        self.streams.append(stream)
+        return stream
+
+    def played(self):
+        blocks = [block for stream in self.streams for block in list(stream.blocks)]
+        return np.concatenate(blocks) if blocks else np.zeros(0, dtype=np.int16)
+
+
+@pytest.fixture
+def engine():
+    speaker = Speaker()
+    states = []
+    models = ModelManager({'piper': ConstantVoice})
+    models.get('piper')  # Loaded, so no 'loading' state
+    speech = SpeechEngine(models, 'voice.onnx', on_state=states.append)
+    speech.stream_factory = speaker
+    speech.speaker, speech.states = speaker, states
+    return speech
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        assert time.perf_counter() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def blocks_played(speech):
+    return sum(len(stream.blocks) for stream in speech.speaker.streams)
+
+
+TEXT = "One. Two. Three. Four."
+
+
+def test_pause_holds_the_position_and_resume_plays_everything(engine):
+    thread = engine.speak(TEXT)
+    wait_for(lambda: engine.speaker.played().any())
+    engine.pause()
+    assert engine.state == 'paused' and engine.is_speaking
+    time.sleep(0.02)  # Let the block already being written finish
+    paused_at = blocks_played(engine)
+    time.sleep(0.2)
+    silent = [block for stream in engine.speaker.streams for block in stream.blocks][paused_at:]
+    assert len(silent) > 5 and not any(block.any() for block in silent)
+
+    engine.resume()
+    assert engine.state == 'speaking'
+    thread.join(10)
+    assert engine.state == 'idle'
+    assert engine.states == ['speaking', 'paused', 'speaking', 'idle']
+    # Nothing was skipped while paused (the time stretcher may shift a few samples)
+    heard = np.count_nonzero(engine.speaker.played())
+    assert abs(heard - 4 * SENTENCE_SAMPLES) < 0.02 * 4 * SENTENCE_SAMPLES
+
+
+def test_pause_before_audio_starts_paused(engine):
+    thread = engine.speak(TEXT)
+    engine.pause()
+    time.sleep(0.2)
+    assert engine.state == 'paused'
+    assert not engine.speaker.played().any()
+    engine.resume()
+    thread.join(10)
+    assert np.count_nonzero(engine.speaker.played()) > 3 * SENTENCE_SAMPLES
+
+
+def test_duck_lowers_the_level_from_the_next_block(engine):
+    thread = engine.speak(TEXT)
+    wait_for(lambda: engine.speaker.played().any())
+    engine.duck(0.25)
+    time.sleep(0.02)
+    ducked_from = blocks_played(engine)
+    time.sleep(0.1)
+    engine.duck(1.0)
+    thread.join(10)
+    blocks = [block for stream in engine.speaker.streams for block in stream.blocks]
+    ducked = np.concatenate(blocks[ducked_from:ducked_from + 5])
+    assert 0 < ducked.max() <= LEVEL * 0.25 + 5
+    assert np.concatenate(blocks[-10:]).max() > LEVEL * 0.9
+
+
+def test_resume_after_speech_ended_does_nothing(engine):
+    engine.speak("One.").join(10)
+    engine.pause()
+    engine.resume()
+    assert engine.state == 'idle'
+    assert engine.states == ['speaking', 'idle']
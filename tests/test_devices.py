@@ -0,0 +1,27 @@
+from devices import DEFAULT_OUTPUT, DeviceRegistry
+
+
+def fake_query(*names):
+    """query() for DeviceRegistry: output-only devices on one host API"""
+    devices = [{'name': name, 'hostapi': 0, 'max_input_channels': 0, 'max_output_channels': 2}
+               for name in names]
+    return lambda: (devices, [{'name': 'MME'}])
+
+
+def test_unnamed_endpoints_hidden_by_exact_name():
+    registry = DeviceRegistry(query=fake_query("Headphones ()", " Room Speaker () "))
+    registry.scan()
+    assert registry.outputs == [DEFAULT_OUTPUT]
+
+
+def test_named_headphones_still_aliased():
+    registry = DeviceRegistry(query=fake_query("Headphones () USB Audio"))
+    registry.scan()
+    assert [device.name for device in registry.outputs] == ["USB Headset"]
+    assert registry.outputs[0].key == "MME/Headphones () USB Audio"
+
+
+def test_user_fragments_hide_by_substring():
+    registry = DeviceRegistry(hidden=["usb"], query=fake_query("Speakers (USB Audio)"))
+    registry.scan()
+    assert registry.outputs == [DEFAULT_OUTPUT]
@@ -0,0 +1,82 @@
+import numpy as np
+
+from echo import EchoReference, EchoSuppressor, suppress_files
+from speak_engine import save_wav
+
+RATE = 16000
+
+
+def level_db(samples):
+    x = samples.astype(np.float64) / 32768.0
+    return 10 * np.log10(np.mean(x * x) + 1e-12)
+
+
+def speech_like(rng, seconds, level):
+    """Noise in 3 Hz on/off bursts, roughly the rhythm of syllables"""
+    t = np.arange(int(seconds * RATE)) / RATE
+    bursts = np.sin(2 * np.pi * 3 * t) > 0
+    return rng.normal(0, level, len(t)) * bursts
+
+
+def region(samples, start, stop):
+    return samples[int(start * RATE):int(stop * RATE)]
+
+
+def make_recordings(tmp_path):
+    """Speech played for 0-5 s; the mic hears its echo, and the user talks over it at 2-3 s"""
+    rng = np.random.default_rng(1)
+    speech = speech_like(rng, 6, 6000)
+    speech[5 * RATE:] = 0
+    user = np.zeros(6 * RATE)
+    user[2 * RATE:3 * RATE] = rng.normal(0, 8000, RATE)
+    user[int(5.5 * RATE):] = rng.normal(0, 8000, 6 * RATE - int(5.5 * RATE))
+    mic = 0.3 * speech + user + rng.normal(0, 30, len(user))
+    speech_path, mic_path = tmp_path / "speech.wav", tmp_path / "mic.wav"
+    save_wav(str(speech_path), speech.astype(np.int16), RATE)
+    save_wav(str(mic_path), np.clip(mic, -32768, 32767).astype(np.int16), RATE)
+    return str(mic_path), str(speech_path), user.astype(np.int16)
+
+
+def test_reference_read_returns_what_played_and_silence_for_gaps():
+    reference = EchoReference(RATE)
+    reference.write(np.full(RATE // 10, 1000, dtype=np.int16), RATE, end_time=1.0)
+    reference.write(np.full(RATE // 10, 2000, dtype=np.int16), RATE, end_time=1.2)  # 0.1 s gap
+    played = reference.read(1.2, 3 * RATE // 10)
+    assert (played[:RATE // 10] == 1000).all()
+    assert (played[RATE // 10:RATE // 5] == 0).all()
+    assert (played[RATE // 5:] == 2000).all()
+    assert not reference.read(0.5, 100).any()  # Before anything was written
+
+
+def test_reference_resamples_to_its_rate():
+    reference = EchoReference(RATE)
+    reference.write(np.full(22050, 500, dtype=np.int16), 22050, end_time=1.0)
+    played = reference.read(1.0, RATE)
+    assert abs(np.count_nonzero(played) - RATE) <= 1
+
+
+def test_echo_only_is_attenuated(tmp_path):
+    mic_path, speech_path, _ = make_recordings(tmp_path)
+    out, suppressor = suppress_files(mic_path, speech_path, delay_ms=0)
+    from vad import _read_wav
+    mic = _read_wav(mic_path, RATE)
+    for start, stop in ((0.5, 2.0), (3.2, 5.0)):
+        assert level_db(region(out, start, stop)) < level_db(region(mic, start, stop)) - 15
+    assert suppressor.frames_suppressed > 0
+
+
+def test_users_speech_passes_through(tmp_path):
+    mic_path, speech_path, user = make_recordings(tmp_path)
+    out, _ = suppress_files(mic_path, speech_path, delay_ms=0)
+    # Talking over the speech, and talking after it has ended
+    assert level_db(region(out, 2.0, 3.0)) > level_db(region(user, 2.0, 3.0)) - 3
+    assert abs(level_db(region(out, 5.5, 6.0)) - level_db(region(user, 5.5, 6.0))) < 0.5
+
+
+def test_nothing_is_suppressed_without_a_reference():
+    rng = np.random.default_rng(2)
+    mic = rng.normal(0, 3000, RATE).astype(np.int16)
+    suppressor = EchoSuppressor(EchoReference(RATE), RATE)
+    out = suppressor.process(mic, end_time=1.0)
+    assert np.array_equal(out, mic)
+    assert suppressor.frames_suppressed == 0
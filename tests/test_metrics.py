@@ -0,0 +1,36 @@
+import json
+
+from metrics import Metrics
+
+
+def snapshots(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_start_log_again_with_same_settings_keeps_the_thread(tmp_path):
+    metrics = Metrics()
+    path = str(tmp_path / "metrics.jsonl")
+    metrics.start_log(path, 60)
+    thread = metrics._log_thread
+    metrics.start_log(path, 60)
+    assert metrics._log_thread is thread
+    assert not (tmp_path / "metrics.jsonl").exists()  # No snapshot from a restart
+    metrics.stop_log()
+    assert len(snapshots(path)) == 1
+
+
+def test_start_log_restarts_when_settings_change(tmp_path):
+    metrics = Metrics()
+    first, second = str(tmp_path / "a.jsonl"), str(tmp_path / "b.jsonl")
+    metrics.start_log(first, 60)
+    metrics.start_log(second, 60)
+    assert len(snapshots(first)) == 1
+    thread = metrics._log_thread
+    metrics.start_log(second, 30)
+    assert metrics._log_thread is not thread
+    metrics.stop_log()
+    assert len(snapshots(second)) == 2
+    metrics.start_log(second, 30)
+    assert metrics._log_thread is not None
+    metrics.stop_log()
@@ -0,0 +1,117 @@
+import threading
+import time
+import types
+
+import numpy as np
+
+from speak_engine import SharedStream, StreamingPlayer
+
+
+class FailingOutputStream:
+    """Output stream look-alike that plays a few blocks, then fails like an unplugged device"""
+
+    class CallbackStop(Exception):
+        pass
+
+    blocks_before_failure = 3
+
+    def __init__(self, samplerate, channels, dtype, blocksize, device, callback, finished_callback=None):
+        self.blocksize = blocksize
+        self.callback = callback
+        self.finished_callback = finished_callback
+        self.active = False
+
+    def start(self):
+        self.active = True
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        block = np.zeros((self.blocksize, 1), dtype=np.int16)
+        for _ in range(self.blocks_before_failure):
+            self.callback(block, self.blocksize, None, None)
+        # No CallbackStop, no stop() - the stream just ends
+        self.active = False
+        if self.finished_callback:
+            self.finished_callback()
+
+    def stop(self):
+        self.active = False
+
+    abort = close = stop
+
+
+def write_in_thread(player, seconds):
+    """Write more audio than the player buffers; returns the finished writer thread"""
+    samples = np.ones(int(16000 * seconds), dtype=np.int16)
+    writer = threading.Thread(target=lambda: (player.write(samples), player.finish(), player.wait()),
+                              daemon=True)
+    writer.start()
+    writer.join(5)
+    return writer
+
+
+def test_device_failure_releases_the_writer():
+    player = StreamingPlayer(16000, block_size=256, buffer_seconds=0.1, stretch_buffer_seconds=0.05,
+                             stream_factory=FailingOutputStream)
+    writer = write_in_thread(player, 2.0)
+    assert not writer.is_alive()
+    assert player.finished.is_set()
+    assert not player.write(np.ones(10, dtype=np.int16))
+
+
+def test_device_failure_through_shared_stream():
+    shared = SharedStream('output', FailingOutputStream)
+    player = StreamingPlayer(16000, block_size=256, buffer_seconds=0.1, stretch_buffer_seconds=0.05,
+                             stream_factory=shared)
+    writer = write_in_thread(player, 2.0)
+    assert not writer.is_alive()
+    assert player.finished.is_set()
+
+
+class ManualOutputStream:
+    """Output stream look-alike whose callback the test calls itself"""
+
+    CallbackStop = FailingOutputStream.CallbackStop
+
+    def __init__(self, samplerate, channels, dtype, blocksize, device, callback, finished_callback=None):
+        self.callback = callback
+
+    def start(self):
+        pass
+
+    def abort(self):
+        pass
+
+    close = abort
+
+
+class RecordingReference:
+    def __init__(self):
+        self.writes = []
+
+    def write(self, samples, sample_rate, end_time):
+        self.writes.append((len(samples), end_time))
+
+
+def stamp_of_underrun(time_info):
+    """Play 100 samples in a 256-frame callback; returns (samples, stamp - callback time)"""
+    reference = RecordingReference()
+    player = StreamingPlayer(16000, block_size=256, stream_factory=ManualOutputStream, reference=reference)
+    player.ring.write_nowait(np.ones(100, dtype=np.int16))
+    called = time.perf_counter()
+    player._stream.callback(np.zeros((256, 1), dtype=np.int16), 256, time_info, None)
+    player.stop()
+    (count, end_time), = reference.writes
+    return count, end_time - called
+
+
+def test_echo_reference_stamped_with_the_samples_played():
+    count, offset = stamp_of_underrun(None)
+    assert count == 100
+    assert 100 / 16000 <= offset < 100 / 16000 + 0.005
+
+
+def test_echo_reference_includes_reported_output_latency():
+    time_info = types.SimpleNamespace(currentTime=5.0, outputBufferDacTime=5.04)
+    count, offset = stamp_of_underrun(time_info)
+    assert 0.04 + 100 / 16000 <= offset < 0.04 + 100 / 16000 + 0.005
@@ -0,0 +1,121 @@
+import asyncio
+import json
+import sys
+import types
+
+import numpy as np
+
+from speech_server import AUDIO_FRAME, JSON_FRAME, SpeechServer, encode_frame, read_frame
+
+
+class FakeModels:
+    def get(self, name):
+        return name
+
+
+class FakeSpeech:
+    """SpeechEngine look-alike: one 'sentence' per word, every sample set to the word's length.
+    A word 'wait' blocks until the request is cancelled."""
+
+    def synthesize(self, text, cancel):
+        for word in text.split():
+            if word == 'wait':
+                cancel.wait(5)
+                return
+            yield np.full(100, len(word), dtype=np.int16), 22050
+
+
+class FakeRecognizer:
+    def __init__(self, model, sample_rate):
+        pass
+
+    def SetWords(self, words):
+        pass
+
+    def FinalResult(self):
+        return json.dumps({'text': ''})
+
+
+async def talk(requests, until_done):
+    """Send requests to a fresh server; returns the frames received until until_done ids are done"""
+    server = SpeechServer(FakeModels(), FakeSpeech(), threads=4)
+    listener = await asyncio.start_server(server.handle_client, '127.0.0.1', 0)
+    port = listener.sockets[0].getsockname()[1]
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    received = []
+    try:
+        for request in requests:
+            writer.write(encode_frame(JSON_FRAME, request))
+        await writer.drain()
+        done = set()
+        while not set(until_done) <= done:
+            kind, payload = await asyncio.wait_for(read_frame(reader), 5)
+            assert kind is not None
+            if kind == JSON_FRAME:
+                payload = json.loads(payload)
+                if payload['event'] == 'done':
+                    done.add(payload['id'])
+            received.append((kind, payload))
+    finally:
+        writer.close()
+        listener.close()
+        server.executor.shutdown(wait=False, cancel_futures=True)
+    return received
+
+
+def summary(frames):
+    """('audio', id) / ('A', sample value) / ('done', id) / ('error', id) for each frame"""
+    out = []
+    for kind, payload in frames:
+        if kind == AUDIO_FRAME:
+            out.append(('A', int(np.frombuffer(payload, dtype=np.int16)[0])))
+        else:
+            out.append((payload['event'], payload.get('id')))
+    return out
+
+
+def test_frame_round_trip():
+    async def round_trip():
+        reader = asyncio.StreamReader()
+        reader.feed_data(encode_frame(JSON_FRAME, {'op': 'ping', 'id': 'p1'}))
+        reader.feed_data(encode_frame(AUDIO_FRAME, b'\x01\x00\x02\x00'))
+        reader.feed_eof()
+        return [await read_frame(reader) for _ in range(3)]
+
+    frames = asyncio.run(round_trip())
+    assert frames == [(JSON_FRAME, b'{"op": "ping", "id": "p1"}'), (AUDIO_FRAME, b'\x01\x00\x02\x00'),
+                      (None, None)]
+
+
+def test_speak_requests_on_one_connection_are_queued():
+    frames = asyncio.run(talk([{'op': 'speak', 'id': 's1', 'text': 'a bb ccc'},
+                               {'op': 'speak', 'id': 's2', 'text': 'dddd eeeee'}], ['s1', 's2']))
+    assert summary(frames) == [('audio', 's1'), ('A', 1), ('A', 2), ('A', 3), ('done', 's1'),
+                               ('audio', 's2'), ('A', 4), ('A', 5), ('done', 's2')]
+
+
+def test_duplicate_speak_id_is_rejected_and_cancel_still_reaches_the_first():
+    frames = asyncio.run(talk([{'op': 'speak', 'id': 's1', 'text': 'a wait'},
+                               {'op': 'speak', 'id': 's1', 'text': 'bb'},
+                               {'op': 'cancel', 'id': 's1'}], ['s1']))
+    assert ('error', 's1') in summary(frames)
+    assert ('A', 2) not in summary(frames)
+    assert frames[-1][1] == {'event': 'done', 'id': 's1', 'cancelled': True}
+
+
+def test_queued_speak_can_be_cancelled():
+    frames = asyncio.run(talk([{'op': 'speak', 'id': 's1', 'text': 'a'},
+                               {'op': 'speak', 'id': 's2', 'text': 'wait'},
+                               {'op': 'speak', 'id': 's3', 'text': 'ccc'},
+                               {'op': 'cancel', 'id': 's3'},
+                               {'op': 'cancel', 'id': 's2'}], ['s1', 's2', 's3']))
+    assert ('A', 3) not in summary(frames)
+    assert [payload['id'] for kind, payload in frames if kind == JSON_FRAME] == ['s1', 's1', 's2', 's3']
+
+
+def test_duplicate_recognition_id_is_rejected(monkeypatch):
+    monkeypatch.setitem(sys.modules, 'vosk', types.SimpleNamespace(KaldiRecognizer=FakeRecognizer))
+    frames = asyncio.run(talk([{'op': 'recognize', 'id': 'r1'},
+                               {'op': 'recognize', 'id': 'r1'},
+                               {'op': 'end', 'id': 'r1'}], ['r1']))
+    assert summary(frames) == [('error', 'r1'), ('done', 'r1')]
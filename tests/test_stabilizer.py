@@ -0,0 +1,99 @@
+import json
+import os
+
+from commands import CommandGrammar, CommandTyper
+from speak_engine import DictationEngine
+from stabilizer import Edit, PartialStabilizer, replay
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def load_results(name):
+    """Vosk results in the format `stabilizer.py --record` writes"""
+    with open(os.path.join(FIXTURES, name), encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def feed(stabilizer, results):
+    """Run results through stabilizer, returning the Edit (or None) for each"""
+    edits = []
+    for result in results:
+        if 'partial' in result:
+            if result['partial']:
+                edits.append(stabilizer.partial(result['partial'].split()))
+        else:
+            edits.append(stabilizer.final(result['text'].split()))
+    return edits
+
+
+class Screen:
+    """Typing output that keeps the text a target app would show"""
+
+    def __init__(self):
+        self.text = ""
+
+    def type_text(self, text, captured_at=None):
+        self.text += text
+
+    def press(self, key, captured_at=None):
+        self.text += {'enter': "\n", 'tab': "\t"}[key]
+
+    def hotkey(self, keys, captured_at=None):
+        pass
+
+    def erase(self, count, captured_at=None):
+        self.text = self.text[:len(self.text) - count]
+
+
+def test_words_commit_once_stable():
+    stabilizer = PartialStabilizer(stable_partials=2)
+    results = load_results('partials_revision.jsonl')
+    edits = feed(stabilizer, results[:4])  # "", "the", "the whether", "the whether is"
+    assert edits == [None, Edit(0, ['the']), Edit(0, ['whether'])]
+    assert stabilizer.committed == ['the', 'whether']
+
+
+def test_revised_partial_retracts_typed_words():
+    stabilizer = PartialStabilizer(stable_partials=2)
+    edits = feed(stabilizer, load_results('partials_revision.jsonl')[:7])
+    # "whether" was typed, then the recognizer settled on "weather"
+    assert edits[-1] == Edit(2, ['weather', 'is', 'nice'])
+    assert stabilizer.committed == ['the', 'weather', 'is', 'nice']
+    assert stabilizer.corrected_words == 2
+
+
+def test_final_result_corrects_committed_word():
+    stabilizer = PartialStabilizer(stable_partials=2)
+    results = load_results('partials_revision.jsonl')
+    edits = feed(stabilizer, results[9:])
+    assert edits[-1] == Edit(1, ['letter', 'today'])
+    assert stabilizer.committed == []  # The final result closes the utterance
+
+
+def test_without_corrections_nothing_is_retracted():
+    outcome = replay(load_results('partials_revision.jsonl'), corrections=False)
+    assert all(edit.retract == 0 for edit in outcome['edits'])
+    assert outcome['text'] == "the whether is nice today see you later today"
+
+
+def test_typist_applies_corrections_to_the_screen():
+    screen = Screen()
+    typer = CommandTyper(CommandGrammar(), screen)
+    stabilizer = PartialStabilizer(stable_partials=2)
+    typed = []
+    seen = []
+    for result in load_results('partials_revision.jsonl'):
+        if 'partial' in result:
+            edit = stabilizer.partial(result['partial'].split()) if result['partial'] else None
+            if edit:
+                DictationEngine._apply_edit(edit, typer, typed, None)
+        else:
+            edit = stabilizer.final(result['text'].split())
+            if edit:
+                DictationEngine._apply_edit(edit, typer, typed, None)
+            typer.end_phrase()
+            typed.clear()
+        seen.append(screen.text)
+    assert "the whether is " in seen
+    assert screen.text == "the weather is nice today see you letter today "
+    assert screen.text == replay(load_results('partials_revision.jsonl'))['text'] + " "
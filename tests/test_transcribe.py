@@ -0,0 +1,31 @@
+import os
+
+from transcribe import write_result
+
+
+def _result(path, text):
+    return {'file': path, 'text': text}
+
+
+def test_same_names_in_different_folders_do_not_collide(tmp_path):
+    out = tmp_path / "out"
+    first = write_result(_result(str(tmp_path / "a" / "take1.wav"), "first"), str(out),
+                         relative_to=str(tmp_path))
+    second = write_result(_result(str(tmp_path / "b" / "take1.wav"), "second"), str(out),
+                          relative_to=str(tmp_path))
+    assert first == [os.path.join(str(out), "a", "take1.txt")]
+    assert second == [os.path.join(str(out), "b", "take1.txt")]
+    assert (out / "a" / "take1.txt").read_text() == "first\n"
+    assert (out / "b" / "take1.txt").read_text() == "second\n"
+
+
+def test_single_file_goes_straight_into_output_dir(tmp_path):
+    out = tmp_path / "out"
+    out.mkdir()
+    written = write_result(_result(str(tmp_path / "rec" / "take1.wav"), "hello"), str(out))
+    assert written == [os.path.join(str(out), "take1.txt")]
+
+
+def test_without_output_dir_writes_next_to_source(tmp_path):
+    written = write_result(_result(str(tmp_path / "take1.wav"), "hello"), formats=('txt', 'json'))
+    assert written == [str(tmp_path / "take1.txt"), str(tmp_path / "take1.json")]
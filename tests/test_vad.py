@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+from vad import VoiceActivityDetector
+
+RATE = 16000
+BLOCK = 1024
+
+
+def noise(rng, seconds, level_db):
+    """White noise at level_db dBFS - about half its energy is in the speech band"""
+    return rng.normal(0, 32768 * 10 ** (level_db / 20), int(seconds * RATE))
+
+
+def tone(seconds, level_db):
+    """Voice-band tones at level_db dBFS"""
+    t = np.arange(int(seconds * RATE)) / RATE
+    wave = np.sin(2 * np.pi * 220 * t) + np.sin(2 * np.pi * 660 * t) + np.sin(2 * np.pi * 1320 * t)
+    return wave / np.sqrt(np.mean(wave ** 2)) * 32768 * 10 ** (level_db / 20)
+
+
+def run(vad, *parts):
+    """Feed the parts block by block; returns the pieces and in_speech after each part"""
+    pieces, states = [], []
+    for part in parts:
+        audio = np.clip(part, -32768, 32767).astype(np.int16)
+        for i in range(0, len(audio), BLOCK):
+            pieces.extend(vad.process(audio[i:i + BLOCK]))
+        states.append(vad.in_speech)
+    return pieces, states
+
+
+def regions_ended(pieces):
+    return sum(1 for _, ended in pieces if ended)
+
+
+@pytest.mark.parametrize('level_db', [-50, -45, -40])
+def test_steady_noise_is_not_speech(level_db):
+    vad = VoiceActivityDetector(RATE)
+    _, states = run(vad, noise(np.random.default_rng(1), 10, level_db))
+    assert states == [False]
+    assert vad.frames_forwarded / vad.frames_seen < 0.05
+    assert abs(vad.noise_floor_db - level_db) < 3
+
+
+@pytest.mark.parametrize('level_db', [-50, -40])
+def test_noise_starting_mid_session_releases_the_gate(level_db):
+    rng = np.random.default_rng(2)
+    vad = VoiceActivityDetector(RATE)
+    _, states = run(vad, noise(rng, 1, -80), noise(rng, 10, level_db))
+    assert states == [False, False]
+    assert vad.frames_forwarded / vad.frames_seen < 0.5
+
+
+def test_silence_speech_silence():
+    rng = np.random.default_rng(3)
+    vad = VoiceActivityDetector(RATE)
+    pieces, states = run(vad, noise(rng, 1, -70), tone(1, -25) + noise(rng, 1, -70), noise(rng, 1, -70))
+    assert states == [False, True, False]
+    assert regions_ended(pieces) == 1
+    forwarded = sum(len(samples) for samples, _ in pieces) / RATE
+    # The speech, plus up to the pre-roll before it and the hangover after
+    assert 1.0 <= forwarded <= 1.0 + 0.3 + 0.4 + 0.05
+
+
+def test_speech_at_the_very_start_is_kept():
+    rng = np.random.default_rng(4)
+    vad = VoiceActivityDetector(RATE)
+    pieces, _ = run(vad, noise(rng, 0.1, -70), tone(1, -25) + noise(rng, 1, -70), noise(rng, 1, -70))
+    assert regions_ended(pieces) == 1
+    assert sum(len(samples) for samples, _ in pieces) / RATE >= 1.0
+
+
+def test_hangover_bridges_short_pauses_only():
+    rng = np.random.default_rng(5)
+    quiet = lambda seconds: noise(rng, seconds, -70)
+    speech = lambda: tone(0.5, -25) + quiet(0.5)
+    vad = VoiceActivityDetector(RATE, hangover_ms=400)
+    pieces, _ = run(vad, quiet(1), speech(), quiet(0.2), speech(), quiet(1))
+    assert regions_ended(pieces) == 1
+    vad = VoiceActivityDetector(RATE, hangover_ms=400)
+    pieces, _ = run(vad, quiet(1), speech(), quiet(0.6), speech(), quiet(1))
+    assert regions_ended(pieces) == 2
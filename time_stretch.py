@@ -0,0 +1,181 @@
+"""
+Pitch-preserving time stretching for Speak Anywhere's speech playback.
+
+WSOLA (waveform similarity overlap-add): the output is built from Hann
+windowed frames laid down at a fixed hop. Each frame is read from the input
+around its ideal position (output position * speed), nudged within a small
+tolerance to the offset that best continues the previous frame. Speed changes
+only move where the next frame is read from, so they can be applied while
+audio is streaming through.
+
+Run this file directly for a real-time-factor benchmark:
+    python time_stretch.py [seconds] [sample_rate]
+"""
+
+import sys
+import time
+
+import numpy as np
+
+MIN_SPEED = 0.5
+MAX_SPEED = 2.0
+
+
+class WsolaStretcher:
+    """Streaming WSOLA time stretcher for mono int16 audio.
+
+    Feed blocks with process(), which returns whatever output is ready, and
+    call flush() after the last block to drain the tail. speed > 1 plays
+    faster, speed < 1 slower; the pitch is unchanged either way.
+    """
+
+    def __init__(self, sample_rate, speed=1.0, frame_ms=30, tolerance_ms=8):
+        self.frame = 2 * int(sample_rate * frame_ms / 2000)
+        self.hop = self.frame // 2
+        self.tolerance = int(sample_rate * tolerance_ms / 1000)
+        # Periodic Hann - copies shifted by half a frame sum to exactly one
+        n = np.arange(self.frame)
+        self.window = (0.5 - 0.5 * np.cos(2 * np.pi * n / self.frame)).astype(np.float32)
+        self.speed = 1.0
+        self.set_speed(speed)
+
+        # Input is kept as float32 starting at absolute sample self._base. The
+        # lead-in of silence lets the first frame start half a frame early
+        # (so sample 0 gets full window coverage) and be searched around.
+        lead = self.hop + self.tolerance
+        self._buffer = np.zeros(lead, dtype=np.float32)
+        self._base = -lead
+        self._ideal = float(-self.hop)  # Where the next frame would be read at speed
+        self._natural = None            # Where the previous frame naturally continues
+        self._overlap = np.zeros(self.hop, dtype=np.float32)
+        self._skip = self.hop           # Output belonging to the lead-in
+        self._input_end = None
+
+    def set_speed(self, speed):
+        """Change the playback speed; takes effect from the next frame"""
+        self.speed = min(MAX_SPEED, max(MIN_SPEED, float(speed)))
+
+    def process(self, samples):
+        """Add int16 input samples, return the int16 output produced so far"""
+        if len(samples):
+            self._buffer = np.concatenate((self._buffer, samples.astype(np.float32)))
+        return self._run()
+
+    def flush(self):
+        """Drain everything still buffered once the input has ended"""
+        if self._input_end is None:
+            self._input_end = self._base + len(self._buffer)
+            pad = np.zeros(self.frame + 2 * self.tolerance + self.hop, dtype=np.float32)
+            self._buffer = np.concatenate((self._buffer, pad))
+        out = self._run()
+        tail = self._to_int16(self._overlap)
+        self._overlap = np.zeros(self.hop, dtype=np.float32)
+        return np.concatenate((out, tail))
+
+    def _run(self):
+        frame, hop, tol = self.frame, self.hop, self.tolerance
+        buf, base = self._buffer, self._base
+        end = base + len(buf)
+        pieces = []
+
+        while True:
+            if self._input_end is not None and self._ideal >= self._input_end:
+                break
+            ideal = int(round(self._ideal))
+            if self._natural is None:
+                needed = ideal + frame
+            else:
+                needed = max(ideal + tol + frame, self._natural + frame)
+            if needed > end:
+                break
+
+            if self._natural is None:
+                start = ideal
+            else:
+                start = self._best_offset(buf, base, ideal)
+
+            grain = buf[start - base:start - base + frame] * self.window
+            pieces.append(self._overlap + grain[:hop])
+            self._overlap = grain[hop:]
+            self._natural = start + hop
+            self._ideal += hop * self.speed
+
+        # Drop input that no future frame can reach
+        keep_from = int(np.floor(self._ideal)) - tol
+        if self._natural is not None:
+            keep_from = min(keep_from, self._natural)
+        drop = keep_from - base
+        if drop > 0:
+            self._buffer = buf[drop:]
+            self._base = keep_from
+
+        if not pieces:
+            return np.zeros(0, dtype=np.int16)
+        out = np.concatenate(pieces)
+        if self._skip:
+            skipped = min(self._skip, len(out))
+            out = out[skipped:]
+            self._skip -= skipped
+        return self._to_int16(out)
+
+    def _best_offset(self, buf, base, ideal):
+        """Start within +/- tolerance of ideal that best continues the last frame"""
+        frame, tol = self.frame, self.tolerance
+        lo = max(ideal - tol, base)
+        hi = ideal + tol
+        template = buf[self._natural - base:self._natural - base + frame]
+        region = buf[lo - base:hi - base + frame]
+
+        # Normalized cross-correlation for every candidate start at once
+        corr = np.correlate(region, template, mode='valid')
+        energy = np.cumsum(np.concatenate(([0.0], region.astype(np.float64) ** 2)))
+        window_energy = energy[frame:] - energy[:-frame]
+        score = corr / np.sqrt(window_energy + 1e-9)
+        return lo + int(np.argmax(score))
+
+    @staticmethod
+    def _to_int16(samples):
+        return np.clip(np.rint(samples), -32768, 32767).astype(np.int16)
+
+
+def stretch(samples, sample_rate, speed):
+    """Time-stretch a whole int16 array in one go"""
+    stretcher = WsolaStretcher(sample_rate, speed)
+    return np.concatenate((stretcher.process(samples), stretcher.flush()))
+
+
+# ============================================================================
+# BENCHMARK - Real-time factor of the stretch stage
+# ============================================================================
+def _speech_like_signal(seconds, sample_rate):
+    """Voiced harmonics with a wandering pitch, syllable envelope and noise"""
+    rng = np.random.default_rng(0)
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    f0 = 120 + 30 * np.sin(2 * np.pi * 0.7 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / sample_rate
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 12))
+    envelope = np.clip(np.sin(2 * np.pi * 4 * t), 0, None)
+    signal = voiced * envelope + 0.05 * rng.standard_normal(len(t))
+    return (signal / np.abs(signal).max() * 20000).astype(np.int16)
+
+
+def benchmark(seconds=30, sample_rate=22050, block=1024, speeds=(0.5, 1.0, 1.5, 2.0)):
+    """Print processing time per second of input audio for each speed"""
+    audio = _speech_like_signal(seconds, sample_rate)
+    print(f"WSOLA time-stretch: {seconds}s of audio at {sample_rate} Hz, {block}-sample blocks")
+    print(f"{'speed':>6} {'out sec':>8} {'wall sec':>9} {'ms/audio-sec':>13} {'RTF':>8}")
+    for speed in speeds:
+        stretcher = WsolaStretcher(sample_rate, speed)
+        produced = 0
+        started = time.perf_counter()
+        for i in range(0, len(audio), block):
+            produced += len(stretcher.process(audio[i:i + block]))
+        produced += len(stretcher.flush())
+        elapsed = time.perf_counter() - started
+        print(f"{speed:>5.1f}x {produced / sample_rate:>8.2f} {elapsed:>9.3f} "
+              f"{1000 * elapsed / seconds:>13.2f} {elapsed / seconds:>8.4f}")
+
+
+if __name__ == '__main__':
+    benchmark(seconds=float(sys.argv[1]) if len(sys.argv) > 1 else 30,
+              sample_rate=int(sys.argv[2]) if len(sys.argv) > 2 else 22050)
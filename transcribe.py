@@ -0,0 +1,271 @@
+"""
+Offline transcription of recorded audio with Speak Anywhere's Vosk model.
+
+WAV files (or whole directories of them) are read in large blocks,
+resampled to the model's rate and streamed through KaldiRecognizer. Several
+files are transcribed at once: each worker thread runs its own recognizer,
+all of them sharing one loaded Model. Results are written as plain text
+and/or JSON with per-word timings, and throughput is reported as seconds of
+audio transcribed per second of wall time.
+
+    python transcribe.py [options] FILE_OR_DIR...
+    SpeakAnywhere.exe --transcribe [options] FILE_OR_DIR...
+
+From Python:
+    transcriber = Transcriber(Model(path))
+    result = transcriber.transcribe("meeting.wav")
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+
+if getattr(sys, 'frozen', False):
+    _APP_DIR = os.path.dirname(sys.executable)
+else:
+    _APP_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_MODEL = os.path.join(_APP_DIR, "_resources", "vosk-model-small-en-us-0.15")
+DEFAULT_RATE = 16000
+
+
+# ============================================================================
+# AUDIO - Block-wise WAV reading and resampling
+# ============================================================================
+class Resampler:
+    """Streaming sample-rate converter for mono audio.
+
+    When going down in rate, a windowed-sinc low-pass removes everything the
+    new rate can't hold; samples are then linearly interpolated at the new
+    spacing. State carries across blocks so there are no seams.
+    """
+
+    def __init__(self, source_rate, target_rate, taps_per_ratio=16):
+        self.step = source_rate / target_rate
+        self._taps = None
+        if target_rate < source_rate:
+            numtaps = 2 * int(np.ceil(self.step * taps_per_ratio / 2)) + 1
+            cutoff = 0.45 * target_rate / source_rate  # Cycles per source sample
+            n = np.arange(numtaps) - (numtaps - 1) / 2
+            taps = 2 * cutoff * np.sinc(2 * cutoff * n) * np.hamming(numtaps)
+            self._taps = (taps / taps.sum()).astype(np.float32)
+            self._history = np.zeros(numtaps - 1, dtype=np.float32)
+        self._previous = np.zeros(0, dtype=np.float32)
+        self._position = 0.0
+
+    def process(self, samples):
+        """Resample a block of float samples; returns int16"""
+        x = samples.astype(np.float32)
+        if self._taps is not None:
+            x = np.concatenate((self._history, x))
+            self._history = x[len(x) - len(self._history):]
+            x = np.convolve(x, self._taps, mode='valid')
+        x = np.concatenate((self._previous, x))
+        if len(x) < 2:
+            self._previous = x
+            return np.zeros(0, dtype=np.int16)
+        count = int(np.floor((len(x) - 1 - self._position) / self.step)) + 1
+        positions = self._position + self.step * np.arange(max(count, 0))
+        out = np.interp(positions, np.arange(len(x)), x)
+        # Next output position, relative to the last sample kept for next time
+        self._position = self._position + self.step * count - (len(x) - 1)
+        self._previous = x[-1:]
+        return np.clip(np.rint(out), -32768, 32767).astype(np.int16)
+
+
+def _pcm_to_mono(data, sample_width, channels):
+    """Raw little-endian PCM frames as mono float samples on the int16 scale"""
+    if sample_width == 1:
+        samples = (np.frombuffer(data, dtype=np.uint8).astype(np.float32) - 128) * 256
+    elif sample_width == 2:
+        samples = np.frombuffer(data, dtype=np.int16).astype(np.float32)
+    elif sample_width == 3:
+        raw = np.frombuffer(data, dtype=np.uint8).reshape(-1, 3)
+        wide = np.zeros((len(raw), 4), dtype=np.uint8)
+        wide[:, 1:] = raw  # Shift into the top three bytes of an int32
+        samples = wide.view('<i4')[:, 0].astype(np.float32) / 65536
+    elif sample_width == 4:
+        samples = np.frombuffer(data, dtype='<i4').astype(np.float32) / 65536
+    else:
+        raise ValueError(f"Unsupported sample width: {sample_width} bytes")
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1)
+    return samples
+
+
+def read_blocks(path, sample_rate=DEFAULT_RATE, block_seconds=4.0):
+    """Yield a WAV file as mono int16 blocks at sample_rate"""
+    with wave.open(path, 'rb') as w:
+        if w.getcomptype() != 'NONE':
+            raise ValueError(f"{path}: compressed WAV files are not supported")
+        rate, width, channels = w.getframerate(), w.getsampwidth(), w.getnchannels()
+        resampler = Resampler(rate, sample_rate) if rate != sample_rate else None
+        frames_per_block = max(1, int(rate * block_seconds))
+        while True:
+            data = w.readframes(frames_per_block)
+            if not data:
+                break
+            samples = _pcm_to_mono(data, width, channels)
+            if resampler:
+                yield resampler.process(samples)
+            else:
+                yield samples.astype(np.int16)
+
+
+# ============================================================================
+# TRANSCRIPTION
+# ============================================================================
+class Transcriber:
+    """Transcribes audio files with a shared Vosk model; safe to call from many threads"""
+
+    def __init__(self, model, sample_rate=DEFAULT_RATE, block_seconds=4.0):
+        self.model = model
+        self.sample_rate = sample_rate
+        self.block_seconds = block_seconds
+
+    def transcribe(self, path):
+        """Transcribe one WAV file and return its result dict"""
+        from vosk import KaldiRecognizer
+
+        started = time.perf_counter()
+        # A fresh recognizer per file keeps word times relative to its start
+        recognizer = KaldiRecognizer(self.model, self.sample_rate)
+        recognizer.SetWords(True)
+        segments = []
+        samples = 0
+        for block in read_blocks(path, self.sample_rate, self.block_seconds):
+            samples += len(block)
+            if recognizer.AcceptWaveform(block.tobytes()):
+                self._add_segment(segments, recognizer.Result())
+        self._add_segment(segments, recognizer.FinalResult())
+
+        return {
+            'file': path,
+            'duration': samples / self.sample_rate,
+            'seconds': time.perf_counter() - started,
+            'text': " ".join(s['text'] for s in segments),
+            'segments': segments,
+        }
+
+    @staticmethod
+    def _add_segment(segments, result):
+        result = json.loads(result)
+        if not result.get('text'):
+            return
+        words = [{'word': w['word'], 'start': round(w['start'], 3), 'end': round(w['end'], 3),
+                  'conf': round(w['conf'], 3)} for w in result.get('result', [])]
+        segments.append({
+            'text': result['text'],
+            'start': words[0]['start'] if words else None,
+            'end': words[-1]['end'] if words else None,
+            'words': words,
+        })
+
+    def transcribe_many(self, paths, workers=None):
+        """Transcribe files in parallel, yielding (path, result or exception) as each finishes"""
+        workers = workers or max(1, min(len(paths), (os.cpu_count() or 2) // 2))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="transcribe") as pool:
+            futures = {pool.submit(self.transcribe, path): path for path in paths}
+            for future in as_completed(futures):
+                try:
+                    yield futures[future], future.result()
+                except Exception as e:
+                    yield futures[future], e
+
+
+def find_audio_files(paths):
+    """Expand directories into the WAV files below them"""
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                found.extend(os.path.join(root, name) for name in sorted(files)
+                             if name.lower().endswith('.wav'))
+        else:
+            found.append(path)
+    return found
+
+
+def write_result(result, output_dir=None, formats=('txt',), relative_to=None):
+    """Write result next to its source file (or into output_dir); returns the written paths.
+
+    In output_dir the source's path below relative_to (default: its own
+    directory) is kept, so same-named files from different folders don't
+    overwrite each other.
+    """
+    base = os.path.splitext(result['file'])[0]
+    if output_dir:
+        source_dir = os.path.dirname(os.path.abspath(base))
+        relative = os.path.relpath(os.path.abspath(base), relative_to or source_dir)
+        base = os.path.join(output_dir, relative)
+        os.makedirs(os.path.dirname(base), exist_ok=True)
+    written = []
+    if 'txt' in formats:
+        with open(base + '.txt', 'w', encoding='utf-8') as f:
+            f.write(result['text'] + "\n")
+        written.append(base + '.txt')
+    if 'json' in formats:
+        with open(base + '.json', 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+        written.append(base + '.json')
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="transcribe", description="Transcribe WAV files with Vosk.")
+    parser.add_argument('paths', nargs='+', help="WAV files or directories of them")
+    parser.add_argument('-m', '--model', default=DEFAULT_MODEL, help="Vosk model directory")
+    parser.add_argument('-o', '--output-dir', help="Where to write results (default: next to each file)")
+    parser.add_argument('-f', '--format', choices=['txt', 'json', 'both'], default='txt')
+    parser.add_argument('-j', '--jobs', type=int, help="Files to transcribe at once")
+    parser.add_argument('--rate', type=int, default=DEFAULT_RATE, help="Model sample rate")
+    parser.add_argument('--block-seconds', type=float, default=4.0, help="Audio per recognizer call")
+    args = parser.parse_args(argv)
+
+    paths = find_audio_files(args.paths)
+    if not paths:
+        print("No WAV files found")
+        return 1
+    relative_to = None
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+        # Mirror the inputs' folders below the one they all share
+        try:
+            relative_to = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in paths])
+        except ValueError:
+            pass  # Inputs on different drives; nothing in common to mirror from
+    formats = ('txt', 'json') if args.format == 'both' else (args.format,)
+
+    from vosk import Model, SetLogLevel
+    SetLogLevel(-1)
+    load_started = time.perf_counter()
+    model = Model(args.model)
+    print(f"Model loaded in {time.perf_counter() - load_started:.1f}s")
+
+    transcriber = Transcriber(model, args.rate, args.block_seconds)
+    started = time.perf_counter()
+    audio_seconds = 0.0
+    failures = 0
+    for path, result in transcriber.transcribe_many(paths, args.jobs):
+        if isinstance(result, Exception):
+            failures += 1
+            print(f"FAILED {path}: {result}")
+            continue
+        write_result(result, args.output_dir, formats, relative_to)
+        audio_seconds += result['duration']
+        print(f"{path}: {result['duration']:.1f}s audio in {result['seconds']:.1f}s "
+              f"({result['duration'] / max(result['seconds'], 1e-9):.1f}x)")
+
+    elapsed = time.perf_counter() - started
+    print(f"{len(paths) - failures}/{len(paths)} files, {audio_seconds:.1f}s of audio in {elapsed:.1f}s: "
+          f"{audio_seconds / max(elapsed, 1e-9):.1f} audio-seconds per second")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())